@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+End to end throughput of PowerTrackClient and the rules functions against
+gnippy.mockserver.MockPowerTrackServer, run in a separate process so that
+CPU time is the client's alone.
+
+Reports activities/s, MB/s after decompression, MB/s on the wire, client
+and server CPU usage (100% is one core; a server near 100% means the
+scenario is server bound) and the p99 callback latency bucket.
+
+    PYTHONPATH=. python benchmarks/bench_client.py [--messages 200000]
+"""
+from __future__ import print_function, division
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+
+from gnippy import PowerTrackClient, rules
+from gnippy.decoding import Decoder
+from gnippy.mockserver import MockPowerTrackServer
+from gnippy.reconnect import Backoff, ReconnectPolicy
+
+AUTH = ("benchmark", "benchmark")
+
+# name, server options, client options
+SCENARIOS = [
+    ("plain", {"compression": False}, {"compression": False}),
+    ("gzip", {"compression": True}, {"compression": True}),
+    ("decode", {"compression": True},
+     {"compression": True, "decoder": Decoder()}),
+    ("disconnects", {"compression": True, "disconnect_after": 20000},
+     {"compression": True,
+      "reconnect_policy": ReconnectPolicy(network=Backoff(0.01, 0.01))}),
+]
+
+
+def serve(options, queue, stop):
+    server = MockPowerTrackServer(auth=AUTH, **options).start()
+    queue.put(server.url)
+    stop.wait()
+    server.stop()
+    queue.put(cpu_time())
+
+
+class MockServerProcess(object):
+    """ MockPowerTrackServer in a child process. """
+
+    def __init__(self, **options):
+        self._queue = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=serve, args=(options, self._queue, self._stop))
+        self.cpu = None
+
+    def __enter__(self):
+        self._process.start()
+        self.url = self._queue.get(timeout=10)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        # Seconds of CPU time the server used
+        self.cpu = self._queue.get(timeout=10)
+        self._process.join()
+
+
+def cpu_time():
+    """ User and system seconds used by this process, all threads. """
+    times = os.times()
+    return times[0] + times[1]
+
+
+def bench_stream(name, server_options, client_options, messages,
+                 message_size):
+    received = [0]
+    done = threading.Event()
+
+    def callback(item):
+        received[0] += 1
+        if received[0] == messages:
+            done.set()
+
+    with MockServerProcess(message_size=message_size,
+                           **server_options) as server:
+        client = PowerTrackClient(callback, url=server.url, auth=AUTH,
+                                  **client_options)
+        start, cpu = time.time(), cpu_time()
+        client.connect()
+        done.wait()
+        elapsed, cpu = time.time() - start, cpu_time() - cpu
+        snapshot = client.metrics.snapshot()
+        client.disconnect()
+
+    p99 = snapshot["callback"]["p99"]
+    print("%-12s %9.0f msg/s %7.1f MB/s %7.1f MB/s wire %4.0f%% CPU "
+          "%4.0f%% server CPU p99 %s %d reconnects" % (
+              name, messages / elapsed,
+              snapshot["bytes_decompressed"] / elapsed / 1024 / 1024,
+              snapshot["bytes_received"] / elapsed / 1024 / 1024,
+              100 * cpu / elapsed, 100 * server.cpu / elapsed,
+              "%gs" % p99 if p99 is not None else "> max",
+              snapshot["reconnects"]))
+
+
+def bench_rules(count):
+    built = [rules.build("keyword%d OR #tag%d" % (i, i), tag="t%d" % i)
+             for i in range(count)]
+    with MockServerProcess() as server:
+        conf = {"url": server.url, "auth": AUTH}
+        for name, fn in [
+                ("add_rules", lambda: rules.add_rules(built, **conf)),
+                ("get_rules", lambda: rules.get_rules(**conf)),
+                ("iter_rules", lambda: list(rules.iter_rules(**conf))),
+                ("delete_rules", lambda: rules.delete_rules(built, **conf))]:
+            start = time.time()
+            fn()
+            elapsed = time.time() - start
+            print("%-12s %9.0f rules/s %8.3f s" % (name, count / elapsed,
+                                                   elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--message-size", type=int, default=3000)
+    parser.add_argument("--rules", type=int, default=20000)
+    parser.add_argument("--scenario", action="append",
+                        choices=[s[0] for s in SCENARIOS],
+                        help="run only these stream scenarios")
+    args = parser.parse_args()
+
+    for name, server_options, client_options in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        bench_stream(name, server_options, client_options, args.messages,
+                     args.message_size)
+    if args.rules:
+        bench_rules(args.rules)
+
+
+if __name__ == "__main__":
+    main()
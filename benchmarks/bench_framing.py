@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare requests' iter_lines with gnippy.framing.LineSplitter over the same
+synthetic PowerTrack stream.
+
+    PYTHONPATH=. python benchmarks/bench_framing.py [--megabytes 200]
+"""
+from __future__ import print_function, division
+
+import argparse
+import io
+import json
+import time
+
+import requests
+
+from gnippy.framing import DEFAULT_CHUNK_SIZE, LineSplitter
+
+
+def generate_stream(megabytes, activity_size=3000):
+    """ A stream of ``activity_size`` byte activities and keep-alives. """
+    activity = json.dumps({"id": "tag:search.twitter.com,2005:1",
+                           "body": "x" * activity_size}).encode("utf-8")
+    lines = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        lines.append(activity)
+        size += len(activity) + 2
+        if len(lines) % 100 == 0:
+            lines.append(b"")
+    return b"\r\n".join(lines) + b"\r\n"
+
+
+def response_for(data):
+    r = requests.Response()
+    r.status_code = 200
+    r.raw = io.BytesIO(data)
+    return r
+
+
+def iter_lines(data, chunk_size):
+    count = 0
+    for line in response_for(data).iter_lines():
+        if line:
+            count += 1
+    return count
+
+
+def line_splitter(data, chunk_size):
+    count = 0
+    splitter = LineSplitter()
+    for chunk in response_for(data).iter_content(chunk_size=chunk_size):
+        for line in splitter.feed(chunk):
+            if line:
+                count += 1
+    return count
+
+
+def bench(name, fn, data, chunk_size, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        count = fn(data, chunk_size)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    mbps = len(data) / best / 1024 / 1024
+    print("%-14s %8d lines %8.1f MB/s" % (name, count, mbps))
+    return mbps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = generate_stream(args.megabytes)
+    baseline = bench("iter_lines", iter_lines, data, args.chunk_size,
+                     args.repeat)
+    framed = bench("LineSplitter", line_splitter, data, args.chunk_size,
+                   args.repeat)
+    print("speedup: %.1fx" % (framed / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Replay a synthetic capture file as fast as possible through
+gnippy.replay.ReplayClient, with a callback per line and with batches.
+
+    PYTHONPATH=. python benchmarks/bench_replay.py [--megabytes 1000]
+"""
+from __future__ import print_function, division
+
+import argparse
+import os
+import tempfile
+import time
+
+from gnippy.batching import Batcher
+from gnippy.replay import DEFAULT_REPLAY_CHUNK_SIZE, ReplayClient
+
+from bench_framing import generate_stream
+
+
+def write_capture(megabytes, activity_size):
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "wb") as f:
+        f.write(generate_stream(megabytes, activity_size))
+    return path
+
+
+def bench(name, path, repeat, batch_size=None, **kwargs):
+    best = None
+    for _ in range(repeat):
+        if batch_size:
+            # A batcher cannot be restarted
+            kwargs["batcher"] = Batcher(max_count=batch_size)
+        client = ReplayClient(lambda item: None, path, **kwargs)
+        start = time.time()
+        client.connect()
+        client.wait()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    lines = client.worker.lines
+    size = client.worker.bytes_received
+    print("%-10s %9d lines %10.0f lines/s %8.1f MB/s" % (
+        name, lines, lines / best, size / best / 1024 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=int, default=1000)
+    parser.add_argument("--activity-size", type=int, default=3000)
+    parser.add_argument("--chunk-size", type=int,
+                        default=DEFAULT_REPLAY_CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = write_capture(args.megabytes, args.activity_size)
+    try:
+        bench("per line", path, args.repeat, chunk_size=args.chunk_size)
+        bench("batched", path, args.repeat, chunk_size=args.chunk_size,
+              batch_size=1000)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
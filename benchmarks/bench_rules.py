@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare building, validating, chunking and serializing a large rule list of
+dicts from gnippy.rules.build with the same list of gnippy.rules.Rule
+objects. No requests are made.
+
+    PYTHONPATH=. python benchmarks/bench_rules.py [--rules 100000]
+"""
+from __future__ import print_function, division
+
+import argparse
+import time
+
+from gnippy import rules
+
+
+def generate_rules(count):
+    return [("(keyword%d OR \"phrase %d\") lang:en" % (i, i),
+             "tag%d" % (i % 100) if i % 2 else None)
+            for i in range(count)]
+
+
+CONF = {"url": "https://stream.gnip.com:443/accounts/bench/publishers/"
+                "twitter/streams/track/prod.json", "auth": None}
+
+
+def submit(rules_list):
+    """
+    What add_rules does besides the requests themselves: the real _submit,
+    with a send that only serializes each chunk.
+    """
+    size = [0]
+
+    def send(conf, chunk, session):
+        size[0] += len(rules._dumps_rules(chunk))
+
+    # A session is passed so that no connection pool is set up
+    rules._submit(CONF, rules_list, send, rules.RuleAddFailedException,
+                  session=object(), max_workers=1)
+    return size[0]
+
+
+def bench(name, make, values, repeat):
+    best_build = best_submit = None
+    for _ in range(repeat):
+        start = time.time()
+        rules_list = [make(value, tag) for value, tag in values]
+        built = time.time()
+        submit(rules_list)
+        done = time.time()
+        best_build = min(best_build or built - start, built - start)
+        best_submit = min(best_submit or done - built, done - built)
+    print("%-6s build %7.1f ms  submit %7.1f ms" % (
+        name, best_build * 1000, best_submit * 1000))
+    return best_build + best_submit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    values = generate_rules(args.rules)
+    baseline = bench("dict", rules.build, values, args.repeat)
+    records = bench("Rule", rules.Rule, values, args.repeat)
+    print("speedup: %.2fx" % (baseline / records))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Implementation of :mod:`gnippy.asyncclient`, Python 3.7+ only.
+"""
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from gnippy import config
+from gnippy.powertrackclient import CONNECT_TIMEOUT, DEFAULT_STALL_TIMEOUT
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncPowerTrackClient(object):
+    """
+    AsyncPowerTrackClient consumes the GNIP power track stream on an asyncio
+    event loop without spawning a thread per connection::
+
+        client = AsyncPowerTrackClient(url=url, auth=auth)
+        async for activity in client.stream():
+            await handle(activity)
+
+    The stream is pulled by the consumer: nothing is read from the socket
+    until the ``async for`` body asks for the next activity, so a slow
+    consumer applies back-pressure all the way down to TCP flow control
+    instead of growing an unbounded buffer.
+
+    Args:
+        url: stream url
+        auth: stream authentication, ``("account", "password")`` tuple
+        session: optional ``aiohttp.ClientSession`` to share a connection
+            pool between several streams. A private session is created
+            and closed per :meth:`stream` call when not provided.
+        chunk_size (int): maximum number of bytes read from the socket at
+            once.
+        stall_timeout (float): seconds without any data or keep-alive after
+            which reading fails with ``asyncio.TimeoutError``. ``None`` waits
+            forever.
+
+    Raises:
+        RuntimeError: if aiohttp is not installed.
+    """
+
+    def __init__(self, session=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 stall_timeout=DEFAULT_STALL_TIMEOUT, **kwargs):
+        if aiohttp is None and session is None:
+            raise RuntimeError(
+                "AsyncPowerTrackClient requires aiohttp to be installed")
+
+        c = config.resolve(kwargs)
+
+        self.url = c['url']
+        self.auth = c['auth']
+        self.session = session
+        self.chunk_size = chunk_size
+        self.stall_timeout = stall_timeout
+
+    def _create_session(self):
+        return aiohttp.ClientSession(auth=aiohttp.BasicAuth(*self.auth))
+
+    def _timeout(self):
+        # PowerTrack connections are meant to stay open indefinitely, so the
+        # aiohttp default of a 5 minute total timeout must not apply. A read
+        # timeout catches half-dead connections, keep-alives arrive every 10
+        # seconds.
+        if aiohttp is None:
+            return None
+        return aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT,
+                                     sock_read=self.stall_timeout)
+
+    async def stream(self):
+        """
+        Connect to :attr:`url` and asynchronously iterate over activities.
+        Keep-alive newlines are skipped. Breaking out of the loop or
+        closing the generator closes the connection.
+
+        Yields:
+            bytes: a single activity, without the line terminator.
+
+        Raises:
+            aiohttp.ClientResponseError: if the stream responds with an
+                error status.
+            asyncio.TimeoutError: if nothing was received for
+                ``stall_timeout`` seconds.
+        """
+        if self.session is None:
+            async with self._create_session() as session:
+                async for line in self._stream(session, None):
+                    yield line
+        else:
+            auth = aiohttp.BasicAuth(*self.auth) if aiohttp else self.auth
+            async for line in self._stream(self.session, auth):
+                yield line
+
+    async def _stream(self, session, auth):
+        async with session.get(self.url, auth=auth,
+                               timeout=self._timeout()) as response:
+            # Let user know if something went wrong
+            response.raise_for_status()
+
+            buf = b""
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                buf += chunk
+                lines = buf.split(b"\n")
+                buf = lines.pop()
+                for line in lines:
+                    line = line.rstrip(b"\r")
+                    if line:
+                        yield line
+
+            buf = buf.rstrip(b"\r")
+            if buf:
+                yield buf
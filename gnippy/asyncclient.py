@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio flavour of :class:`gnippy.powertrackclient.PowerTrackClient`.
+
+Requires Python 3.7+ and `aiohttp <https://docs.aiohttp.org/>`_. The
+implementation lives in a module Python 2 cannot parse, so that importing
+this one fails with a clear error instead.
+"""
+
+import sys
+
+if sys.version_info < (3, 7):
+    raise ImportError("gnippy.asyncclient requires Python 3.7+")
+
+from gnippy._asyncclient import AsyncPowerTrackClient, DEFAULT_CHUNK_SIZE
+
+__all__ = ["AsyncPowerTrackClient", "DEFAULT_CHUNK_SIZE"]
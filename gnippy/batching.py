@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Batch delivery of activities, for sinks that are much cheaper to call with
+many activities at once (bulk inserts, Kafka producers, ...).
+"""
+
+import threading
+
+from gnippy.compat import monotonic
+
+
+class Batcher(object):
+    """
+    Accumulates lines and calls ``callback(list_of_lines)`` when
+    ``max_count`` lines have been collected or the oldest line has waited
+    ``max_latency`` seconds, whichever comes first.
+
+    Pass an instance to :class:`gnippy.powertrackclient.PowerTrackClient`
+    with the ``batcher`` argument; the client callback then receives lists.
+    Batches are delivered one at a time and in order, either from the
+    thread adding lines or from a timer thread.
+
+    Args:
+        max_count (int): maximum number of lines per batch.
+        max_latency (float): maximum seconds a line waits for its batch to
+            fill up, ``None`` to only deliver full batches.
+
+    Attributes:
+        batches (int): number of batches delivered.
+    """
+
+    def __init__(self, max_count=500, max_latency=1.0):
+        if max_count < 1:
+            raise ValueError("max_count must be positive")
+
+        self.max_count = max_count
+        self.max_latency = max_latency
+        self.batches = 0
+
+        self._batch = []
+        self._deadline = None
+        self._callback = None
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def start(self, callback):
+        """ Start delivering batches to ``callback``. """
+        self._callback = callback
+        if self.max_latency is not None:
+            self._thread = threading.Thread(target=self._timer)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def add(self, line):
+        """ Add a line to the current batch. """
+        with self._cond:
+            self._batch.append(line)
+            if len(self._batch) >= self.max_count:
+                self._flush()
+            elif len(self._batch) == 1 and self.max_latency is not None:
+                self._deadline = monotonic() + self.max_latency
+                self._cond.notify()
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        self._deadline = None
+        if batch:
+            self.batches += 1
+            self._callback(batch)
+
+    def _timer(self):
+        with self._cond:
+            while not self._closed:
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+
+                remaining = self._deadline - monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                else:
+                    self._flush()
+
+    def flush(self):
+        """ Deliver the current batch now, if not empty. """
+        with self._cond:
+            self._flush()
+
+    def close(self):
+        """ Deliver the remaining lines and stop the timer thread. """
+        with self._cond:
+            self._closed = True
+            self._flush()
+            self._cond.notify_all()
+
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded buffering between the stream reader and the user callback.
+
+Without a buffer :class:`gnippy.powertrackclient.Worker` calls the callback
+on the thread reading the socket, so a slow callback slows down reading
+and GNIP eventually disconnects the client for being a slow consumer.
+"""
+
+from collections import deque
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+SPILL = "spill"
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+
+class _Spill(object):
+    """ FIFO of lines in an anonymous temporary file. """
+
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._read_pos = 0
+        self._write_pos = 0
+        self.pending = 0
+
+    def write(self, line):
+        self._file.seek(self._write_pos)
+        self._file.write(line)
+        self._file.write(b"\n")
+        self._write_pos = self._file.tell()
+        self.pending += 1
+
+    def read(self, n):
+        self._file.seek(self._read_pos)
+        lines = []
+        for _ in range(min(n, self.pending)):
+            lines.append(self._file.readline()[:-1])
+        self._read_pos = self._file.tell()
+        self.pending -= len(lines)
+
+        if not self.pending:
+            # Reclaim disk space once fully drained
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_pos = self._write_pos = 0
+
+        return lines
+
+    def close(self):
+        self._file.close()
+
+
+class Buffer(object):
+    """
+    Bounded in-memory buffer drained by a pool of consumer threads.
+
+    Pass an instance to :class:`gnippy.powertrackclient.PowerTrackClient`
+    with the ``buffer`` argument. With more than one consumer the callback
+    must be thread-safe and activities may be delivered out of order.
+    An exception raised by the callback is logged and the consumer carries
+    on with the next line.
+
+    Args:
+        maxsize (int): maximum number of lines held in memory.
+        consumers (int): number of consumer threads calling the callback.
+        overflow (str): what :meth:`put` does when the buffer is full, one
+            of :data:`BLOCK` (wait for room, slowing down the reader),
+            :data:`DROP_OLDEST` (discard the oldest buffered line) or
+            :data:`SPILL` (append to a temporary file in ``spill_dir``,
+            read back in order once there is room again).
+        spill_dir (str): directory for the spill file, the system default
+            temporary directory if ``None``.
+
+    Attributes:
+        high_water (int): largest :attr:`depth` seen.
+        dropped (int): lines discarded by :data:`DROP_OLDEST`.
+        spilled (int): lines written to disk by :data:`SPILL`.
+        errors (int): lines for which the callback raised.
+        error: the last exception raised by the callback, or ``None``.
+    """
+
+    def __init__(self, maxsize=10000, consumers=1, overflow=BLOCK,
+                 spill_dir=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of %s" %
+                             ", ".join(OVERFLOW_POLICIES))
+        if maxsize < 1 or consumers < 1:
+            raise ValueError("maxsize and consumers must be positive")
+
+        self.maxsize = maxsize
+        self.consumers = consumers
+        self.overflow = overflow
+        self.spill_dir = spill_dir
+
+        self.high_water = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.errors = 0
+        self.error = None
+
+        self._queue = deque()
+        self._spill = None
+        self._closed = False
+        self._threads = []
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+
+    @property
+    def depth(self):
+        """ Number of lines waiting in memory and on disk. """
+        with self._mutex:
+            return self._depth()
+
+    def _depth(self):
+        pending = self._spill.pending if self._spill else 0
+        return len(self._queue) + pending
+
+    def stats(self):
+        """
+        Returns:
+            dict: a consistent snapshot of the buffer counters.
+        """
+        with self._mutex:
+            return {
+                "depth": self._depth(),
+                "high_water": self.high_water,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+                "errors": self.errors,
+            }
+
+    def put(self, line):
+        """
+        Add a line, applying the overflow policy if full. Lines put after
+        :meth:`close` are discarded.
+        """
+        with self._mutex:
+            if self._closed:
+                return
+
+            if self._spill and self._spill.pending:
+                # Keep FIFO order while older lines are still on disk
+                self._spill_line(line)
+                return
+
+            while len(self._queue) >= self.maxsize:
+                if self.overflow == BLOCK:
+                    self._not_full.wait()
+                    if self._closed:
+                        return
+                elif self.overflow == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    self._spill_line(line)
+                    return
+
+            self._queue.append(line)
+            self.high_water = max(self.high_water, self._depth())
+            self._not_empty.notify()
+
+    def _spill_line(self, line):
+        if self._spill is None:
+            self._spill = _Spill(self.spill_dir)
+        self._spill.write(line)
+        self.spilled += 1
+        self.high_water = max(self.high_water, self._depth())
+        self._not_empty.notify()
+
+    def get(self):
+        """
+        Remove and return the oldest line, blocking while empty.
+
+        Returns:
+            the line or ``None`` once the buffer is closed and drained.
+        """
+        with self._mutex:
+            while True:
+                if not self._queue and self._spill and self._spill.pending:
+                    self._queue.extend(self._spill.read(self.maxsize))
+
+                if self._queue:
+                    line = self._queue.popleft()
+                    self._not_full.notify()
+                    return line
+
+                if self._closed:
+                    return None
+
+                self._not_empty.wait()
+
+    def _consume(self, callback):
+        while True:
+            line = self.get()
+            if line is None:
+                break
+            try:
+                callback(line)
+            except Exception as e:
+                # A dead consumer would leave a blocked reader waiting
+                logger.exception("Buffer callback failed")
+                with self._mutex:
+                    self.errors += 1
+                    self.error = e
+
+    def start(self, callback):
+        """ Start the consumer threads calling ``callback`` per line. """
+        for _ in range(self.consumers):
+            t = threading.Thread(target=self._consume, args=(callback,))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def close(self):
+        """
+        Stop accepting lines. Consumers exit once everything buffered has
+        been delivered.
+        """
+        with self._mutex:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait for the consumer threads to exit.
+
+        Returns:
+            bool: ``True`` if all consumers have exited.
+        """
+        for t in self._threads:
+            t.join(timeout=timeout)
+
+        done = not any(t.is_alive() for t in self._threads)
+        if done and self._spill:
+            self._spill.close()
+            self._spill = None
+        return done
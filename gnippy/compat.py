@@ -2,6 +2,7 @@
 from __future__ import absolute_import, division, print_function
 
 import sys
+import time
 
 PY2 = sys.version_info < (3,)
 PY3 = not PY2
@@ -19,3 +20,34 @@ try:
 
 except ImportError:
     import ConfigParser as configparser
+
+# Clock for measuring intervals, immune to system clock changes on Python 3
+monotonic = getattr(time, "monotonic", time.time)
+
+# Highest resolution clock for timing short calls
+perf_counter = getattr(time, "perf_counter", monotonic)
+
+try:
+    from urllib.parse import urlencode, urlparse, urlunparse
+
+except ImportError:
+    from urllib import urlencode
+    from urlparse import urlparse, urlunparse
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    from socketserver import ThreadingMixIn
+
+except ImportError:
+    from SocketServer import ThreadingMixIn
+
+try:
+    from queue import Empty
+
+except ImportError:
+    from Queue import Empty
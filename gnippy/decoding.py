@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Optional JSON decoding of stream lines.
+
+Besides activities the stream carries GNIP system messages, single key
+objects such as ``{"info": {"message": "Replay Request Completed"}}``,
+``{"warn": {...}}`` or ``{"error": {"message": "Forced Disconnect"}}``.
+:class:`Decoder` parses every line once and routes system messages to
+their own callback.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+SYSTEM_MESSAGE_KINDS = ("info", "warn", "error")
+
+
+def get_loads(name=None):
+    """
+    Resolve a JSON decoding function.
+
+    Args:
+        name: ``"json"`` (the default), ``"orjson"``, ``"ujson"``,
+            ``"auto"`` for the fastest installed one, or any callable
+            taking ``bytes`` and returning the decoded object.
+
+    Returns:
+        callable: the ``loads`` function.
+
+    Raises:
+        ValueError: if the decoder is unknown or not installed.
+    """
+    if callable(name):
+        return name
+
+    available = {"json": json.loads}
+    if ujson is not None:
+        available["ujson"] = ujson.loads
+    if orjson is not None:
+        available["orjson"] = orjson.loads
+
+    if name is None:
+        name = "json"
+    elif name == "auto":
+        name = next(n for n in ("orjson", "ujson", "json") if n in available)
+
+    if name not in available:
+        raise ValueError("JSON decoder '%s' is not available" % name)
+
+    return available[name]
+
+
+def system_message_kind(obj):
+    """
+    Returns:
+        str:
+        ``"info"``, ``"warn"`` or ``"error"`` if ``obj`` is a GNIP system
+        message, ``None`` for activities.
+    """
+    if isinstance(obj, dict) and len(obj) == 1:
+        for kind in SYSTEM_MESSAGE_KINDS:
+            if kind in obj:
+                return kind
+    return None
+
+
+class Decoder(object):
+    """
+    Decodes lines and separates activities from system messages.
+
+    Pass an instance to :class:`gnippy.powertrackclient.PowerTrackClient`
+    with the ``decoder`` argument; the client callback then receives
+    decoded activities.
+
+    Args:
+        loads: decoder name or function, see :func:`get_loads`.
+        on_system: called as ``on_system(kind, message)`` for system
+            messages, where ``message`` is the body of the message. System
+            messages are dropped if ``None``.
+        on_error: called as ``on_error(line, exception)`` for lines that
+            fail to decode. The exception propagates if ``None``.
+    """
+
+    def __init__(self, loads=None, on_system=None, on_error=None):
+        self.loads = get_loads(loads)
+        self.on_system = on_system
+        self.on_error = on_error
+
+    def wrap(self, on_activity):
+        """
+        Returns:
+            callable: a line callback decoding lines for ``on_activity``.
+        """
+        loads = self.loads
+
+        def on_data(line):
+            try:
+                obj = loads(line)
+            except Exception as e:
+                if self.on_error is None:
+                    raise
+                self.on_error(line, e)
+                return
+
+            kind = system_message_kind(obj)
+            if kind is None:
+                on_activity(obj)
+            elif self.on_system is not None:
+                self.on_system(kind, obj[kind])
+
+        return on_data
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Duplicate activity detection.
+
+Backfill after a reconnect and redundant connections both deliver some
+activities more than once. :class:`Deduplicator` drops repeated activity
+ids using a memory bounded set of recently seen ids.
+"""
+
+from collections import OrderedDict
+import hashlib
+import math
+import re
+import struct
+import threading
+
+from gnippy.compat import monotonic
+
+# First "id" in the line: the activity id in both the Activity Streams and
+# the original Twitter format, where it precedes any nested object.
+_ID_RE = re.compile(br'"id"\s*:\s*("(?:[^"\\]|\\.)*"|\d+)')
+
+
+def activity_id(line):
+    """
+    Extract the activity id from a raw line without decoding it.
+
+    Returns:
+        bytes: the id as it appears in the line or ``None``, e.g. for
+        system messages.
+    """
+    match = _ID_RE.search(line)
+    return match.group(1) if match else None
+
+
+class LRUSet(object):
+    """
+    Set of at most ``maxsize`` keys, evicting the least recently added or
+    looked up key. Exact, but memory grows with the size of the keys.
+    """
+
+    def __init__(self, maxsize=1000000):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+
+    def add(self, key):
+        """
+        Add ``key``.
+
+        Returns:
+            bool: ``True`` if ``key`` was already present.
+        """
+        keys = self._keys
+        if key in keys:
+            del keys[key]
+            keys[key] = None
+            return True
+
+        keys[key] = None
+        if len(keys) > self.maxsize:
+            keys.popitem(last=False)
+        return False
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class BloomFilter(object):
+    """
+    Bloom filter sized for ``capacity`` keys at ``error_rate`` false
+    positives.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        bits = int(math.ceil(-capacity * math.log(error_rate) /
+                             math.log(2) ** 2))
+        self.num_bits = max(8, bits)
+        self.num_hashes = max(1, int(round(
+            self.num_bits / float(capacity) * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing
+        h1, h2 = struct.unpack("<QQ", hashlib.md5(key).digest())
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """
+        Add ``key``.
+
+        Returns:
+            bool: ``True`` if ``key`` was, probably, already present.
+        """
+        bits = self._bits
+        present = True
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+
+class WindowedBloomFilter(object):
+    """
+    Remembers keys for at least ``window`` seconds in constant memory using
+    two rotating :class:`BloomFilter` generations. A generation is also
+    rotated early once it holds ``capacity`` keys, so the error rate stays
+    bounded at high volume.
+
+    Args:
+        capacity (int): expected keys per ``window``.
+        error_rate (float): false positive rate per generation.
+        window (float): seconds a key is remembered at least.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001, window=300.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated = monotonic()
+
+    def _rotate(self):
+        self._previous = self._current
+        self._current = BloomFilter(self.capacity, self.error_rate)
+        self._rotated = monotonic()
+
+    def add(self, key):
+        """
+        Add ``key``.
+
+        Returns:
+            bool: ``True`` if ``key`` was, probably, seen within the window.
+        """
+        if self._current.count >= self.capacity or \
+                monotonic() - self._rotated >= self.window:
+            self._rotate()
+
+        if key in self._previous:
+            self._current.add(key)
+            return True
+        return self._current.add(key)
+
+
+class Deduplicator(object):
+    """
+    Drops lines whose activity id has been seen recently. Thread-safe, so a
+    single instance can be shared by redundant connections.
+
+    Pass an instance to :class:`gnippy.powertrackclient.PowerTrackClient`
+    with the ``deduplicator`` argument. Lines without an id, like system
+    messages, are never dropped.
+
+    Args:
+        seen: structure remembering ids, an :class:`LRUSet` (exact) or a
+            :class:`WindowedBloomFilter` (constant memory, rare false
+            positives). Defaults to ``LRUSet()``.
+        key: function extracting the id from a line, defaults to
+            :func:`activity_id`.
+
+    Attributes:
+        dropped (int): number of duplicates dropped.
+    """
+
+    def __init__(self, seen=None, key=activity_id):
+        self.seen = seen if seen is not None else LRUSet()
+        self.key = key
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, line):
+        """
+        Record the id of ``line``.
+
+        Returns:
+            bool: ``True`` if the line should be dropped.
+        """
+        k = self.key(line)
+        if k is None:
+            return False
+
+        with self._lock:
+            if self.seen.add(k):
+                self.dropped += 1
+                return True
+            return False
@@ -37,4 +37,14 @@ class BadPowerTrackUrlException(Exception):
 
 class RuleDeleteFailedException(Exception):
     """ Raised when a rule delete fails. """
-    pass
\ No newline at end of file
+    pass
+
+
+class RuleSyntaxException(BadArgumentException):
+    """
+    Raised when rules fail client side validation. ``errors`` maps each
+    invalid rule value to its error messages.
+    """
+    def __init__(self, message, errors=None):
+        BadArgumentException.__init__(self, message)
+        self.errors = errors or {}
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Line framing for the PowerTrack stream.
+
+Activities are delimited by ``\\r\\n`` and keep-alives are bare ``\\r\\n``.
+:class:`LineSplitter` turns arbitrarily sized chunks read from the
+connection into complete lines, so the connection can be read in large
+chunks instead of the 512 bytes ``requests.Response.iter_lines`` uses.
+"""
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class LineSplitter(object):
+    """
+    Incremental line splitter backed by a single reusable ``bytearray``.
+
+    Lines are cut with ``bytearray.find`` and copied out exactly once
+    through a ``memoryview``; the consumed prefix is then discarded in
+    place. A trailing ``\\r`` is stripped from each line, so both ``\\r\\n``
+    and ``\\n`` delimited streams are supported.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, chunk):
+        """
+        Append ``chunk`` and return the lines it completed.
+
+        Args:
+            chunk (bytes): data read from the connection.
+
+        Returns:
+            list:
+            complete lines as ``bytes`` without line terminators. Keep-alives
+            are returned as empty lines.
+        """
+        buf = self._buf
+        buf += chunk
+        end = buf.find(b"\n")
+        if end < 0:
+            return []
+
+        lines = []
+        start = 0
+        view = memoryview(buf)
+        try:
+            while end >= 0:
+                stop = end
+                if stop > start and buf[stop - 1] == 13:  # \r
+                    stop -= 1
+                lines.append(view[start:stop].tobytes())
+                start = end + 1
+                end = buf.find(b"\n", start)
+        finally:
+            # An exported view prevents resizing the bytearray
+            del view
+
+        del buf[:start]
+        return lines
+
+    def flush(self):
+        """
+        Return and clear an incomplete trailing line, if any. Call once the
+        connection has ended.
+
+        Returns:
+            list: zero or one lines.
+        """
+        line = bytes(self._buf).rstrip(b"\r")
+        del self._buf[:]
+        return [line] if line else []
+
+    def __len__(self):
+        """ Number of buffered bytes not yet returned as a line. """
+        return len(self._buf)
@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+"""
+Local evaluation of PowerTrack rules against activities.
+
+:class:`RuleMatcher` compiles a rule set, e.g. the output of
+:func:`gnippy.rules.get_rules`, and tells which rules an activity matches,
+for routing or to re-derive ``matching_rules`` of archived or replayed
+activities. Both the Activity Streams and the original Twitter format are
+understood.
+
+Keywords and phrases match whole tokens, case-insensitively, like in
+PowerTrack. Every rule is indexed by a set of tokens, tags or users one of
+which must be present for the rule to match, so an activity is only
+evaluated against the few rules it could match. Rules that cannot be
+indexed, e.g. ``contains:`` or ``bio:`` only, are evaluated for every
+activity.
+
+Geographic and profile geo operators are not evaluated; rules using them
+never match and are listed in :attr:`RuleMatcher.unsupported`. ``sample:``
+always matches, as PowerTrack's sampling cannot be reproduced.
+"""
+
+import re
+
+from gnippy import rulesyntax
+from gnippy.rulesyntax import (And, Not, Or, KEYWORD, PHRASE, HASHTAG,
+                               MENTION, CASHTAG)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+UNSUPPORTED_OPERATORS = frozenset([
+    "bounding_box", "point_radius", "profile_bounding_box",
+    "profile_point_radius", "time_zone",
+])
+
+
+def tokenize(text):
+    """
+    Returns:
+        list: the lower case word tokens of ``text``.
+    """
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _get(obj, *path):
+    """ Nested lookup returning None for missing keys. """
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _lower_set(values):
+    return frozenset(v.lower() for v in values if v)
+
+
+class Activity(object):
+    """
+    Matchable view of an activity. Fields are extracted lazily and only
+    once, whichever format the activity is in.
+    """
+
+    def __init__(self, activity):
+        self.raw = activity
+        # Activity Streams activities have a verb, original ones don't
+        self.streams = "verb" in activity
+        self._cache = {}
+
+    def _lazy(self, name, compute):
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = compute()
+            return value
+
+    # Text
+
+    @property
+    def text(self):
+        def compute():
+            a = self.raw
+            if self.streams:
+                return _get(a, "long_object", "body") or a.get("body") or ""
+            return _get(a, "extended_tweet", "full_text") or \
+                a.get("full_text") or a.get("text") or ""
+        return self._lazy("text", compute)
+
+    @property
+    def tokens(self):
+        return self._lazy("tokens", lambda: tokenize(self.text))
+
+    @property
+    def token_set(self):
+        return self._lazy("token_set", lambda: frozenset(self.tokens))
+
+    @property
+    def joined(self):
+        """ Tokens separated and surrounded by spaces, for phrase search. """
+        return self._lazy("joined", lambda: " %s " % " ".join(self.tokens))
+
+    # Entities
+
+    def _entities(self, name):
+        a = self.raw
+        if self.streams:
+            return _get(a, "twitter_entities", name) or []
+        return _get(a, "extended_tweet", "entities", name) or \
+            _get(a, "entities", name) or []
+
+    @property
+    def hashtags(self):
+        return self._lazy("hashtags", lambda: _lower_set(
+            h.get("text") for h in self._entities("hashtags")))
+
+    @property
+    def mentions(self):
+        return self._lazy("mentions", lambda: _lower_set(
+            m.get("screen_name") for m in self._entities("user_mentions")))
+
+    @property
+    def cashtags(self):
+        return self._lazy("cashtags", lambda: _lower_set(
+            s.get("text") for s in self._entities("symbols")))
+
+    @property
+    def urls(self):
+        def compute():
+            urls = [u.get("expanded_url") or u.get("url")
+                    for u in self._entities("urls")]
+            if self.streams:
+                urls += [u.get("expanded_url") or u.get("url")
+                         for u in _get(self.raw, "gnip", "urls") or []]
+            return [u.lower() for u in urls if u]
+        return self._lazy("urls", compute)
+
+    @property
+    def media(self):
+        def compute():
+            a = self.raw
+            if self.streams:
+                return _get(a, "twitter_extended_entities", "media") or \
+                    self._entities("media")
+            return _get(a, "extended_tweet", "extended_entities", "media") or \
+                _get(a, "extended_entities", "media") or \
+                self._entities("media")
+        return self._lazy("media", compute)
+
+    # Author
+
+    def _user(self):
+        return self.raw.get("actor" if self.streams else "user") or {}
+
+    @property
+    def screen_name(self):
+        key = "preferredUsername" if self.streams else "screen_name"
+        return (self._user().get(key) or "").lower()
+
+    @property
+    def user_id(self):
+        if self.streams:
+            # "id:twitter.com:1234"
+            return (self._user().get("id") or "").rsplit(":", 1)[-1]
+        return self._user().get("id_str") or ""
+
+    def user_field(self, name):
+        user = self._user()
+        if self.streams:
+            if name == "description":
+                return user.get("summary") or ""
+            if name == "name":
+                return user.get("displayName") or ""
+            if name == "location":
+                return _get(user, "location", "displayName") or ""
+            return {"followers_count": user.get("followersCount"),
+                    "friends_count": user.get("friendsCount"),
+                    "statuses_count": user.get("statusesCount"),
+                    "listed_count": user.get("listedCount"),
+                    "verified": user.get("verified")}.get(name)
+        return user.get(name)
+
+    # Relations
+
+    @property
+    def retweeted(self):
+        """ The retweeted activity or None. """
+        if self.streams:
+            return self.raw.get("object") \
+                if self.raw.get("verb") == "share" else None
+        return self.raw.get("retweeted_status")
+
+    @property
+    def quoted(self):
+        return self.raw.get("twitter_quoted_status" if self.streams
+                            else "quoted_status")
+
+    @property
+    def in_reply_to(self):
+        """ ``(screen name, status id)`` of the replied to status. """
+        if self.streams:
+            link = _get(self.raw, "inReplyTo", "link") or ""
+            # http://twitter.com/screen_name/statuses/1234
+            parts = link.rstrip("/").split("/")
+            if len(parts) >= 3 and parts[-2] == "statuses":
+                return parts[-3].lower(), parts[-1]
+            return None, None
+        return ((self.raw.get("in_reply_to_screen_name") or "").lower(),
+                self.raw.get("in_reply_to_status_id_str"))
+
+    @property
+    def lang(self):
+        return self.raw.get("twitter_lang" if self.streams else "lang")
+
+    @property
+    def source(self):
+        if self.streams:
+            return (_get(self.raw, "generator", "displayName") or "").lower()
+        return (self.raw.get("source") or "").lower()
+
+    @property
+    def place(self):
+        place = self.raw.get("location" if self.streams else "place") or {}
+        if self.streams:
+            return place.get("displayName") or "", \
+                _get(place, "twitter_country_code") or ""
+        return place.get("full_name") or "", place.get("country_code") or ""
+
+    @property
+    def has_geo(self):
+        a = self.raw
+        if self.streams:
+            return bool(a.get("geo") or a.get("location"))
+        return bool(a.get("coordinates") or a.get("geo") or a.get("place"))
+
+    @property
+    def has_profile_geo(self):
+        return bool(_get(self.raw, "gnip", "profileLocations"))
+
+    def features(self):
+        """ Keys to look up in the rule index. """
+        keys = set(self.token_set)
+        keys.update("#" + h for h in self.hashtags)
+        keys.update("@" + m for m in self.mentions)
+        keys.update("$" + c for c in self.cashtags)
+        keys.add("from:" + self.screen_name)
+        keys.add("from:" + self.user_id)
+        return keys
+
+
+def _phrase_in(tokens, joined, phrase, proximity=None):
+    words = tokenize(phrase)
+    if not words:
+        return False
+    if proximity is None:
+        return (" %s " % " ".join(words)) in joined
+
+    # Proximity: all words within ``proximity`` tokens of each other
+    positions = [[i for i, t in enumerate(tokens) if t == w] for w in words]
+    if not all(positions):
+        return False
+    for start in positions[0]:
+        if all(any(abs(p - start) <= proximity for p in ps)
+               for ps in positions[1:]):
+            return True
+    return False
+
+
+def _count_range(value):
+    """ ``"1000"`` means at least 1000, ``"1000..2000"`` a closed range. """
+    low, _, high = value.partition("..")
+    try:
+        return int(low), int(high) if high else None
+    except ValueError:
+        return None
+
+
+def _compile_operator(name, value):
+    v = value.lower()
+
+    if name == "from":
+        return lambda a: v in (a.screen_name, a.user_id)
+    if name == "to":
+        return lambda a: a.in_reply_to[0] == v or \
+            a.raw.get("in_reply_to_user_id_str") == v
+    if name == "retweets_of":
+        def retweets_of(a):
+            rt = a.retweeted
+            if not rt:
+                return False
+            rt = Activity(rt)
+            return v in (rt.screen_name, rt.user_id)
+        return retweets_of
+    if name == "lang":
+        return lambda a: (a.lang or "").lower() == v
+    if name == "has":
+        return {
+            "links": lambda a: bool(a.urls),
+            "media": lambda a: bool(a.media),
+            "images": lambda a: any(m.get("type") == "photo"
+                                    for m in a.media),
+            "videos": lambda a: any(m.get("type") in ("video", "animated_gif")
+                                    for m in a.media),
+            "mentions": lambda a: bool(a.mentions),
+            "hashtags": lambda a: bool(a.hashtags),
+            "symbols": lambda a: bool(a.cashtags),
+            "geo": lambda a: a.has_geo,
+            "profile_geo": lambda a: a.has_profile_geo,
+        }.get(v)
+    if name == "is":
+        return {
+            "retweet": lambda a: a.retweeted is not None,
+            "reply": lambda a: a.in_reply_to[1] is not None,
+            "quote": lambda a: a.quoted is not None,
+            "verified": lambda a: bool(a.user_field("verified")),
+        }.get(v)
+    if name in ("url", "url_contains"):
+        return lambda a: any(v in u for u in a.urls)
+    if name == "contains":
+        return lambda a: v in a.text.lower()
+    if name in ("bio", "bio_name", "bio_location"):
+        field = {"bio": "description", "bio_name": "name",
+                 "bio_location": "location"}[name]
+
+        def bio(a):
+            tokens = tokenize(a.user_field(field))
+            return _phrase_in(tokens, " %s " % " ".join(tokens), v)
+        return bio
+    if name == "place":
+        def place(a):
+            tokens = tokenize(a.place[0])
+            return _phrase_in(tokens, " %s " % " ".join(tokens), v)
+        return place
+    if name == "place_country":
+        return lambda a: a.place[1].lower() == v
+    if name == "source":
+        return lambda a: v in a.source
+    if name in ("followers_count", "friends_count", "statuses_count",
+                "listed_count"):
+        bounds = _count_range(v)
+        if bounds is None:
+            return lambda a: False
+        low, high = bounds
+
+        def count(a):
+            n = a.user_field(name)
+            return n is not None and n >= low and (high is None or n <= high)
+        return count
+    if name == "in_reply_to_status_id":
+        return lambda a: a.in_reply_to[1] == v
+    if name == "retweets_of_status_id":
+        def retweets_of_status_id(a):
+            rt = a.retweeted
+            if not rt:
+                return False
+            status_id = rt.get("id_str") or \
+                str(rt.get("id") or "").rsplit(":", 1)[-1]
+            return status_id == v
+        return retweets_of_status_id
+    if name == "sample":
+        return lambda a: True
+    return None
+
+
+class _Compiler(object):
+    """ Turns a rule tree into a predicate and its index keys. """
+
+    def __init__(self):
+        self.unsupported = False
+
+    def predicate(self, node):
+        if isinstance(node, Not):
+            child = self.predicate(node.child)
+            return lambda a: not child(a)
+        if isinstance(node, And):
+            children = [self.predicate(c) for c in node.children]
+            return lambda a: all(c(a) for c in children)
+        if isinstance(node, Or):
+            children = [self.predicate(c) for c in node.children]
+            return lambda a: any(c(a) for c in children)
+        return self.term(node)
+
+    def term(self, term):
+        value = term.value.lower()
+        if term.kind == KEYWORD:
+            words = tokenize(value)
+            if len(words) == 1:
+                word = words[0]
+                return lambda a: word in a.token_set
+            return lambda a: _phrase_in(a.tokens, a.joined, value)
+        if term.kind == PHRASE:
+            proximity = term.proximity
+            return lambda a: _phrase_in(a.tokens, a.joined, value, proximity)
+        if term.kind == HASHTAG:
+            return lambda a: value in a.hashtags
+        if term.kind == MENTION:
+            return lambda a: value in a.mentions
+        if term.kind == CASHTAG:
+            return lambda a: value in a.cashtags
+
+        predicate = _compile_operator(term.operator, term.value)
+        if predicate is None or term.operator in UNSUPPORTED_OPERATORS:
+            self.unsupported = True
+            return lambda a: False
+        return predicate
+
+    def keys(self, node):
+        """
+        A set of index keys one of which must be present for node to match,
+        or None if there is no such set.
+        """
+        if isinstance(node, Not):
+            return None
+        if isinstance(node, And):
+            candidates = [k for k in map(self.keys, node.children)
+                          if k is not None]
+            return min(candidates, key=len) if candidates else None
+        if isinstance(node, Or):
+            keys = set()
+            for child in node.children:
+                k = self.keys(child)
+                if k is None:
+                    return None
+                keys |= k
+            return keys
+        return self.term_keys(node)
+
+    def term_keys(self, term):
+        value = term.value.lower()
+        if term.kind in (KEYWORD, PHRASE):
+            words = tokenize(value)
+            # The longest word is likely the rarest
+            return set([max(words, key=len)]) if words else None
+        if term.kind in (HASHTAG, MENTION, CASHTAG):
+            prefix = {HASHTAG: "#", MENTION: "@", CASHTAG: "$"}[term.kind]
+            return set([prefix + value])
+        if term.operator == "from":
+            return set(["from:" + value])
+        return None
+
+
+class RuleMatcher(object):
+    """
+    Compiled rule set.
+
+    Args:
+        rules_list: built rules, e.g. from :func:`gnippy.rules.get_rules`,
+            or :class:`gnippy.rules.Rule` objects.
+
+    Attributes:
+        rules (list): the rules, in the given order.
+        invalid (list): rules that failed to parse; they never match.
+        unsupported (list): rules using operators that are not evaluated
+            locally; they never match.
+    """
+
+    def __init__(self, rules_list):
+        self.rules = list(rules_list)
+        self.invalid = []
+        self.unsupported = []
+        self._predicates = []
+        self._index = {}
+        self._unindexed = []
+
+        for i, rule in enumerate(self.rules):
+            value = rule.value if hasattr(rule, "value") else rule["value"]
+            try:
+                node = rulesyntax.parse(value)
+            except rulesyntax.RuleParseError:
+                self.invalid.append(rule)
+                self._predicates.append(None)
+                continue
+
+            compiler = _Compiler()
+            self._predicates.append(compiler.predicate(node))
+            if compiler.unsupported:
+                self.unsupported.append(rule)
+
+            keys = compiler.keys(node)
+            if keys is None:
+                self._unindexed.append(i)
+            else:
+                for key in keys:
+                    self._index.setdefault(key, []).append(i)
+
+    def _candidates(self, activity):
+        index = self._index
+        candidates = set(self._unindexed)
+        for key in activity.features():
+            ids = index.get(key)
+            if ids:
+                candidates.update(ids)
+        return sorted(candidates)
+
+    def match(self, activity):
+        """
+        Args:
+            activity: a decoded activity.
+
+        Returns:
+            list: the rules ``activity`` matches, in rule set order.
+        """
+        a = activity if isinstance(activity, Activity) else Activity(activity)
+        predicates = self._predicates
+        return [self.rules[i] for i in self._candidates(a)
+                if predicates[i] is not None and predicates[i](a)]
+
+    def matching_rules(self, activity):
+        """
+        Returns:
+            list: ``{"value": ..., "tag": ...}`` dicts of the matching rules,
+            like PowerTrack's ``matching_rules``.
+        """
+        result = []
+        for rule in self.match(activity):
+            if hasattr(rule, "value"):
+                result.append({"value": rule.value, "tag": rule.tag})
+            else:
+                result.append({"value": rule["value"],
+                               "tag": rule.get("tag")})
+        return result
+
+    def tag(self, activity):
+        """
+        Set ``matching_rules`` of ``activity`` in place, under ``gnip`` for
+        Activity Streams activities.
+
+        Returns:
+            the activity.
+        """
+        a = Activity(activity)
+        matching = self.matching_rules(a)
+        if a.streams:
+            activity.setdefault("gnip", {})["matching_rules"] = matching
+        else:
+            activity["matching_rules"] = matching
+        return activity
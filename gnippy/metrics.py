@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Stream throughput and latency metrics.
+
+Every :class:`gnippy.powertrackclient.PowerTrackClient` has a
+:class:`Metrics` instance as its ``metrics`` attribute. It reads the
+counters the worker keeps anyway and only adds timing of the callback,
+so it is cheap enough to leave on at firehose rates. Comparing the read
+rate with the callback latency and the buffer depth tells whether a
+client is network or callback bound.
+"""
+
+from bisect import bisect_left
+import functools
+import threading
+
+from gnippy.compat import (BaseHTTPRequestHandler, HTTPServer, monotonic,
+                           perf_counter)
+
+# Callback latency buckets in seconds, from 10 microseconds to 10 seconds
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram(object):
+    """
+    Thread-safe histogram with fixed bucket upper bounds, like a Prometheus
+    histogram.
+
+    Args:
+        buckets: sorted upper bounds; larger values go to an implicit
+            ``+Inf`` bucket.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: ``(counts, sum, max)``, counts per bucket, not cumulative.
+        """
+        with self._lock:
+            return list(self._counts), self._sum, self._max
+
+    @staticmethod
+    def quantile(buckets, counts, q):
+        """
+        Upper bound of the bucket containing quantile ``q`` of ``counts``,
+        ``None`` if empty or in the ``+Inf`` bucket.
+        """
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(buckets, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class Metrics(object):
+    """
+    Metrics of one stream connection.
+
+    Args:
+        buckets: callback latency histogram buckets in seconds.
+
+    Attributes:
+        callback_latency (Histogram): seconds spent in each callback call.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.callback_latency = Histogram(buckets)
+        self.worker = None
+        self.buffer = None
+        self.deduplicator = None
+        self._started = self._attached = monotonic()
+
+    def attach(self, worker=None, buffer=None, deduplicator=None):
+        """ Read counters from these, done by the client on connect. """
+        self.worker = worker
+        self.buffer = buffer
+        self.deduplicator = deduplicator
+        self._attached = monotonic()
+
+    def timed(self, callback):
+        """
+        Returns:
+            callable: ``callback`` recording its latency.
+        """
+        observe = self.callback_latency.observe
+
+        @functools.wraps(callback)
+        def timed_callback(*args):
+            start = perf_counter()
+            try:
+                return callback(*args)
+            finally:
+                observe(perf_counter() - start)
+
+        return timed_callback
+
+    def snapshot(self, since=None):
+        """
+        Take a snapshot without side effects, so that any number of readers,
+        e.g. a Prometheus scrape and a health check, can share the metrics.
+
+        Args:
+            since (dict): an earlier snapshot of these metrics. Rates are
+                then computed over the time since it was taken, so a reader
+                keeping its previous snapshot gets rates per interval. By
+                default rates are averages since connect.
+
+        Returns:
+            dict:
+            the counters, ``lines_per_second``, ``bytes_per_second``,
+            ``seconds_since_data``, a ``callback`` dict of latency
+            statistics and, if used, buffer and deduplicator counters.
+        """
+        now = monotonic()
+        worker = self.worker
+        lines = getattr(worker, "lines", 0)
+        received = getattr(worker, "bytes_received", 0)
+
+        if since is None:
+            then, prev_lines, prev_received = self._attached, 0, 0
+        else:
+            then = self._started + since["uptime"]
+            prev_lines = since["lines"]
+            prev_received = since["bytes_received"]
+        elapsed = max(now - then, 1e-9)
+
+        last_data = getattr(worker, "last_data", None)
+        counts, total, maximum = self.callback_latency.snapshot()
+        calls = sum(counts)
+        buckets = self.callback_latency.buckets
+
+        result = {
+            "uptime": now - self._started,
+            "alive": bool(worker and worker.is_alive()),
+            "lines": lines,
+            "keep_alives": getattr(worker, "keep_alives", 0),
+            "bytes_received": received,
+            "bytes_decompressed": getattr(worker, "bytes_decompressed", 0),
+            "reconnects": getattr(worker, "reconnects", 0),
+            "lines_per_second": (lines - prev_lines) / elapsed,
+            "bytes_per_second": (received - prev_received) / elapsed,
+            "seconds_since_data":
+                now - last_data if last_data is not None else None,
+            "callback": {
+                "count": calls,
+                "sum": total,
+                "mean": total / calls if calls else None,
+                "max": maximum,
+                "p50": Histogram.quantile(buckets, counts, 0.5),
+                "p90": Histogram.quantile(buckets, counts, 0.9),
+                "p99": Histogram.quantile(buckets, counts, 0.99),
+            },
+        }
+        if self.buffer is not None:
+            stats = self.buffer.stats()
+            result.update(("buffer_" + k, v) for k, v in stats.items())
+        if self.deduplicator is not None:
+            result["duplicates_dropped"] = self.deduplicator.dropped
+        return result
+
+    def to_prometheus(self, prefix="gnippy", labels=None):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): metric name prefix.
+            labels (dict): labels added to every sample, e.g. a stream name.
+
+        Returns:
+            str: the exposition.
+        """
+        label_pairs = sorted((labels or {}).items())
+
+        def fmt_labels(extra=()):
+            pairs = label_pairs + list(extra)
+            if not pairs:
+                return ""
+            return "{%s}" % ",".join(
+                '%s="%s"' % (k, str(v).replace("\\", "\\\\")
+                             .replace('"', '\\"')) for k, v in pairs)
+
+        snap = self.snapshot()
+        out = []
+
+        def sample(name, kind, help_text, value):
+            if value is None:
+                return
+            out.append("# HELP %s_%s %s" % (prefix, name, help_text))
+            out.append("# TYPE %s_%s %s" % (prefix, name, kind))
+            out.append("%s_%s%s %s" % (prefix, name, fmt_labels(),
+                                       _number(value)))
+
+        sample("lines_total", "counter", "Activity lines received.",
+               snap["lines"])
+        sample("keep_alives_total", "counter", "Keep-alive newlines received.",
+               snap["keep_alives"])
+        sample("received_bytes_total", "counter",
+               "Bytes read from the network.", snap["bytes_received"])
+        sample("decompressed_bytes_total", "counter",
+               "Bytes after decompression.", snap["bytes_decompressed"])
+        sample("reconnects_total", "counter", "Reconnects made.",
+               snap["reconnects"])
+        sample("up", "gauge", "Whether the worker is running.",
+               int(snap["alive"]))
+        sample("seconds_since_data", "gauge",
+               "Seconds since an activity was last received.",
+               snap["seconds_since_data"])
+        if "buffer_depth" in snap:
+            sample("buffer_depth", "gauge", "Lines waiting in the buffer.",
+                   snap["buffer_depth"])
+            sample("buffer_high_water", "gauge", "Largest buffer depth.",
+                   snap["buffer_high_water"])
+            sample("buffer_dropped_total", "counter",
+                   "Lines dropped by the buffer.", snap["buffer_dropped"])
+        if "duplicates_dropped" in snap:
+            sample("duplicates_dropped_total", "counter",
+                   "Duplicate activities dropped.",
+                   snap["duplicates_dropped"])
+
+        name = "%s_callback_seconds" % prefix
+        counts, total, _ = self.callback_latency.snapshot()
+        out.append("# HELP %s Time spent in the callback." % name)
+        out.append("# TYPE %s histogram" % name)
+        cumulative = 0
+        bounds = [_number(b) for b in self.callback_latency.buckets]
+        for bound, count in zip(bounds + ["+Inf"], counts):
+            cumulative += count
+            out.append("%s_bucket%s %d" % (name, fmt_labels([("le", bound)]),
+                                           cumulative))
+        out.append("%s_sum%s %s" % (name, fmt_labels(), _number(total)))
+        out.append("%s_count%s %d" % (name, fmt_labels(), cumulative))
+        return "\n".join(out) + "\n"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def serve_prometheus(metrics, port, address="", prefix="gnippy",
+                     labels=None):
+    """
+    Serve ``metrics`` in the Prometheus text format over HTTP from a daemon
+    thread.
+
+    Args:
+        metrics: a :class:`Metrics` instance.
+        port (int): port to listen on, 0 for any free port.
+        address (str): address to bind, all interfaces by default.
+
+    Returns:
+        the HTTP server; call its ``shutdown()`` method to stop it.
+    """
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            body = metrics.to_prometheus(prefix=prefix,
+                                         labels=labels).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer((address, port), Handler)
+    t = threading.Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    return server
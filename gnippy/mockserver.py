@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the PowerTrack stream and rules API.
+
+:class:`MockPowerTrackServer` serves a chunked stream of synthetic
+activities over real HTTP, so that clients can be tested and benchmarked
+end to end, network stack, chunked transfer encoding and gzip included,
+without GNIP. Message rate and size, keep-alives, forced disconnects and
+compression are configurable::
+
+    with MockPowerTrackServer(rate=1000, message_size=2000) as server:
+        client = PowerTrackClient(callback, url=server.url,
+                                  auth=("user", "pass"))
+
+The path of :attr:`MockPowerTrackServer.url` contains ``stream.gnip.com``,
+so :mod:`gnippy.rules` derives a rules url on the same server from it; the
+rules API keeps its rules in memory.
+"""
+
+import base64
+import json
+import random
+import threading
+import time
+import zlib
+
+from gnippy.compat import (BaseHTTPRequestHandler, HTTPServer, ThreadingMixIn,
+                           monotonic, urlparse)
+
+STREAM_PATH = "/stream.gnip.com/accounts/mock/publishers/twitter/streams/" \
+              "track/prod.json"
+
+# Field order as GNIP sends them, the actor with its own postedTime first
+_ACTIVITY = (b'{"id":"tag:search.twitter.com,2005:%020d",'
+             b'"objectType":"activity","actor":{"objectType":"person",'
+             b'"preferredUsername":"mock",'
+             b'"postedTime":"2010-01-01T00:00:00.000Z"},'
+             b'"verb":"post","postedTime":"%s",'
+             b'"body":"%s","gnip":{"matching_rules":[{"tag":"mock"}]}}\r\n')
+
+# Size of an activity without body, from a 20 digit id and 24 character time
+_EMPTY_SIZE = len(_ACTIVITY) - len(b"%020d%s%s\r\n") + 20 + 24
+
+
+def _text(size, seed=0):
+    """
+    ``size`` bytes of deterministic pseudo-random words, so that activity
+    bodies compress about as well as real text.
+    """
+    rnd = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rnd.choice(letters) for _ in range(rnd.randint(1, 10)))
+             for _ in range(2000)]
+    text = []
+    length = 0
+    while length < size:
+        word = rnd.choice(words)
+        text.append(word)
+        length += len(word) + 1
+    return " ".join(text)[:size].encode("ascii")
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Benchmarks open many connections at once
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def _authorized(self):
+        if self.mock.auth is None:
+            return True
+        expected = "Basic " + base64.b64encode(
+            ("%s:%s" % self.mock.auth).encode("utf-8")).decode("ascii")
+        if self.headers.get("Authorization") == expected:
+            return True
+        self._respond(401, {"error": {"message": "Unauthorized"}})
+        return False
+
+    def _respond(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if urlparse(self.path).path.endswith("/rules.json"):
+            self._respond(200, {"rules": self.mock.rules()})
+        else:
+            self._stream()
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        parts = urlparse(self.path)
+        if not parts.path.endswith("/rules.json"):
+            self._respond(404, {"error": {"message": "Not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            rules = json.loads(self.rfile.read(length).decode("utf-8"))
+            rules = rules["rules"]
+        except (ValueError, KeyError, TypeError):
+            self._respond(400, {"error": {"message": "Malformed JSON"}})
+            return
+
+        if "_method=delete" in parts.query:
+            self.mock.delete_rules(rules)
+            self._respond(200, {})
+        else:
+            self.mock.add_rules(rules)
+            self._respond(201, {})
+
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(("%x\r\n" % len(data)).encode("ascii") +
+                             data + b"\r\n")
+            self.mock._sent(len(data))
+
+    def _stream(self):
+        mock = self.mock
+        compressor = None
+        if mock.compression and \
+                "gzip" in self.headers.get("Accept-Encoding", ""):
+            # Fast compression keeps the server ahead of the client
+            compressor = zlib.compressobj(1, zlib.DEFLATED, 31)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        if compressor:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        mock._connected()
+
+        def send(data):
+            if compressor:
+                # Flush every write, like GNIP, so it can be decoded at once
+                data = compressor.compress(data) + \
+                    compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._write_chunk(data)
+            self.wfile.flush()
+
+        try:
+            if mock._serve(send):
+                # Forced disconnect: drop the connection mid-stream
+                self.close_connection = True
+                return
+            if compressor:
+                self._write_chunk(compressor.flush())
+            self.wfile.write(b"0\r\n\r\n")
+        except EnvironmentError:
+            # The client went away
+            pass
+        self.close_connection = True
+
+
+class MockPowerTrackServer(object):
+    """
+    Local HTTP server mimicking a PowerTrack stream and its rules API.
+
+    Every connection receives activities of ``message_size`` bytes,
+    delimited by ``\\r\\n``, with ids unique across connections. While no
+    activity is due a keep-alive newline is sent every
+    ``heartbeat_interval`` seconds.
+
+    Args:
+        rate (float): activities per second per connection, ``None`` to
+            send as fast as the client reads.
+        message_size (int): approximate size of an activity in bytes.
+        heartbeat_interval (float): seconds of silence after which a
+            keep-alive is sent.
+        messages (int): activities after which a connection is closed
+            cleanly, ``None`` for an endless stream.
+        disconnect_after (int): activities after which a connection is
+            dropped mid-stream, as after a network failure. ``None``
+            disables forced disconnects.
+        compression (bool): gzip the stream if the client accepts it.
+        chunk_size (int): bytes of activities written at once when ``rate``
+            does not limit it.
+        auth: ``("account", "password")`` required from clients, ``None``
+            to accept any credentials.
+        rules (list): initial rules, dicts with ``value`` and ``tag``.
+        address (str): address to bind.
+        port (int): port to listen on, 0 for any free port.
+
+    Attributes:
+        connections (int): stream connections made.
+        disconnects (int): connections dropped by ``disconnect_after``.
+        messages_sent (int): activities sent over all connections.
+        bytes_sent (int): stream bytes written, compressed if compressed.
+    """
+
+    def __init__(self, rate=None, message_size=1000, heartbeat_interval=10.0,
+                 messages=None, disconnect_after=None, compression=True,
+                 chunk_size=64 * 1024, auth=None, rules=None,
+                 address="127.0.0.1", port=0):
+        if rate is not None and not rate > 0:
+            raise ValueError("rate must be positive or None")
+        if disconnect_after is not None and disconnect_after < 1:
+            raise ValueError("disconnect_after must be positive or None")
+
+        self.rate = rate
+        self.message_size = message_size
+        self.heartbeat_interval = heartbeat_interval
+        self.messages = messages
+        self.disconnect_after = disconnect_after
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.auth = auth
+        self.connections = 0
+        self.disconnects = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+        self._body_size = max(0, message_size - _EMPTY_SIZE)
+        # Bodies are cut from this at varying offsets
+        self._text = _text(self._body_size + 64 * 1024)
+        self._line_size = _EMPTY_SIZE + self._body_size + 2
+        self._next_id = 0
+        self._rules = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._server = _Server((address, port), _Handler)
+        self._server.mock = self
+        if rules:
+            self.add_rules(rules)
+
+    @property
+    def address(self):
+        """ ``(host, port)`` the server listens on. """
+        return self._server.server_address[:2]
+
+    @property
+    def url(self):
+        """ Stream url, the rules url is derived from it by gnippy. """
+        return "http://%s:%d%s" % (self.address + (STREAM_PATH,))
+
+    def start(self):
+        """ Serve from a daemon thread. """
+        # Short poll interval: stop() waits for it
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={"poll_interval": 0.1})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ End every stream cleanly and stop serving. """
+        self._stop.set()
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def rules(self):
+        """
+        Returns:
+            list: the current rules.
+        """
+        with self._lock:
+            return list(self._rules)
+
+    def add_rules(self, rules):
+        with self._lock:
+            values = set(r["value"] for r in self._rules)
+            for rule in rules:
+                if rule["value"] not in values:
+                    values.add(rule["value"])
+                    self._rules.append(
+                        {"value": rule["value"], "tag": rule.get("tag")})
+
+    def delete_rules(self, rules):
+        values = set(r["value"] for r in rules)
+        with self._lock:
+            self._rules = [r for r in self._rules if r["value"] not in values]
+
+    def _connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def _sent(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def _activities(self, count):
+        """ ``count`` activities, each followed by ``\\r\\n``. """
+        posted = time.strftime("%Y-%m-%dT%H:%M:%S.000Z",
+                               time.gmtime()).encode("ascii")
+        with self._lock:
+            first = self._next_id
+            self._next_id += count
+            self.messages_sent += count
+        text = self._text
+        size = self._body_size
+        span = len(text) - size
+        activities = []
+        for i in range(first, first + count):
+            offset = i * 7919 % span
+            activities.append(_ACTIVITY % (i, posted,
+                                           text[offset:offset + size]))
+        return b"".join(activities)
+
+    def _serve(self, send):
+        """
+        Stream to one connection.
+
+        Returns:
+            bool: ``True`` for a forced disconnect, ``False`` once the
+            stream ended or the server stopped.
+        """
+        per_write = max(1, self.chunk_size // self._line_size)
+        limit = self.messages
+        if self.disconnect_after is not None:
+            limit = self.disconnect_after if limit is None \
+                else min(limit, self.disconnect_after)
+
+        sent = 0
+        start = last_write = monotonic()
+        while not self._stop.is_set():
+            if limit is not None and sent >= limit:
+                if self.disconnect_after is not None and \
+                        sent >= self.disconnect_after:
+                    with self._lock:
+                        self.disconnects += 1
+                    return True
+                return False
+
+            now = monotonic()
+            due = per_write if self.rate is None else \
+                min(per_write, int((now - start) * self.rate) + 1 - sent)
+            if limit is not None:
+                due = min(due, limit - sent)
+
+            if due > 0:
+                send(self._activities(due))
+                sent += due
+                last_write = now
+            elif now - last_write >= self.heartbeat_interval:
+                send(b"\r\n")
+                last_write = now
+            else:
+                next_due = start + sent / float(self.rate)
+                self._stop.wait(min(next_due,
+                                    last_write + self.heartbeat_interval) -
+                                now)
+        return False
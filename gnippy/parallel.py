@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Fan-out of stream processing across CPU cores.
+
+A single :class:`gnippy.powertrackclient.Worker` thread cannot both read a
+high volume stream and decode and filter every activity under the GIL.
+:class:`ProcessPool` batches lines on the reading thread and copies each
+batch into a shared memory ring owned by one of N worker processes, so
+lines are never pickled on their way in.
+"""
+
+import ctypes
+import heapq
+import multiprocessing
+import struct
+import threading
+import traceback
+
+from gnippy.batching import Batcher
+from gnippy.compat import Empty, monotonic
+
+DEFAULT_RING_SIZE = 8 * 1024 * 1024
+
+# Record header: payload length and batch sequence number
+_HEADER = struct.Struct("<IQ")
+
+# Sent by a worker process on its results queue, in place of a sequence
+# number, once it exits
+_DONE = None
+
+# Seconds between checks for worker processes that died without a word
+_POLL_INTERVAL = 0.1
+
+
+class SharedRing(object):
+    """
+    Single producer, single consumer ring buffer of byte records in shared
+    memory. Each record is a sequence number and a payload.
+
+    Only the read and write positions are updated under the lock; the data
+    itself is copied outside of it, as the producer and the consumer never
+    touch the same region.
+
+    Args:
+        size (int): capacity in bytes.
+        ctx: ``multiprocessing`` context to allocate from.
+    """
+
+    def __init__(self, size=DEFAULT_RING_SIZE, ctx=multiprocessing):
+        self.size = size
+        self._buf = ctx.RawArray(ctypes.c_char, size)
+        # Total bytes ever written and read; positions are taken modulo size
+        self._head = ctx.RawValue(ctypes.c_ulonglong, 0)
+        self._tail = ctx.RawValue(ctypes.c_ulonglong, 0)
+        self._closed = ctx.RawValue(ctypes.c_bool, False)
+        self._cond = ctx.Condition()
+
+    def free(self):
+        """ Approximate number of free bytes. """
+        return self.size - (self._head.value - self._tail.value)
+
+    def _copy_in(self, pos, data):
+        base = ctypes.addressof(self._buf)
+        pos %= self.size
+        first = min(len(data), self.size - pos)
+        ctypes.memmove(base + pos, data, first)
+        if first < len(data):
+            ctypes.memmove(base, data[first:], len(data) - first)
+
+    def _copy_out(self, pos, n):
+        base = ctypes.addressof(self._buf)
+        pos %= self.size
+        first = min(n, self.size - pos)
+        data = ctypes.string_at(base + pos, first)
+        if first < n:
+            data += ctypes.string_at(base, n - first)
+        return data
+
+    def write(self, seq, payload, alive=None):
+        """
+        Append a record, blocking until there is room.
+
+        Args:
+            alive: called while waiting to check that the consumer still
+                runs, as a dead consumer never makes room. ``None`` waits
+                without a bound.
+
+        Raises:
+            ValueError: if the record can never fit.
+            EOFError: if ``alive`` returns ``False`` while waiting.
+        """
+        needed = _HEADER.size + len(payload)
+        if needed > self.size:
+            raise ValueError("Record of %d bytes exceeds ring size %d" %
+                             (needed, self.size))
+
+        with self._cond:
+            while self.size - (self._head.value - self._tail.value) < needed:
+                if alive is not None and not alive():
+                    raise EOFError("Ring consumer is gone")
+                self._cond.wait(None if alive is None else _POLL_INTERVAL)
+            head = self._head.value
+
+        self._copy_in(head, _HEADER.pack(len(payload), seq))
+        self._copy_in(head + _HEADER.size, payload)
+
+        with self._cond:
+            self._head.value = head + needed
+            self._cond.notify_all()
+
+    def read(self):
+        """
+        Remove the oldest record, blocking while empty.
+
+        Returns:
+            tuple:
+            ``(seq, payload)`` or ``None`` once closed and drained.
+        """
+        with self._cond:
+            while self._head.value == self._tail.value:
+                if self._closed.value:
+                    return None
+                self._cond.wait()
+            tail = self._tail.value
+
+        length, seq = _HEADER.unpack(self._copy_out(tail, _HEADER.size))
+        payload = self._copy_out(tail + _HEADER.size, length)
+
+        with self._cond:
+            self._tail.value = tail + _HEADER.size + length
+            self._cond.notify_all()
+
+        return seq, payload
+
+    def close(self):
+        """ Let the consumer exit once drained. """
+        with self._cond:
+            self._closed.value = True
+            self._cond.notify_all()
+
+
+def _work(index, ring, func, results, ordered, keep):
+    """ Worker process main loop. """
+    try:
+        while True:
+            record = ring.read()
+            if record is None:
+                break
+
+            seq, payload = record
+            try:
+                out = func(payload.split(b"\n"))
+                if keep and out is not None:
+                    # Generators cannot be pickled
+                    out = list(out)
+            except Exception:
+                # Report the lost batch and carry on with the next one
+                results.put((index, seq, None, traceback.format_exc()))
+                continue
+
+            if keep and (out is not None or ordered):
+                results.put((index, seq, out, None))
+    finally:
+        results.put((index, _DONE, None, None))
+
+
+class ProcessPool(object):
+    """
+    Processes stream lines in worker processes.
+
+    Lines are grouped into batches of up to ``batch_size`` lines, or
+    whatever arrived within ``max_latency`` seconds, and each batch is
+    copied to the shared ring of the least loaded worker process. There
+    ``func(lines)`` is called with the batch as a list of ``bytes``. It
+    may decode, filter or write activities itself, acting as a per-worker
+    callback, and may return an iterable of results to pass back to the
+    parent process, or ``None``.
+
+    Pass an instance to :class:`gnippy.powertrackclient.PowerTrackClient`
+    with the ``pool`` argument; the client callback then receives every
+    result returned by ``func``. ``func`` must be picklable, i.e. a module
+    level function, unless the platform forks worker processes.
+
+    A batch for which ``func`` raises is skipped, as are the batches
+    queued for a worker process that dies; both are counted in
+    :attr:`errors` and the pool carries on with the remaining workers.
+
+    Args:
+        func: called in worker processes with each batch of lines.
+        processes (int): number of worker processes, defaults to the CPU
+            count.
+        ordered (bool): deliver results in stream order. Otherwise results
+            are delivered as soon as any worker produces them.
+        batch_size (int): maximum lines per batch.
+        max_latency (float): maximum seconds a line waits for its batch.
+        ring_size (int): bytes of shared memory per worker process; a batch
+            must fit in it.
+        ctx: ``multiprocessing`` context used to start workers.
+
+    Attributes:
+        errors (int): batches for which ``func`` raised, worker processes
+            that died and batches dropped for want of a worker process.
+        error (str): traceback or description of the last error.
+    """
+
+    def __init__(self, func, processes=None, ordered=False, batch_size=256,
+                 max_latency=0.1, ring_size=DEFAULT_RING_SIZE,
+                 ctx=multiprocessing):
+        self.func = func
+        self.processes = processes or multiprocessing.cpu_count()
+        self.ordered = ordered
+        self.ring_size = ring_size
+        self.ctx = ctx
+        self.errors = 0
+        self.error = None
+
+        self._batcher = Batcher(max_count=batch_size, max_latency=max_latency)
+        self._rings = []
+        self._procs = []
+        self._results = None
+        self._collector = None
+        self._seq = 0
+        # Guards the bookkeeping below, shared by dispatch and collector
+        self._lock = threading.Lock()
+        self._dead = set()
+        # Worker of each batch still in flight, to skip the batches lost
+        # with a dead worker in ordered delivery
+        self._owners = None
+        self._pending = []
+        self._next_seq = 0
+
+    def start(self, on_result=None):
+        """
+        Start the worker processes.
+
+        Args:
+            on_result: called in the parent process with every result
+                returned by ``func``. Results are discarded if ``None``.
+        """
+        keep = on_result is not None
+        if keep and self.ordered:
+            self._owners = {}
+        self._results = self.ctx.Queue()
+
+        for index in range(self.processes):
+            ring = SharedRing(self.ring_size, ctx=self.ctx)
+            p = self.ctx.Process(target=_work, args=(
+                index, ring, self.func, self._results, self.ordered, keep))
+            p.daemon = True
+            p.start()
+            self._rings.append(ring)
+            self._procs.append(p)
+
+        self._collector = threading.Thread(target=self._collect,
+                                           args=(on_result,))
+        self._collector.daemon = True
+        self._collector.start()
+
+        self._batcher.start(self._dispatch)
+
+    def put(self, line):
+        """ Queue a line for the worker processes. """
+        self._batcher.add(line)
+
+    def _failed(self, message):
+        with self._lock:
+            self.errors += 1
+            self.error = message
+
+    def _dispatch(self, lines):
+        # Called with the batcher lock held, so each ring has one producer
+        payload = b"\n".join(lines)
+        while True:
+            with self._lock:
+                alive = [i for i, p in enumerate(self._procs)
+                         if i not in self._dead and p.is_alive()]
+                if alive:
+                    index = max(alive, key=lambda i: self._rings[i].free())
+                    seq = self._seq
+                    self._seq += 1
+                    if self._owners is not None:
+                        self._owners[seq] = index
+
+            if not alive:
+                self._failed("No worker process left, batch dropped")
+                return
+
+            try:
+                self._rings[index].write(seq, payload,
+                                         alive=self._procs[index].is_alive)
+                return
+            except EOFError:
+                # The collector accounts for the batch with its dead worker
+                continue
+
+    def _deliver(self, out, on_result):
+        for result in out or ():
+            on_result(result)
+
+    def _advance(self, on_result):
+        pending = self._pending
+        while pending and pending[0][0] == self._next_seq:
+            self._deliver(heapq.heappop(pending)[1], on_result)
+            self._next_seq += 1
+
+    def _handle(self, item, running, on_result):
+        index, seq, out, error = item
+        if seq is _DONE:
+            running.discard(index)
+            return
+
+        if error is not None:
+            self._failed(error)
+        if on_result is None:
+            return
+
+        if not self.ordered:
+            self._deliver(out, on_result)
+            return
+
+        with self._lock:
+            owned = self._owners.pop(seq, None) is not None
+        # Otherwise already skipped as lost
+        if owned:
+            heapq.heappush(self._pending, (seq, out))
+            self._advance(on_result)
+
+    def _reap(self, running, on_result):
+        """ Account for worker processes that died without saying so. """
+        dead = [i for i in running if not self._procs[i].is_alive()]
+        if not dead:
+            return
+
+        # A worker that exited normally queued everything before it
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except Empty:
+                break
+            self._handle(item, running, on_result)
+
+        for index in dead:
+            if index not in running:
+                continue
+
+            running.discard(index)
+            lost = []
+            with self._lock:
+                self._dead.add(index)
+                if self._owners is not None:
+                    lost = [seq for seq, owner in self._owners.items()
+                            if owner == index]
+                    for seq in lost:
+                        del self._owners[seq]
+
+            self._failed("Worker process %d exited with code %s" %
+                         (index, self._procs[index].exitcode))
+            for seq in lost:
+                heapq.heappush(self._pending, (seq, None))
+
+        if on_result is not None and self.ordered:
+            self._advance(on_result)
+
+    def _collect(self, on_result):
+        running = set(range(self.processes))
+        checked = monotonic()
+        while running:
+            try:
+                item = self._results.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                item = None
+            if item is not None:
+                self._handle(item, running, on_result)
+
+            if monotonic() - checked >= _POLL_INTERVAL:
+                checked = monotonic()
+                self._reap(running, on_result)
+
+    def close(self):
+        """
+        Dispatch the remaining lines, then wait for the worker processes to
+        finish them and for their results to be delivered.
+        """
+        self._batcher.close()
+        for ring in self._rings:
+            ring.close()
+        for p in self._procs:
+            p.join()
+        if self._collector:
+            self._collector.join()
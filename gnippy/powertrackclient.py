@@ -1,9 +1,41 @@
 # -*- coding: utf-8 -*-
 
 from contextlib import closing
+import math
 import threading
+import time
+import zlib
 import requests
+from requests.packages.urllib3.exceptions import (ProtocolError,
+                                                  ReadTimeoutError, SSLError)
 from gnippy import config
+from gnippy.dedup import Deduplicator
+from gnippy.errors import BadArgumentException
+from gnippy.compat import (monotonic, perf_counter, urlencode, urlparse,
+                           urlunparse)
+from gnippy.framing import DEFAULT_CHUNK_SIZE, LineSplitter
+from gnippy.metrics import Metrics
+from gnippy.reconnect import NETWORK, STALL, ReconnectPolicy
+
+# GNIP sends a keep-alive newline every 10 seconds and recommends treating
+# 30 seconds of silence as a stalled connection.
+DEFAULT_STALL_TIMEOUT = 30.0
+CONNECT_TIMEOUT = 10.0
+
+# Longest gap GNIP can replay with the backfillMinutes parameter
+MAX_BACKFILL_MINUTES = 5
+
+
+def add_query_params(url, params):
+    """
+    Returns:
+        str: ``url`` with the ``params`` dict appended to its query string.
+    """
+    parts = urlparse(url)
+    query = urlencode(sorted(params.items()))
+    if parts.query:
+        query = parts.query + "&" + query
+    return urlunparse(parts._replace(query=query))
 
 
 class PowerTrackClient():
@@ -15,21 +47,104 @@ class PowerTrackClient():
         callback: On data callback for :class:`Worker`
         url: stream url
         auth: stream authentication, ``("account", "password")`` tuple
+        reconnect_policy: :class:`gnippy.reconnect.ReconnectPolicy` deciding
+            if and when :class:`Worker` reconnects after the connection is
+            lost. Defaults to ``ReconnectPolicy()``.
+        stall_timeout (float): seconds without any data or keep-alive after
+            which the connection is considered stalled and reconnected.
+            ``None`` waits forever.
+        buffer: optional :class:`gnippy.buffering.Buffer` decoupling reading
+            the stream from calling ``callback``.
+        chunk_size (int): maximum number of bytes read from the connection
+            at once.
+        batcher: optional :class:`gnippy.batching.Batcher`. If given,
+            ``callback`` is called with lists of activities.
+        decoder: optional :class:`gnippy.decoding.Decoder`. If given,
+            ``callback`` receives decoded activities and GNIP system messages
+            go to the decoder's ``on_system`` callback.
+        pool: optional :class:`gnippy.parallel.ProcessPool` processing lines
+            in worker processes. ``callback`` then receives the results of
+            the pool function. Cannot be combined with ``buffer`` or
+            ``decoder``; decode in the pool function instead.
+        deduplicator: optional :class:`gnippy.dedup.Deduplicator` dropping
+            repeated activities before anything else sees them.
+        backfill_minutes (int): if given, reconnects ask GNIP to replay the
+            time since the last data was received, up to this many minutes
+            (at most :data:`MAX_BACKFILL_MINUTES`). Requires backfill to be
+            enabled for the stream. Replayed activities overlap with what
+            was already received, so a ``Deduplicator()`` is added unless
+            ``deduplicator`` is given.
+        compression (bool): request a gzip compressed stream, decompressed
+            incrementally as it arrives.
+        metrics: optional :class:`gnippy.metrics.Metrics`, e.g. with custom
+            latency buckets. One is created if not given.
+        hooks: optional :class:`gnippy.profiling.Hooks` instrumenting the
+            stream, see :meth:`set_hooks`.
 
     Attributes:
         worker: ``None`` or current :class:`Worker` if :meth:`connect`
             successful.
+        metrics: the :class:`gnippy.metrics.Metrics` of this client.
 
     """
 
-    def __init__(self, callback, **kwargs):
+    def __init__(self, callback, reconnect_policy=None,
+                 stall_timeout=DEFAULT_STALL_TIMEOUT, buffer=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, batcher=None, decoder=None,
+                 pool=None, deduplicator=None, backfill_minutes=None,
+                 compression=True, metrics=None, hooks=None, **kwargs):
+        if pool and (buffer or decoder):
+            raise BadArgumentException(
+                "pool cannot be combined with buffer or decoder")
+        if backfill_minutes is not None and \
+                not 0 < backfill_minutes <= MAX_BACKFILL_MINUTES:
+            raise BadArgumentException(
+                "backfill_minutes must be between 1 and %d" %
+                MAX_BACKFILL_MINUTES)
+        if backfill_minutes and deduplicator is None:
+            deduplicator = Deduplicator()
+
         c = config.resolve(kwargs)
 
         self.callback = callback
         self.url = c['url']
         self.auth = c['auth']
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy()
+        self.stall_timeout = stall_timeout
+        self.buffer = buffer
+        self.chunk_size = chunk_size
+        self.batcher = batcher
+        self.decoder = decoder
+        self.pool = pool
+        self.deduplicator = deduplicator
+        self.backfill_minutes = backfill_minutes
+        self.compression = compression
+        self.metrics = metrics or Metrics()
+        self.hooks = hooks
         self.worker = None
 
+    @property
+    def last_heartbeat(self):
+        """
+        Unix timestamp of the last activity or keep-alive received from the
+        stream, ``None`` if nothing has been received yet.
+        """
+        if self.worker:
+            return self.worker.last_heartbeat
+        return None
+
+    def set_hooks(self, hooks):
+        """
+        Install or, with ``None``, remove instrumentation hooks. Takes
+        effect on a connected client with the next chunk received.
+
+        Args:
+            hooks: a :class:`gnippy.profiling.Hooks` instance or ``None``.
+        """
+        self.hooks = hooks
+        if self.worker:
+            self.worker.hooks = hooks
+
     def connect(self):
         """
         Create a :class:`Worker` daemon and start consuming :attr:`url`.
@@ -41,7 +156,21 @@ class PowerTrackClient():
             raise RuntimeError(
                 "Cannot connect: PowerTrackClient is not re-entrant")
 
-        self.worker = Worker(self.url, self.auth, self.callback)
+        self.worker = Worker(self.url, self.auth,
+                             self.metrics.timed(self.callback),
+                             reconnect_policy=self.reconnect_policy,
+                             stall_timeout=self.stall_timeout,
+                             buffer=self.buffer,
+                             chunk_size=self.chunk_size,
+                             batcher=self.batcher,
+                             decoder=self.decoder,
+                             pool=self.pool,
+                             deduplicator=self.deduplicator,
+                             backfill_minutes=self.backfill_minutes,
+                             compression=self.compression,
+                             hooks=self.hooks)
+        self.metrics.attach(self.worker, buffer=self.buffer,
+                            deduplicator=self.deduplicator)
         self.worker.daemon = True
         self.worker.start()
 
@@ -91,13 +220,67 @@ class PowerTrackClient():
 
 class Worker(threading.Thread):
     """
-    Background worker to fetch data without blocking
+    Background worker to fetch data without blocking. Reconnects according
+    to ``reconnect_policy`` when the connection fails, is closed by the
+    server or stays silent for ``stall_timeout`` seconds, and exits once the
+    policy gives up.
+
+    With a ``buffer`` lines are handed to it instead of ``callback``, and the
+    worker only exits once the buffer consumers have drained it. With a
+    ``batcher`` lines are collected into batches before calling
+    ``callback``; the last partial batch is delivered on exit. With a
+    ``decoder`` lines are decoded after the buffer and before the batcher.
+    With a ``pool`` lines are handed to worker processes and their results
+    continue to the batcher or ``callback``. A ``deduplicator`` is applied on
+    the reading thread before any of these. With ``backfill_minutes``
+    reconnects request a replay of the gap since the last received data.
+
+    Attributes:
+        reconnects (int): number of reconnects made so far.
+        error: last exception that caused a reconnect or ``None``.
+        last_heartbeat (float): unix timestamp of the last line, activity or
+            keep-alive, received or ``None``.
+        last_data (float): :func:`gnippy.compat.monotonic` time an activity
+            was last received or ``None``.
+        lines (int): activity lines received, duplicates included.
+        keep_alives (int): keep-alive newlines received.
+        bytes_received (int): bytes read from the network.
+        bytes_decompressed (int): bytes after decompression, equal to
+            :attr:`bytes_received` for uncompressed streams.
+        hooks: :class:`gnippy.profiling.Hooks` instrumenting the stream or
+            ``None``. May be replaced while running.
     """
-    def __init__(self, url, auth, callback):
+    def __init__(self, url, auth, callback, reconnect_policy=None,
+                 stall_timeout=DEFAULT_STALL_TIMEOUT, buffer=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, batcher=None, decoder=None,
+                 pool=None, deduplicator=None, backfill_minutes=None,
+                 compression=True, hooks=None):
         super(Worker, self).__init__()
         self.url = url
         self.auth = auth
         self.on_data = callback
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy()
+        self.stall_timeout = stall_timeout
+        self.buffer = buffer
+        self.chunk_size = chunk_size
+        self.batcher = batcher
+        self.decoder = decoder
+        self.pool = pool
+        self.deduplicator = deduplicator
+        self.backfill_minutes = backfill_minutes
+        self.compression = compression
+        self.reconnects = 0
+        self.lines = 0
+        self.keep_alives = 0
+        self.last_data = None
+        self.bytes_received = 0
+        self.bytes_decompressed = 0
+        self.error = None
+        self.last_heartbeat = None
+        self.hooks = hooks
+        self._last_received = None
+        self._disconnected_at = None
+        self._failures = 0
         self._stop_event = threading.Event()
 
     def stop(self):
@@ -106,16 +289,245 @@ class Worker(threading.Thread):
     def stopped(self):
         return self._stop_event.is_set()
 
+    def heartbeat(self):
+        """ Record that the connection is alive. """
+        self._last_received = monotonic()
+        self.last_heartbeat = time.time()
+
+    def stalled(self):
+        """
+        Returns:
+            bool:
+            ``True`` if nothing has been received for ``stall_timeout``
+            seconds on the current connection.
+        """
+        return self.stall_timeout is not None and \
+            self._last_received is not None and \
+            monotonic() - self._last_received >= self.stall_timeout
+
+    def _callback(self):
+        """ on_data, instrumented whenever :attr:`hooks` are set. """
+        on_data = self.on_data
+
+        def callback(item):
+            hooks = self.hooks
+            if hooks is None or not hooks.sample_call():
+                return on_data(item)
+
+            hooks.before_callback(item)
+            start = perf_counter()
+            try:
+                return on_data(item)
+            finally:
+                hooks.after_callback(item, perf_counter() - start)
+
+        return callback
+
+    def _sink(self):
+        """ Where lines go after the buffer, if any. """
+        sink = self.batcher.add if self.batcher else self._callback()
+        if self.decoder:
+            sink = self.decoder.wrap(sink)
+        return sink
+
+    def chunks(self, response):
+        """
+        Iterate over the decompressed response body as it arrives.
+
+        gzip and deflate encoded bodies are read raw and fed through an
+        incremental zlib decoder, so each network chunk is decompressed as
+        soon as it is received.
+        """
+        encoding = response.headers.get("Content-Encoding", "").lower()
+        if encoding not in ("gzip", "deflate"):
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                self.bytes_received += len(chunk)
+                self.bytes_decompressed += len(chunk)
+                yield chunk
+            return
+
+        # Accept both gzip and zlib headers
+        decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        try:
+            for chunk in self._raw_chunks(response):
+                self.bytes_received += len(chunk)
+                data = decompressor.decompress(chunk)
+                self.bytes_decompressed += len(data)
+                # Yield even if empty: received data counts as a heartbeat
+                yield data
+
+            data = decompressor.flush()
+        except zlib.error as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        self.bytes_decompressed += len(data)
+        yield data
+
+    def _raw_chunks(self, response):
+        """
+        Iterate over the undecoded response body, raising the requests
+        exceptions ``iter_content`` would instead of urllib3's, so that
+        :meth:`reconnect_loop` handles a dropped connection.
+        """
+        raw = response.raw.stream(self.chunk_size, decode_content=False)
+        while True:
+            try:
+                chunk = next(raw)
+            except StopIteration:
+                return
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except ReadTimeoutError as e:
+                raise requests.exceptions.ConnectionError(e)
+            except SSLError as e:
+                raise requests.exceptions.SSLError(e)
+            yield chunk
+
     def stream(self, response):
-        for line in response.iter_lines():
-            if line:
-                self.on_data(line)
+        if self.pool:
+            deliver = self.pool.put
+        elif self.buffer:
+            deliver = self.buffer.put
+        else:
+            deliver = self._sink()
+        is_duplicate = self.deduplicator.is_duplicate \
+            if self.deduplicator else None
+        splitter = LineSplitter()
+        # perf_counter() after the previous chunk while hooks are set
+        done = None
+        for chunk in self.chunks(response):
+            # Any data, keep-alive newlines included, proves we're connected
+            self.heartbeat()
+            lines = self.lines
+            hooks = self.hooks
+            if hooks is None:
+                done = None
+                if self._deliver(splitter.feed(chunk), deliver, is_duplicate):
+                    return
+            elif hooks.sample_chunk():
+                start = perf_counter()
+                split = splitter.feed(chunk)
+                split_done = perf_counter()
+                stopped = self._deliver(split, deliver, is_duplicate,
+                                        hooks.on_line)
+                delivered = perf_counter()
+                hooks.on_chunk(len(chunk),
+                               start - done if done is not None else None,
+                               split_done - start, delivered - split_done)
+                if stopped:
+                    return
+                done = perf_counter()
+            else:
+                if self._deliver(splitter.feed(chunk), deliver, is_duplicate):
+                    return
+                done = perf_counter()
+
+            if self.lines != lines:
+                self.last_data = monotonic()
+
+        self._deliver(splitter.flush(), deliver, is_duplicate)
+
+    def _deliver(self, lines, deliver, is_duplicate, on_line=None):
+        """
+        Deliver the lines of a chunk.
+
+        Returns:
+            bool: ``True`` if :meth:`stop` was called meanwhile.
+        """
+        for line in lines:
+            # Empty lines are keep-alives
+            if not line:
+                self.keep_alives += 1
+            else:
+                self.lines += 1
+                if on_line is not None:
+                    on_line(line)
+                if not (is_duplicate and is_duplicate(line)):
+                    deliver(line)
 
             if self.stopped():
-                break
+                return True
+        return False
 
-    def run(self):
-        with closing(requests.get(self.url, auth=self.auth, stream=True)) as r:
+    def stream_url(self):
+        """
+        Returns:
+            str:
+            the url to connect to, with a ``backfillMinutes`` parameter
+            covering the gap since data was last received when reconnecting
+            with backfill enabled.
+        """
+        if not self.backfill_minutes or self._disconnected_at is None:
+            return self.url
+
+        gap = monotonic() - self._disconnected_at
+        minutes = min(self.backfill_minutes, int(math.ceil(gap / 60.0)))
+        return add_query_params(self.url, {"backfillMinutes": max(1, minutes)})
+
+    def connect(self):
+        """
+        Make a single connection and stream until it ends or
+        :meth:`stop` is called.
+        """
+        self._last_received = None
+        timeout = (CONNECT_TIMEOUT, self.stall_timeout) \
+            if self.stall_timeout is not None else None
+        try:
+            self._connect(timeout)
+        finally:
+            if self._last_received is not None:
+                self._disconnected_at = self._last_received
+
+    def _connect(self, timeout):
+        headers = {
+            "Accept-Encoding": "gzip" if self.compression else "identity"
+        }
+        with closing(requests.get(self.stream_url(), auth=self.auth,
+                                  headers=headers, stream=True,
+                                  timeout=timeout)) as r:
             # Let user know if something went wrong
             r.raise_for_status()
+            self._failures = 0
+            self.heartbeat()
             self.stream(r)
+
+    def run(self):
+        if self.batcher:
+            self.batcher.start(self._callback())
+        if self.buffer:
+            self.buffer.start(self._sink())
+        if self.pool:
+            self.pool.start(self._sink())
+
+        try:
+            self.reconnect_loop()
+        finally:
+            if self.pool:
+                self.pool.close()
+            if self.buffer:
+                self.buffer.close()
+                self.buffer.join()
+            if self.batcher:
+                self.batcher.close()
+
+    def reconnect_loop(self):
+        while True:
+            try:
+                self.connect()
+                # Server closed the stream without an error
+                kind = NETWORK
+            except requests.exceptions.RequestException as e:
+                self.error = e
+                # requests reports read timeouts while streaming as plain
+                # connection errors, tell stalls apart by the silence.
+                kind = STALL if self.stalled() else \
+                    self.reconnect_policy.classify(e)
+
+            if self.stopped():
+                break
+
+            self._failures += 1
+            delay = self.reconnect_policy.delay(kind, self._failures)
+            if delay is None or self._stop_event.wait(delay):
+                break
+
+            self.reconnects += 1
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation hooks around the stream hot path.
+
+Set a :class:`Hooks` instance on a live client with
+:meth:`gnippy.powertrackclient.PowerTrackClient.set_hooks` and remove it
+with ``set_hooks(None)``; the worker picks the change up with the next
+chunk, without reconnecting. While no hooks are set the worker only pays
+for an attribute lookup per chunk and per callback.
+
+:class:`Profiler` is a ready made implementation attributing time to
+reading from the network (including decompression), splitting lines,
+delivering them and the callback itself.
+"""
+
+import threading
+
+from gnippy.compat import perf_counter
+
+
+class Hooks(object):
+    """
+    Base class for instrumentation hooks, every hook does nothing.
+
+    With ``sample_every`` greater than 1 only every Nth chunk, with its
+    lines, and every Nth callback call is instrumented, to profile
+    production traffic at a fraction of the cost.
+
+    Args:
+        sample_every (int): instrument one in this many chunks and
+            callback calls.
+    """
+
+    def __init__(self, sample_every=1):
+        if sample_every < 1:
+            raise ValueError("sample_every must be positive")
+        self.sample_every = sample_every
+        self._chunks = 0
+        self._calls = 0
+
+    def sample_chunk(self):
+        """ Whether to instrument the next chunk. """
+        self._chunks += 1
+        return self._chunks % self.sample_every == 0
+
+    def sample_call(self):
+        """ Whether to instrument the next callback call. """
+        # Racy when called from several consumer threads, which only makes
+        # the sampling slightly irregular.
+        self._calls += 1
+        return self._calls % self.sample_every == 0
+
+    def on_chunk(self, size, read_time, split_time, deliver_time):
+        """
+        Called on the reading thread after the lines of a sampled chunk
+        were delivered.
+
+        Args:
+            size (int): decompressed bytes in the chunk.
+            read_time (float): seconds spent waiting for and decompressing
+                the chunk, ``None`` for the first chunk after the hooks were
+                set.
+            split_time (float): seconds spent splitting it into lines.
+            deliver_time (float): seconds spent delivering its lines, i.e.
+                deduplication and the buffer, pool or batcher, or decoding
+                and the callback when these run inline.
+        """
+
+    def on_line(self, line):
+        """ Called for each line of a sampled chunk before delivery. """
+
+    def before_callback(self, item):
+        """ Called before a sampled callback call, on the calling thread. """
+
+    def after_callback(self, item, elapsed):
+        """ Called after a sampled callback call with its duration. """
+
+
+class _Stage(object):
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        return {"count": self.count, "total": self.total, "max": self.max,
+                "mean": self.total / self.count if self.count else None}
+
+
+class Profiler(Hooks):
+    """
+    Hooks accumulating time per stage of the stream pipeline::
+
+        client.set_hooks(Profiler(sample_every=10))
+        time.sleep(60)
+        print(client.hooks.report())
+        client.set_hooks(None)
+
+    Args:
+        sample_every (int): see :class:`Hooks`.
+    """
+
+    STAGES = ("read", "split", "deliver", "callback")
+
+    def __init__(self, sample_every=1):
+        super(Profiler, self).__init__(sample_every)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Forget everything measured so far. """
+        with self._lock:
+            self._stages = dict((name, _Stage()) for name in self.STAGES)
+            self._bytes = 0
+            self._lines = 0
+            self._started = perf_counter()
+
+    def on_chunk(self, size, read_time, split_time, deliver_time):
+        with self._lock:
+            self._bytes += size
+            if read_time is not None:
+                self._stages["read"].add(read_time)
+            self._stages["split"].add(split_time)
+            self._stages["deliver"].add(deliver_time)
+
+    def on_line(self, line):
+        # Only the reading thread counts lines
+        self._lines += 1
+
+    def after_callback(self, item, elapsed):
+        with self._lock:
+            self._stages["callback"].add(elapsed)
+
+    def report(self):
+        """
+        Returns:
+            dict:
+            ``count``, ``total``, ``mean`` and ``max`` seconds per stage,
+            the share of sampled reading thread time per stage as
+            ``shares``, and sampled ``bytes`` and ``lines``. When the
+            callback runs inline its time is part of ``deliver``.
+        """
+        with self._lock:
+            stages = dict((name, stage.as_dict())
+                          for name, stage in self._stages.items())
+            reading = sum(self._stages[name].total
+                          for name in ("read", "split", "deliver"))
+            stages["shares"] = dict(
+                (name, self._stages[name].total / reading if reading else 0.0)
+                for name in ("read", "split", "deliver"))
+            stages["bytes"] = self._bytes
+            stages["lines"] = self._lines
+            stages["elapsed"] = perf_counter() - self._started
+            stages["sample_every"] = self.sample_every
+            return stages
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Reconnect policies used by :class:`gnippy.powertrackclient.Worker`.
+
+The defaults follow GNIP's reconnect guidelines: back off quickly from
+network level errors, slowly from HTTP errors and very slowly when rate
+limited.
+"""
+
+import random
+
+import requests
+
+NETWORK = "network"
+STALL = "stall"
+HTTP_4XX = "http_4xx"
+HTTP_5XX = "http_5xx"
+RATE_LIMITED = "rate_limited"
+
+
+class Backoff(object):
+    """
+    Exponential backoff with jitter.
+
+    The delay before the n:th consecutive retry is
+    ``initial * factor ** (n - 1)`` capped at ``maximum``, from which up to
+    ``jitter`` (a fraction) is randomly subtracted so that many clients
+    disconnected at once don't reconnect in lockstep.
+
+    Args:
+        initial (float): delay before the first retry in seconds.
+        maximum (float): upper bound for the delay in seconds.
+        factor (float): growth factor between consecutive retries.
+        jitter (float): fraction of the delay to randomize, 0 to disable.
+        max_retries (int): consecutive retries allowed before giving up,
+            ``None`` for unlimited.
+    """
+
+    def __init__(self, initial, maximum, factor=2.0, jitter=0.5,
+                 max_retries=None):
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.max_retries = max_retries
+
+    def delay(self, attempt):
+        """
+        Args:
+            attempt (int): 1 based number of the consecutive retry.
+
+        Returns:
+            float:
+            seconds to wait before retrying or ``None`` if retries have been
+            exhausted.
+        """
+        if self.max_retries is not None and attempt > self.max_retries:
+            return None
+
+        d = min(self.maximum, self.initial * self.factor ** (attempt - 1))
+        return d - d * self.jitter * random.random()
+
+
+class ReconnectPolicy(object):
+    """
+    Maps connection failures to a :class:`Backoff`.
+
+    Failures are classified as one of :data:`NETWORK` (connection refused,
+    reset or closed by the server), :data:`STALL` (no data or keep-alive
+    within the read timeout), :data:`HTTP_4XX`, :data:`HTTP_5XX` or
+    :data:`RATE_LIMITED` (HTTP 429). Any of them can be overridden with a
+    keyword argument of the same name. Client errors other than 429 are
+    usually bad credentials or a bad url and are not retried by default.
+
+    Args:
+        max_retries (int): if given, overrides ``max_retries`` of the
+            default backoffs that retry, so :data:`HTTP_4XX` still fails
+            fast. Backoffs passed as keyword arguments keep their own.
+            ``0`` disables reconnecting.
+    """
+
+    def __init__(self, max_retries=None, **backoffs):
+        self.backoffs = {
+            NETWORK: Backoff(0.25, 16.0),
+            STALL: Backoff(0.25, 16.0),
+            HTTP_4XX: Backoff(5.0, 320.0, max_retries=0),
+            HTTP_5XX: Backoff(5.0, 320.0),
+            RATE_LIMITED: Backoff(60.0, 600.0),
+        }
+
+        if max_retries is not None:
+            for b in self.backoffs.values():
+                # Failures not retried by default stay that way
+                if b.max_retries != 0:
+                    b.max_retries = max_retries
+
+        for kind, backoff in backoffs.items():
+            if kind not in self.backoffs:
+                raise ValueError("Unknown failure kind '%s'" % kind)
+            self.backoffs[kind] = backoff
+
+    @staticmethod
+    def classify(error):
+        """
+        Classify an exception raised while connecting or streaming.
+
+        Args:
+            error: a ``requests.exceptions.RequestException``
+
+        Returns:
+            str: the failure kind.
+        """
+        if isinstance(error, requests.exceptions.HTTPError) and \
+                error.response is not None:
+            status = error.response.status_code
+            if status == 429:
+                return RATE_LIMITED
+            if 400 <= status < 500:
+                return HTTP_4XX
+            return HTTP_5XX
+
+        if isinstance(error, requests.exceptions.ReadTimeout):
+            return STALL
+
+        return NETWORK
+
+    def delay(self, kind, attempt):
+        """
+        Returns:
+            float:
+            seconds to wait before the ``attempt``:th consecutive reconnect
+            after a failure of ``kind`` or ``None`` to give up.
+        """
+        return self.backoffs[kind].delay(attempt)
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Replay of recorded stream files.
+
+A capture file holds one activity per line, e.g. written by a callback
+appending every line it receives, or a closed :mod:`gnippy.spool`
+segment. :class:`ReplayClient` feeds captures through the same pipeline
+as :class:`gnippy.powertrackclient.PowerTrackClient` -- deduplicator,
+buffer or pool, decoder, batcher, metrics and hooks -- so that consumers
+can be tested and benchmarked without a connection to GNIP.
+
+Uncompressed files are memory-mapped and read in large chunks, without a
+system call per read. Files ending in ``.gz`` are decompressed as they are
+read instead.
+
+Pacing follows the activities' own timestamps, see :func:`activity_time`:
+``speed=REAL_TIME`` reproduces the original gaps between activities,
+``speed=10`` replays ten times faster and :data:`AS_FAST_AS_POSSIBLE`
+ignores timestamps altogether.
+"""
+
+import calendar
+import json
+import mmap
+import os
+import re
+import time
+import zlib
+
+from gnippy.compat import monotonic, string_types
+from gnippy.errors import BadArgumentException
+from gnippy.metrics import Metrics
+from gnippy.powertrackclient import Worker
+
+# Pacing
+REAL_TIME = 1.0
+AS_FAST_AS_POSSIBLE = None
+
+# Large reads amortize the per chunk overhead, there is no latency to hide
+DEFAULT_REPLAY_CHUNK_SIZE = 1024 * 1024
+
+_TIMESTAMP_MS_RE = re.compile(br'"timestamp_ms"\s*:\s*"?(\d+)')
+# The actor, with the postedTime of its account, comes before the
+# activity's own postedTime, which GNIP writes right after the verb
+_POSTED_TIME_RE = re.compile(
+    br'"verb"\s*:\s*"[^"]*"\s*,\s*"postedTime"\s*:\s*"([^"]+)"')
+# The user object, with its own created_at, comes after the tweet's
+_CREATED_AT_RE = re.compile(br'"created_at"\s*:\s*"([^"]+)"')
+
+
+def activity_time(line):
+    """
+    Time an activity was posted: its ``timestamp_ms``, else its top level
+    ``postedTime`` (Activity Streams format) or ``created_at`` (original
+    format).
+
+    The top level ``postedTime`` is found without decoding the line when it
+    follows the ``verb``, as GNIP writes it; other lines are decoded.
+
+    Args:
+        line (bytes): a raw activity.
+
+    Returns:
+        float: unix timestamp or ``None`` if the line has none.
+    """
+    match = _TIMESTAMP_MS_RE.search(line)
+    if match:
+        return int(match.group(1)) / 1000.0
+
+    try:
+        if b'"postedTime"' in line:
+            match = _POSTED_TIME_RE.search(line)
+            if match:
+                value = match.group(1).decode("ascii", "replace")
+            else:
+                value = json.loads(line.decode("utf-8"))["postedTime"]
+            # 2015-04-14T10:12:13.000Z
+            seconds = calendar.timegm(
+                time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+            fraction = value[19:].rstrip("Z")
+            return seconds + (float(fraction) if fraction else 0.0)
+
+        match = _CREATED_AT_RE.search(line)
+        if match is None:
+            return None
+        # Tue Apr 14 10:12:13 +0000 2015
+        return float(calendar.timegm(time.strptime(
+            match.group(1).decode("ascii", "replace"),
+            "%a %b %d %H:%M:%S +0000 %Y")))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class _Pacer(object):
+    """ Delays lines to reproduce the gaps between their timestamps. """
+
+    def __init__(self, speed, timestamp, wait):
+        self.speed = speed
+        self.timestamp = timestamp
+        self.wait = wait
+        self.reset()
+
+    def reset(self):
+        """ Start over, e.g. at the beginning of another pass. """
+        # (activity time, monotonic time) of the first timestamped line
+        self._origin = None
+
+    def pace(self, lines):
+        for line in lines:
+            when = self.timestamp(line) if line else None
+            if when is not None:
+                now = monotonic()
+                if self._origin is None:
+                    self._origin = (when, now)
+                else:
+                    due = self._origin[1] + \
+                        (when - self._origin[0]) / self.speed
+                    if due > now and self.wait(due - now):
+                        # Stopped
+                        return
+            yield line
+
+
+class ReplayClient(object):
+    """
+    Replays capture files with the interface of
+    :class:`gnippy.powertrackclient.PowerTrackClient`::
+
+        client = ReplayClient(callback, ["monday.json", "tuesday.json.gz"],
+                              speed=10, decoder=Decoder())
+        client.connect()
+        client.wait()
+
+    :meth:`wait` returns ``False`` once every file was replayed and
+    delivered.
+
+    Args:
+        callback: receives lines, or whatever ``decoder``, ``batcher`` or
+            ``pool`` turn them into, as with ``PowerTrackClient``.
+        paths: a capture file path or a list of them, replayed in order.
+        speed (float): :data:`REAL_TIME`, a multiple of it or
+            :data:`AS_FAST_AS_POSSIBLE`.
+        repeat (int): number of passes over ``paths``. Pacing starts over
+            with each pass.
+        timestamp: callable returning the unix timestamp of a raw line or
+            ``None``, :func:`activity_time` by default.
+        buffer, chunk_size, batcher, decoder, pool, deduplicator, metrics,
+            hooks: as for ``PowerTrackClient``.
+
+    Attributes:
+        worker: ``None`` or the current :class:`ReplayWorker` once
+            connected.
+        metrics: the :class:`gnippy.metrics.Metrics` of this client.
+    """
+
+    def __init__(self, callback, paths, speed=AS_FAST_AS_POSSIBLE, repeat=1,
+                 timestamp=activity_time, buffer=None,
+                 chunk_size=DEFAULT_REPLAY_CHUNK_SIZE, batcher=None,
+                 decoder=None, pool=None, deduplicator=None, metrics=None,
+                 hooks=None):
+        if pool and (buffer or decoder):
+            raise BadArgumentException(
+                "pool cannot be combined with buffer or decoder")
+        if speed is not None and not speed > 0:
+            raise BadArgumentException("speed must be positive or None")
+        if repeat < 1:
+            raise BadArgumentException("repeat must be at least 1")
+
+        self.callback = callback
+        self.paths = [paths] if isinstance(paths, string_types) \
+            else list(paths)
+        self.speed = speed
+        self.repeat = repeat
+        self.timestamp = timestamp
+        self.buffer = buffer
+        self.chunk_size = chunk_size
+        self.batcher = batcher
+        self.decoder = decoder
+        self.pool = pool
+        self.deduplicator = deduplicator
+        self.metrics = metrics or Metrics()
+        self.hooks = hooks
+        self.worker = None
+
+    @property
+    def last_heartbeat(self):
+        """ Unix timestamp of the last chunk read, ``None`` before. """
+        if self.worker:
+            return self.worker.last_heartbeat
+        return None
+
+    def set_hooks(self, hooks):
+        """
+        Install or, with ``None``, remove instrumentation hooks, see
+        :meth:`gnippy.powertrackclient.PowerTrackClient.set_hooks`.
+        """
+        self.hooks = hooks
+        if self.worker:
+            self.worker.hooks = hooks
+
+    def connect(self):
+        """
+        Create a :class:`ReplayWorker` daemon and start replaying.
+
+        Raises:
+                RuntimeError: if called more than once per client.
+        """
+        if self.worker:
+            raise RuntimeError(
+                "Cannot connect: ReplayClient is not re-entrant")
+
+        self.worker = ReplayWorker(self.paths,
+                                   self.metrics.timed(self.callback),
+                                   speed=self.speed,
+                                   repeat=self.repeat,
+                                   timestamp=self.timestamp,
+                                   buffer=self.buffer,
+                                   chunk_size=self.chunk_size,
+                                   batcher=self.batcher,
+                                   decoder=self.decoder,
+                                   pool=self.pool,
+                                   deduplicator=self.deduplicator,
+                                   hooks=self.hooks)
+        self.metrics.attach(self.worker, buffer=self.buffer,
+                            deduplicator=self.deduplicator)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def wait(self, timeout=None):
+        """
+        Wait on :attr:`worker` for ``timeout`` seconds or indefinitely if
+        ``None`` or not provided.
+
+        Returns:
+                bool:
+                ``True`` if :attr:`worker` is alive, ``False`` otherwise.
+        """
+        self.worker.join(timeout=timeout)
+        return self.worker.is_alive()
+
+    def disconnect(self, timeout=None):
+        """ Ask :attr:`worker` to stop and :meth:`wait`. """
+        self.worker.stop()
+        return self.wait(timeout=timeout)
+
+
+class ReplayWorker(Worker):
+    """
+    :class:`gnippy.powertrackclient.Worker` reading capture files instead
+    of a connection. Exits after the last file, or when a file cannot be
+    read, with the error in :attr:`error`.
+
+    Attributes:
+        files (int): files replayed completely, over all passes.
+    """
+
+    def __init__(self, paths, callback, speed=AS_FAST_AS_POSSIBLE, repeat=1,
+                 timestamp=activity_time, buffer=None,
+                 chunk_size=DEFAULT_REPLAY_CHUNK_SIZE, batcher=None,
+                 decoder=None, pool=None, deduplicator=None, hooks=None):
+        super(ReplayWorker, self).__init__(
+            None, None, callback, stall_timeout=None, buffer=buffer,
+            chunk_size=chunk_size, batcher=batcher, decoder=decoder,
+            pool=pool, deduplicator=deduplicator, compression=False,
+            hooks=hooks)
+        self.paths = list(paths)
+        self.speed = speed
+        self.repeat = repeat
+        self.files = 0
+        self._pacer = _Pacer(speed, timestamp, self._stop_event.wait) \
+            if speed is not None else None
+
+    def chunks(self, path):
+        """
+        Iterate over the contents of a capture file in chunks of
+        :attr:`chunk_size` bytes.
+        """
+        if path.endswith(".gz"):
+            for chunk in self._gzip_chunks(path):
+                yield chunk
+            return
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                # Empty files cannot be mapped
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            # Slicing a memoryview doesn't copy
+            view = memoryview(mapped)
+        except TypeError:
+            # Python 2 mmap objects don't export buffers
+            view = mapped
+        for offset in range(0, size, self.chunk_size):
+            chunk = view[offset:offset + self.chunk_size]
+            self.bytes_received += len(chunk)
+            self.bytes_decompressed += len(chunk)
+            yield chunk
+        # The mapping is unmapped once the last chunk is released, it cannot
+        # be closed while exported.
+
+    def _gzip_chunks(self, path):
+        # Accept both gzip and zlib headers
+        decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.bytes_received += len(chunk)
+                data = decompressor.decompress(chunk)
+                self.bytes_decompressed += len(data)
+                yield data
+
+        data = decompressor.flush()
+        self.bytes_decompressed += len(data)
+        yield data
+
+    def _deliver(self, lines, deliver, is_duplicate, on_line=None):
+        if self._pacer is not None:
+            lines = self._pacer.pace(lines)
+        stopped = super(ReplayWorker, self)._deliver(lines, deliver,
+                                                     is_duplicate, on_line)
+        # The pacer ends the lines early when stopped while waiting
+        return stopped or self.stopped()
+
+    def reconnect_loop(self):
+        for _ in range(self.repeat):
+            if self._pacer is not None:
+                self._pacer.reset()
+            for path in self.paths:
+                if self.stopped():
+                    return
+                try:
+                    self.stream(path)
+                except (EnvironmentError, zlib.error) as e:
+                    self.error = e
+                    return
+                if self.stopped():
+                    return
+                self.files += 1
@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
 
+import codecs
+from contextlib import closing
 import json
+from multiprocessing.pool import ThreadPool
+import re
 import requests
-from gnippy import config
+from gnippy import config, rulesyntax
 from gnippy.errors import (RuleAddFailedException, RuleDeleteFailedException,
                            BadPowerTrackUrlException, BadArgumentException,
                            RulesListFormatException, RulesGetFailedException)
 from gnippy.compat import string_types
 
+# Rules API limits per add or delete request
+MAX_RULES_PER_REQUEST = 5000
+MAX_REQUEST_BYTES = 1024 * 1024
+
+_RULES_ARRAY_RE = re.compile(r'"rules"\s*:\s*\[')
+_SEPARATORS_RE = re.compile(r'[\s,]*')
+
 
 def _generate_rules_url(url):
     """
@@ -33,9 +44,26 @@ def _generate_post_object(rules_list):
         raise BadArgumentException("rules_list must be of type list")
 
 
+def _dumps_rule(rule):
+    """ JSON encoding of a built rule or Rule. """
+    if isinstance(rule, Rule):
+        return rule._encoded()
+    return json.dumps(rule)
+
+
+def _dumps_rules(rules_list):
+    """
+    The JSON object that gets posted to the Rules API, as
+    json.dumps(_generate_post_object(rules_list)) would encode it.
+    """
+    return '{"rules": [%s]}' % ", ".join(
+        [_dumps_rule(r) for r in _generate_post_object(rules_list)['rules']])
+
+
 def _check_rules_list(rules_list):
     """
     Checks a rules_list to ensure that all rules are in the correct format.
+    Rule objects were validated when they were created and are skipped.
     """
     def fail():
         msg = ("rules_list is not in the correct format. "
@@ -47,6 +75,9 @@ def _check_rules_list(rules_list):
 
     expected = ("value", "tag")
     for r in rules_list:
+        if isinstance(r, Rule):
+            continue
+
         if not isinstance(r, dict):
             fail()
 
@@ -64,9 +95,10 @@ def _check_rules_list(rules_list):
                 fail()
 
 
-def _post(conf, built_rules):
+def _post(conf, built_rules, session=requests):
     """
-    Generate the Rules URL and POST data and make the POST request.
+    Generate the Rules URL and POST data and make the POST request. The
+    rules must have been checked with :func:`_check_rules_list`.
     POST data must look like::
 
         {
@@ -79,20 +111,21 @@ def _post(conf, built_rules):
     Args:
         conf: A configuration object that contains auth and url info.
         built_rules: A single or list of built rules.
+        session: The ``requests`` module or a ``requests.Session``.
     """
-    _check_rules_list(built_rules)
     rules_url = _generate_rules_url(conf['url'])
-    post_data = json.dumps(_generate_post_object(built_rules))
-    r = requests.post(rules_url, auth=conf['auth'], data=post_data)
+    post_data = _dumps_rules(built_rules)
+    r = session.post(rules_url, auth=conf['auth'], data=post_data)
     if not r.status_code in range(200, 300):
         error_text = "HTTP Response Code: %s, Text: '%s'" % (r.status_code,
                                                              r.text)
         raise RuleAddFailedException(error_text)
 
 
-def _delete(conf, built_rules):
+def _delete(conf, built_rules, session=requests):
     """
-    Generate the Rules URL and make a DELETE request.
+    Generate the Rules URL and make a DELETE request. The rules must have
+    been checked with :func:`_check_rules_list`.
     DELETE data must look like::
 
         {
@@ -105,51 +138,492 @@ def _delete(conf, built_rules):
     Args:
         conf: A configuration object that contains auth and url info.
         built_rules: A single or list of built rules.
+        session: The ``requests`` module or a ``requests.Session``.
     """
-    _check_rules_list(built_rules)
     rules_url = _generate_rules_url(conf['url']) + "?_method=delete"
-    delete_data = json.dumps(_generate_post_object(built_rules))
-    r = requests.post(rules_url, auth=conf['auth'], data=delete_data)
+    delete_data = _dumps_rules(built_rules)
+    r = session.post(rules_url, auth=conf['auth'], data=delete_data)
     if not r.status_code in range(200, 300):
         error_text = "HTTP Response Code: %s, Text: '%s'" % (r.status_code,
                                                              r.text)
         raise RuleDeleteFailedException(error_text)
 
-def build(rule_string, tag=None):
+
+def _get(conf, session=requests, cache=None, revalidate=False):
+    """
+    Make a GET request for the current rule set.
+
+    Args:
+        conf: A configuration object that contains auth and url info.
+        session: The ``requests`` module or a ``requests.Session``.
+        cache: An optional :class:`gnippy.rulescache.RulesCache`.
+        revalidate (bool): ask the server even if the cached rule set is
+            fresh, with If-None-Match so an unchanged one is not sent again.
+    """
+    rules_url = _generate_rules_url(conf['url'])
+
+    def fail(reason):
+        raise RulesGetFailedException(
+            "Could not get current rules for '%s'. Reason: '%s'" % (rules_url,
+                                                                    reason))
+
+    cached = cache.lookup(rules_url) if cache else None
+    if cached and cached[2] and not revalidate:
+        return cached[0]
+
+    kwargs = {}
+    if cached and cached[1]:
+        # Revalidate, an unchanged rule set is not sent again
+        kwargs['headers'] = {"If-None-Match": cached[1]}
+
+    try:
+        r = session.get(rules_url, auth=conf['auth'], **kwargs)
+    except Exception as e:
+        fail(str(e))
+
+    if r.status_code == 304 and cached:
+        cache.touch(rules_url)
+        return cached[0]
+
+    if r.status_code not in range(200, 300):
+        fail("HTTP Status Code: %s" % r.status_code)
+
+    try:
+        rules_json = r.json()
+    except:
+        fail("GNIP API returned malformed JSON")
+
+    if "rules" in rules_json:
+        if cache:
+            cache.store(rules_url, rules_json['rules'], r.headers.get("ETag"))
+        return rules_json['rules']
+    else:
+        fail("GNIP API response did not return a rules object")
+
+
+def _iter_rules_json(chunks):
+    """
+    Incrementally parse the objects of the "rules" array out of a JSON
+    document arriving in byte chunks. Only the current chunk and the
+    partially received rule are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    in_array = False
+    for chunk in chunks:
+        buf += utf8.decode(chunk)
+        if not in_array:
+            m = _RULES_ARRAY_RE.search(buf)
+            if m is None:
+                continue
+            buf = buf[m.end():]
+            in_array = True
+
+        pos = 0
+        while True:
+            pos = _SEPARATORS_RE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                rule, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Incomplete, wait for the rest of the rule
+                break
+            yield rule
+        buf = buf[pos:]
+
+    if not in_array:
+        raise RulesGetFailedException(
+            "GNIP API response did not return a rules object")
+    raise RulesGetFailedException("GNIP API returned malformed JSON")
+
+
+def _get_stream(conf, as_records=False, session=requests,
+                chunk_size=64 * 1024):
+    """
+    Like _get, but streams the response and yields rules as they are
+    parsed.
+    """
+    rules_url = _generate_rules_url(conf['url'])
+
+    def fail(reason):
+        raise RulesGetFailedException(
+            "Could not get current rules for '%s'. Reason: '%s'" % (rules_url,
+                                                                    reason))
+
+    try:
+        r = session.get(rules_url, auth=conf['auth'], stream=True)
+    except Exception as e:
+        fail(str(e))
+
+    with closing(r):
+        if r.status_code not in range(200, 300):
+            fail("HTTP Status Code: %s" % r.status_code)
+
+        try:
+            for rule in _iter_rules_json(r.iter_content(chunk_size)):
+                yield Rule(rule['value'], rule.get('tag')) if as_records \
+                    else rule
+        except RulesGetFailedException as e:
+            fail(str(e))
+
+
+def _chunk_rules(rules_list, max_bytes=MAX_REQUEST_BYTES,
+                 max_count=MAX_RULES_PER_REQUEST):
+    """
+    Split a rules_list into chunks whose POST body is at most max_bytes
+    long and that contain at most max_count rules each.
+    """
+    overhead = len(_dumps_rules([]))
+    separator = len(", ")
+    chunk = []
+    size = overhead
+    for rule in rules_list:
+        # json.dumps escapes non-ASCII, so characters are bytes
+        n = len(_dumps_rule(rule))
+        if overhead + n > max_bytes:
+            raise BadArgumentException(
+                "Rule '%s' does not fit in a request" % _rule_key(rule)[0])
+
+        if chunk and (size + separator + n > max_bytes or
+                      len(chunk) >= max_count):
+            yield chunk
+            chunk = []
+            size = overhead
+
+        size += n + (separator if chunk else 0)
+        chunk.append(rule)
+
+    if chunk:
+        yield chunk
+
+
+class ChunkResult(object):
+    """
+    Outcome of submitting one chunk of a large rules_list.
+
+    Attributes:
+        index (int): position of the chunk in submission order.
+        rules (list): the rules in the chunk.
+        error: the exception raised for the chunk, ``None`` on success.
+    """
+
+    def __init__(self, index, rules, error=None):
+        self.index = index
+        self.rules = rules
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class SubmitReport(object):
+    """
+    Per-chunk results of :func:`add_rules` or :func:`delete_rules`.
+
+    Attributes:
+        chunks (list): a :class:`ChunkResult` per chunk, in order.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    @property
+    def failed(self):
+        """ :class:`ChunkResult` objects of failed chunks. """
+        return [c for c in self.chunks if not c.ok]
+
+    @property
+    def failed_rules(self):
+        """ Rules in failed chunks, e.g. to retry them. """
+        return [r for c in self.failed for r in c.rules]
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+def _pooled_session(pool_maxsize):
+    """
+    A ``requests.Session`` keeping up to pool_maxsize connections alive.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _submit(conf, rules_list, send, exception, session=None,
+            max_workers=4, max_bytes=MAX_REQUEST_BYTES,
+            max_count=MAX_RULES_PER_REQUEST, cache=None):
+    """
+    Check rules_list, split it into chunks the Rules API accepts and send
+    them concurrently with send(conf, chunk, session=session). Without a
+    session the chunks of a large list share a temporary pool of keep-alive
+    connections. The cached rule set, if any, is invalidated afterwards.
+
+    Returns:
+        SubmitReport: if all chunks succeeded.
+
+    Raises:
+        exception: if any chunk failed, with the :class:`SubmitReport` as its
+            ``report`` attribute. Network errors of a chunk count as its
+            failure. A single chunk failure is re-raised as is.
+    """
+    _check_rules_list(rules_list)
+    chunks = list(_chunk_rules(rules_list, max_bytes, max_count)) or [[]]
+    workers = max(1, min(max_workers, len(chunks)))
+
+    temporary = None
+    if session is None:
+        if len(chunks) > 1:
+            session = temporary = _pooled_session(workers)
+        else:
+            session = requests
+
+    def run(args):
+        index, chunk = args
+        try:
+            send(conf, chunk, session=session)
+            return ChunkResult(index, chunk)
+        except (exception, requests.exceptions.RequestException) as e:
+            # Other chunks may have been applied already, keep the report
+            return ChunkResult(index, chunk, e)
+
+    try:
+        if workers == 1:
+            results = [run(args) for args in enumerate(chunks)]
+        else:
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(run, enumerate(chunks))
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        if temporary is not None:
+            temporary.close()
+        if cache:
+            cache.invalidate(_generate_rules_url(conf['url']))
+
+    report = SubmitReport(results)
+    failed = report.failed
+    if len(chunks) == 1 and failed:
+        failed[0].error.report = report
+        raise failed[0].error
+    if failed:
+        e = exception("%d of %d chunks failed, first error: %s" % (
+            len(failed), len(chunks), failed[0].error))
+        e.report = report
+        raise e
+
+    return report
+
+
+def _rule_key(rule):
+    """ Identity of a rule for synchronization, (value, tag or None). """
+    if isinstance(rule, Rule):
+        return (rule.value, rule.tag)
+    return (rule['value'], rule.get('tag') or None)
+
+
+class SyncPlan(object):
+    """
+    Changes needed to turn the current rule set into the desired one.
+
+    Attributes:
+        to_add (list): built rules to add.
+        to_delete (list): built rules to delete.
+        unchanged (int): number of desired rules already in place.
+    """
+
+    def __init__(self, to_add, to_delete, unchanged):
+        self.to_add = to_add
+        self.to_delete = to_delete
+        self.unchanged = unchanged
+
+    def __repr__(self):
+        return "<SyncPlan add=%d delete=%d unchanged=%d>" % (
+            len(self.to_add), len(self.to_delete), self.unchanged)
+
+
+def _plan_sync(current_rules, desired_rules):
+    """
+    Compute a SyncPlan in O(n) with hashed (value, tag) indexes. Changing
+    the tag of a rule means deleting and re-adding it.
+    """
+    _check_rules_list(desired_rules)
+
+    desired = set()
+    to_add = []
+    for rule in desired_rules:
+        key = _rule_key(rule)
+        if key not in desired:
+            desired.add(key)
+            to_add.append(key)
+
+    current = set()
+    to_delete = []
+    for rule in current_rules:
+        key = _rule_key(rule)
+        current.add(key)
+        if key not in desired:
+            to_delete.append(build(*key))
+
+    to_add = [build(*key) for key in to_add if key not in current]
+    return SyncPlan(to_add, to_delete, len(desired) - len(to_add))
+
+
+def _sync(conf, desired_rules, dry_run, session=None, max_workers=4,
+          cache=None):
+    # Changes made elsewhere since the rules were cached must not be missed
+    plan = _plan_sync(_get(conf, session=session or requests, cache=cache,
+                           revalidate=True),
+                      desired_rules)
+    if not dry_run:
+        # Delete first: a re-tagged rule has to be deleted before it can be
+        # added again with its new tag.
+        if plan.to_delete:
+            _submit(conf, plan.to_delete, _delete, RuleDeleteFailedException,
+                    session=session, max_workers=max_workers, cache=cache)
+        if plan.to_add:
+            _submit(conf, plan.to_add, _post, RuleAddFailedException,
+                    session=session, max_workers=max_workers, cache=cache)
+    return plan
+
+
+_setattr = object.__setattr__
+
+
+class Rule(object):
+    """
+    Compact, immutable rule, an alternative to the dicts returned by
+    :func:`build` and :func:`get_rules` for large rule sets. A Rule is
+    validated once when it is created, so :func:`add_rules` and
+    :func:`delete_rules` accept it without checking it again. Rules are
+    hashable on their value and tag.
+
+    Attributes:
+        value (str): the rule.
+        tag (str): the rule's tag or ``None``.
+
+    Raises:
+        BadArgumentException: if value or tag is not a string.
+    """
+    __slots__ = ("value", "tag", "_json")
+
+    def __init__(self, value, tag=None):
+        if not isinstance(value, string_types):
+            raise BadArgumentException("value must be a string")
+        if tag is not None and not isinstance(tag, string_types):
+            raise BadArgumentException("tag must be a string")
+        _setattr(self, "value", value)
+        _setattr(self, "tag", tag or None)
+
+    def _encoded(self):
+        """ JSON encoding of the rule, computed once when first submitted. """
+        encoded = getattr(self, "_json", None)
+        if encoded is None:
+            encoded = json.dumps(self.to_dict())
+            _setattr(self, "_json", encoded)
+        return encoded
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Rule is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Rule is immutable")
+
+    def __reduce__(self):
+        return Rule, (self.value, self.tag)
+
+    def to_dict(self):
+        """ Returns: dict: the rule as :func:`build` would build it. """
+        return build(self.value, self.tag)
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and \
+            (self.value, self.tag) == (other.value, other.tag)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.value, self.tag))
+
+    def __repr__(self):
+        return "Rule(%r, %r)" % (self.value, self.tag)
+
+
+def build(rule_string, tag=None, validate=False):
     """
     Takes a rule string and optional tag and turns it into a "built_rule"
     that looks like::
 
         { "value": "rule string", "tag": "my tag" }
 
+    If validate is True, the rule's syntax is checked with
+    :func:`gnippy.rulesyntax.validate` and RuleSyntaxException is raised if
+    PowerTrack would reject it.
     """
     if rule_string is None:
         raise BadArgumentException("rule_string cannot be None")
+    if validate:
+        rulesyntax.check_rules([{"value": rule_string}])
     rule = { "value": rule_string }
     if tag:
         rule['tag'] = tag
     return rule
 
 
-def add_rule(rule_string, tag=None, **kwargs):
+def add_rule(rule_string, tag=None, cache=None, validate=False, **kwargs):
     """
     Synchronously add a single rule to GNIP PowerTrack.
     """
     conf = config.resolve(kwargs)
-    rule = build(rule_string, tag)
+    rule = build(rule_string, tag, validate=validate)
     rules_list = [rule,]
-    _post(conf, rules_list)
+    _submit(conf, rules_list, _post, RuleAddFailedException, cache=cache)
 
 
-def add_rules(rules_list, **kwargs):
+def add_rules(rules_list, max_workers=4, cache=None, validate=False,
+              **kwargs):
     """
-    Synchronously add multiple rules to GNIP PowerTrack in one go.
+    Synchronously add multiple rules to GNIP PowerTrack. Lists too large for
+    one request are split into chunks by size and submitted concurrently
+    over up to max_workers keep-alive connections.
+
+    Args:
+        rules_list: list of built rules or :class:`Rule` objects.
+        max_workers (int): maximum number of concurrent requests.
+        cache: optional :class:`gnippy.rulescache.RulesCache` to
+            invalidate.
+        validate (bool): check the syntax of every rule before sending
+            anything, see :func:`gnippy.rulesyntax.check_rules`.
+
+    Returns:
+        SubmitReport: per-chunk results.
+
+    Raises:
+        RuleSyntaxException: if validate is True and any rule is invalid.
+            Its ``errors`` attribute lists all of them.
+        RuleAddFailedException: if any chunk failed. Its ``report``
+            attribute tells which rules were added and which weren't.
     """
     conf = config.resolve(kwargs)
-    _post(conf, rules_list)
+    if validate:
+        rulesyntax.check_rules(rules_list)
+    return _submit(conf, rules_list, _post, RuleAddFailedException,
+                   max_workers=max_workers, cache=cache)
 
 
-def get_rules(**kwargs):
+def get_rules(cache=None, **kwargs):
     """
     Get all the rules currently applied to PowerTrack.
 
@@ -160,6 +634,9 @@ def get_rules(**kwargs):
         auth: Specify this arg if you want to override the credentials in your
             .gnippy file.
 
+        cache: Specify a :class:`gnippy.rulescache.RulesCache` to reuse
+            recently downloaded rules.
+
     Returns:
         list:
         A list of currently applied rules in the form::
@@ -171,44 +648,185 @@ def get_rules(**kwargs):
 
     """
     conf = config.resolve(kwargs)
-    rules_url = _generate_rules_url(conf['url'])
-
-    def fail(reason):
-        raise RulesGetFailedException(
-            "Could not get current rules for '%s'. Reason: '%s'" % (rules_url,
-                                                                    reason))
+    return _get(conf, cache=cache)
 
-    try:
-        r = requests.get(rules_url, auth=conf['auth'])
-    except Exception as e:
-        fail(str(e))
 
-    if r.status_code not in range(200, 300):
-        fail("HTTP Status Code: %s" % r.status_code)
+def iter_rules(as_records=False, **kwargs):
+    """
+    Iterate over the rules currently applied to PowerTrack while they are
+    being downloaded. Unlike :func:`get_rules` the response is parsed
+    incrementally, so memory use stays flat regardless of the number of
+    rules.
 
-    try:
-        rules_json = r.json()
-    except:
-        fail("GNIP API returned malformed JSON")
+    Args:
+        as_records (bool): yield :class:`Rule` records instead of dicts.
+            Records only keep the value and tag of each rule.
 
-    if "rules" in rules_json:
-        return rules_json['rules']
-    else:
-        fail("GNIP API response did not return a rules object")
+    Raises:
+        RulesGetFailedException: while iterating, if the rules could not be
+            downloaded or parsed.
+    """
+    conf = config.resolve(kwargs)
+    return _get_stream(conf, as_records=as_records)
 
 
-def delete_rule(rule_dict, **kwargs):
+def delete_rule(rule_dict, cache=None, **kwargs):
     """
     Synchronously delete a single rule from GNIP PowerTrack.
     """
     conf = config.resolve(kwargs)
     rules_list = [rule_dict,]
-    _delete(conf, rules_list)
+    _submit(conf, rules_list, _delete, RuleDeleteFailedException, cache=cache)
 
 
-def delete_rules(rules_list, **kwargs):
+def delete_rules(rules_list, max_workers=4, cache=None, **kwargs):
     """
-    Synchronously delete multiple rules from GNIP PowerTrack.
+    Synchronously delete multiple rules from GNIP PowerTrack. Lists too large
+    for one request are split into chunks by size and submitted
+    concurrently over up to max_workers keep-alive connections.
+
+    Args:
+        rules_list: list of built rules or :class:`Rule` objects.
+        max_workers (int): maximum number of concurrent requests.
+        cache: optional :class:`gnippy.rulescache.RulesCache` to
+            invalidate.
+
+    Returns:
+        SubmitReport: per-chunk results.
+
+    Raises:
+        RuleDeleteFailedException: if any chunk failed. Its ``report``
+            attribute tells which rules were deleted and which weren't.
     """
     conf = config.resolve(kwargs)
-    _delete(conf, rules_list)
+    return _submit(conf, rules_list, _delete, RuleDeleteFailedException,
+                   max_workers=max_workers, cache=cache)
+
+
+def sync_rules(desired_rules, dry_run=False, max_workers=4, cache=None,
+               **kwargs):
+    """
+    Make the rules applied to PowerTrack match ``desired_rules`` by adding
+    and deleting only what differs. Rules are compared by value and tag.
+
+    Args:
+        desired_rules: list of built rules or :class:`Rule` objects.
+        dry_run (bool): only compute the plan, don't change anything.
+        max_workers (int): maximum number of concurrent requests.
+        cache: optional :class:`gnippy.rulescache.RulesCache`.
+
+    Returns:
+        SyncPlan: the changes made, or that would be made if ``dry_run``.
+
+    Raises:
+        RulesGetFailedException: if the current rules could not be listed.
+        RuleDeleteFailedException: if deleting rules failed. No rules are
+            added in that case.
+        RuleAddFailedException: if adding rules failed.
+    """
+    conf = config.resolve(kwargs)
+    return _sync(conf, desired_rules, dry_run, max_workers=max_workers,
+                 cache=cache)
+
+
+class RulesClient(object):
+    """
+    RulesClient makes Rules API calls over a single ``requests.Session``,
+    so consecutive calls reuse pooled keep-alive connections instead of
+    paying for a new TCP and TLS handshake each time, and configuration is
+    resolved once instead of on every call::
+
+        with RulesClient() as client:
+            for rule in rules_to_add:
+                client.add_rule(rule)
+
+    Args:
+        url: Specify this arg if you're working with a PowerTrack connection
+            that's not listed in your .gnippy file.
+        auth: Specify this arg if you want to override the credentials in your
+            .gnippy file.
+        session: optional ``requests.Session`` to use, a new one is created
+            if not provided.
+        pool_maxsize (int): maximum number of connections kept alive, also
+            the number of chunks of large rule lists submitted concurrently.
+        cache: optional :class:`gnippy.rulescache.RulesCache` for
+            :meth:`get_rules`, invalidated by this client's changes.
+    """
+
+    def __init__(self, session=None, pool_maxsize=10, cache=None, **kwargs):
+        self.conf = config.resolve(kwargs)
+        self.max_workers = pool_maxsize
+        self.cache = cache
+        self.rules_url = _generate_rules_url(self.conf['url'])
+
+        if session is None:
+            session = _pooled_session(pool_maxsize)
+        self.session = session
+
+    def add_rule(self, rule_string, tag=None, validate=False):
+        """
+        Synchronously add a single rule to GNIP PowerTrack.
+        """
+        rule = build(rule_string, tag, validate=validate)
+        _submit(self.conf, [rule], _post, RuleAddFailedException,
+                session=self.session, cache=self.cache)
+
+    def add_rules(self, rules_list, validate=False):
+        """
+        Synchronously add multiple rules to GNIP PowerTrack, see
+        :func:`add_rules`.
+        """
+        if validate:
+            rulesyntax.check_rules(rules_list)
+        return _submit(self.conf, rules_list, _post, RuleAddFailedException,
+                       session=self.session, max_workers=self.max_workers,
+                       cache=self.cache)
+
+    def get_rules(self):
+        """
+        Get all the rules currently applied to PowerTrack, see
+        :func:`get_rules`.
+        """
+        return _get(self.conf, session=self.session, cache=self.cache)
+
+    def iter_rules(self, as_records=False):
+        """
+        Iterate over the rules currently applied to PowerTrack while they are
+        being downloaded, see :func:`iter_rules`.
+        """
+        return _get_stream(self.conf, as_records=as_records,
+                           session=self.session)
+
+    def delete_rule(self, rule_dict):
+        """
+        Synchronously delete a single rule from GNIP PowerTrack.
+        """
+        _submit(self.conf, [rule_dict], _delete, RuleDeleteFailedException,
+                session=self.session, cache=self.cache)
+
+    def delete_rules(self, rules_list):
+        """
+        Synchronously delete multiple rules from GNIP PowerTrack, see
+        :func:`delete_rules`.
+        """
+        return _submit(self.conf, rules_list, _delete,
+                       RuleDeleteFailedException, session=self.session,
+                       max_workers=self.max_workers, cache=self.cache)
+
+    def sync_rules(self, desired_rules, dry_run=False):
+        """
+        Make the rules applied to PowerTrack match ``desired_rules``, see
+        :func:`sync_rules`.
+        """
+        return _sync(self.conf, desired_rules, dry_run, session=self.session,
+                     max_workers=self.max_workers, cache=self.cache)
+
+    def close(self):
+        """ Close all pooled connections. """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Caching of the current rule set, so frequent :func:`gnippy.rules.get_rules`
+calls don't download and parse every rule each time.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+_replace = getattr(os, "replace", os.rename)
+
+
+class _Entry(object):
+
+    def __init__(self, rules, etag, fetched):
+        self.rules = rules
+        self.etag = etag
+        self.fetched = fetched
+
+
+class RulesCache(object):
+    """
+    Rule sets keyed by rules url, kept in memory and optionally in a JSON
+    file shared between processes.
+
+    A cached rule set younger than ``ttl`` seconds is returned without
+    any request. Once stale, it is revalidated with a conditional request
+    if the API returned an ``ETag``, so an unchanged rule set is not
+    downloaded again. Adding or deleting rules through gnippy with the same
+    cache invalidates it.
+
+    Args:
+        ttl (float): seconds a rule set is used without revalidation.
+        path (str): optional file to persist the cache to.
+    """
+
+    def __init__(self, ttl=60.0, path=None):
+        self.ttl = ttl
+        self.path = path
+        self._entries = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """ Reload the file if another process has written it. """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return
+
+        self._mtime = mtime
+        self._entries = dict(
+            (url, _Entry(e['rules'], e['etag'], e['fetched']))
+            for url, e in data.items())
+
+    def _save(self):
+        data = dict(
+            (url, {"rules": e.rules, "etag": e.etag, "fetched": e.fetched})
+            for url, e in self._entries.items())
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        _replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def lookup(self, url):
+        """
+        Returns:
+            tuple:
+            ``(rules, etag, fresh)`` for the cached rule set of ``url``, or
+            ``None`` if nothing is cached.
+        """
+        with self._lock:
+            if self.path:
+                self._load()
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            fresh = time.time() - entry.fetched < self.ttl
+            return list(entry.rules), entry.etag, fresh
+
+    def store(self, url, rules, etag=None):
+        """ Cache a freshly downloaded rule set. """
+        with self._lock:
+            if self.path:
+                self._load()
+            self._entries[url] = _Entry(list(rules), etag, time.time())
+            if self.path:
+                self._save()
+
+    def touch(self, url):
+        """ Mark the cached rule set as fresh after revalidation. """
+        with self._lock:
+            if self.path:
+                self._load()
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry.fetched = time.time()
+                if self.path:
+                    self._save()
+
+    def invalidate(self, url=None):
+        """ Forget the rule set of ``url``, or every rule set. """
+        with self._lock:
+            if self.path:
+                self._load()
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+            if self.path:
+                self._save()
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+Client side parsing and validation of PowerTrack rule syntax.
+
+The Rules API rejects a whole request if any rule in it is invalid, and only
+tells about the first one. :func:`check_rules` finds every rule that would be
+rejected for its syntax, length or complexity before anything is sent.
+
+Rules are parsed into a small tree of :class:`Term`, :class:`Not`,
+:class:`And` and :class:`Or` nodes. As in PowerTrack, a space means AND and
+binds tighter than ``OR``, so ``apple OR iphone ipad`` is
+``apple OR (iphone ipad)``.
+"""
+
+import re
+
+from gnippy.compat import string_types
+from gnippy.errors import RuleSyntaxException
+
+MAX_RULE_LENGTH = 2048
+MAX_POSITIVE_CLAUSES = 30
+MAX_NEGATED_CLAUSES = 50
+
+# Operators PowerTrack accepts, ``name:value``
+OPERATORS = frozenset([
+    "bio", "bio_location", "bio_name", "bounding_box", "contains",
+    "followers_count", "friends_count", "from", "has", "in_reply_to_status_id",
+    "is", "lang", "listed_count", "place", "place_country", "point_radius",
+    "profile_bounding_box", "profile_country", "profile_locality",
+    "profile_point_radius", "profile_region", "profile_subregion",
+    "retweets_of", "retweets_of_status_id", "sample", "source",
+    "statuses_count", "time_zone", "to", "url", "url_contains",
+    "url_description", "url_title",
+])
+
+# Operators that only narrow a rule down and cannot match on their own
+NON_STANDALONE = frozenset(["has", "is", "lang", "sample"])
+
+OPERATOR_VALUES = {
+    "has": frozenset(["geo", "hashtags", "images", "links", "media",
+                      "mentions", "profile_geo", "symbols", "videos"]),
+    "is": frozenset(["quote", "reply", "retweet", "verified"]),
+}
+
+# Term kinds
+KEYWORD = "keyword"
+PHRASE = "phrase"
+HASHTAG = "hashtag"
+MENTION = "mention"
+CASHTAG = "cashtag"
+OPERATOR = "operator"
+
+_PREFIXES = {"#": HASHTAG, "@": MENTION, "$": CASHTAG}
+
+_OPERATOR_RE = re.compile(r"([a-z_]+):(.*)$", re.DOTALL)
+_PROXIMITY_RE = re.compile(r"~(\d+)")
+_WORD_END = frozenset(' \t\r\n()"')
+
+# Token types
+_LPAREN, _RPAREN, _OR, _NEG, _TERM, _END = range(6)
+
+
+class _Node(object):
+    """ Syntax tree node, compared and hashed on its ``_key()``. """
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self._key()))
+
+    def __repr__(self):
+        return "%s%r" % (type(self).__name__, self._key())
+
+
+class Term(_Node):
+    """
+    A single clause.
+
+    Attributes:
+        kind (str): ``"keyword"``, ``"phrase"``, ``"hashtag"``,
+            ``"mention"``, ``"cashtag"`` or ``"operator"``.
+        value (str): the keyword, phrase, tag or name without its prefix,
+            or the operator's argument.
+        operator (str): name of the operator, ``None`` for other kinds.
+        proximity (int): ``N`` of a ``"phrase"~N`` proximity match.
+    """
+    __slots__ = ("kind", "value", "operator", "proximity")
+
+    def __init__(self, kind, value, operator=None, proximity=None):
+        self.kind = kind
+        self.value = value
+        self.operator = operator
+        self.proximity = proximity
+
+    def _key(self):
+        return (self.kind, self.value, self.operator, self.proximity)
+
+    @property
+    def standalone(self):
+        """ ``False`` for operators that cannot match on their own. """
+        return self.operator not in NON_STANDALONE
+
+
+class Not(_Node):
+    """ Negation of ``child``. """
+    __slots__ = ("child",)
+
+    def __init__(self, child):
+        self.child = child
+
+    def _key(self):
+        return (self.child,)
+
+
+class And(_Node):
+    """ Matches if all ``children`` match. """
+    __slots__ = ("children",)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def _key(self):
+        return self.children
+
+
+class Or(_Node):
+    """ Matches if any of ``children`` matches. """
+    __slots__ = ("children",)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def _key(self):
+        return self.children
+
+
+class RuleParseError(ValueError):
+    """ Raised by :func:`parse`, ``position`` is an index into the rule. """
+
+    def __init__(self, message, position):
+        ValueError.__init__(self, "%s at position %d" % (message, position))
+        self.position = position
+
+
+def _read_quoted(rule, i):
+    """ Read a quoted string starting at rule[i], returns (text, end). """
+    chars = []
+    j = i + 1
+    while j < len(rule):
+        c = rule[j]
+        if c == "\\" and j + 1 < len(rule):
+            chars.append(rule[j + 1])
+            j += 2
+        elif c == '"':
+            return "".join(chars), j + 1
+        else:
+            chars.append(c)
+            j += 1
+    raise RuleParseError("Unterminated quote", i)
+
+
+def _term(word, position):
+    match = _OPERATOR_RE.match(word)
+    if match:
+        name, value = match.groups()
+        if name not in OPERATORS:
+            raise RuleParseError("Unknown operator '%s:'" % name, position)
+        if not value:
+            raise RuleParseError("Operator '%s:' needs a value" % name,
+                                  position)
+        return Term(OPERATOR, value, operator=name)
+
+    kind = _PREFIXES.get(word[0])
+    if kind and len(word) > 1:
+        return Term(kind, word[1:])
+    return Term(KEYWORD, word)
+
+
+def _tokenize(rule):
+    """ Yields (token type, term or None, position). """
+    i = 0
+    n = len(rule)
+    while i < n:
+        c = rule[i]
+        if c.isspace():
+            i += 1
+        elif c == "(":
+            yield _LPAREN, None, i
+            i += 1
+        elif c == ")":
+            yield _RPAREN, None, i
+            i += 1
+        elif c == "-" and i + 1 < n and not rule[i + 1].isspace():
+            yield _NEG, None, i
+            i += 1
+        elif c == "-":
+            raise RuleParseError("Negation without a clause", i)
+        elif c == '"':
+            text, end = _read_quoted(rule, i)
+            if not text:
+                raise RuleParseError("Empty phrase", i)
+            proximity = None
+            match = _PROXIMITY_RE.match(rule, end)
+            if match:
+                proximity = int(match.group(1))
+                end = match.end()
+            yield _TERM, Term(PHRASE, text, proximity=proximity), i
+            i = end
+        else:
+            j = i
+            while j < n and rule[j] not in _WORD_END:
+                j += 1
+            word = rule[i:j]
+            if word == "OR":
+                yield _OR, None, i
+            elif word.endswith(":") and j < n and rule[j] == '"':
+                # Operator with a quoted argument, e.g. bio_location:"New York"
+                text, j = _read_quoted(rule, j)
+                yield _TERM, _term(word + text, i), i
+            else:
+                yield _TERM, _term(word, i), i
+            i = j
+    yield _END, None, n
+
+
+class _Parser(object):
+    """ Recursive descent parser over the tokens of one rule. """
+
+    def __init__(self, rule):
+        self.tokens = list(_tokenize(rule))
+        self.index = 0
+
+    @property
+    def token(self):
+        return self.tokens[self.index]
+
+    def parse(self):
+        node = self.or_expr()
+        kind, _, position = self.token
+        if kind == _RPAREN:
+            raise RuleParseError("Unbalanced ')'", position)
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.token[0] == _OR:
+            position = self.token[2]
+            self.index += 1
+            children.append(self.and_expr())
+            if isinstance(children[-1], Not) or \
+                    len(children) == 2 and isinstance(children[0], Not):
+                raise RuleParseError("Negated clause in an OR", position)
+        return children[0] if len(children) == 1 else Or(children)
+
+    def and_expr(self):
+        children = []
+        while self.token[0] in (_NEG, _LPAREN, _TERM):
+            children.append(self.unary())
+        if not children:
+            kind, _, position = self.token
+            if kind == _OR:
+                raise RuleParseError("OR without a left side", position)
+            if kind == _RPAREN:
+                raise RuleParseError("Empty group", position)
+            raise RuleParseError("Expected a clause", position)
+        return children[0] if len(children) == 1 else And(children)
+
+    def unary(self):
+        if self.token[0] == _NEG:
+            position = self.token[2]
+            self.index += 1
+            if self.token[0] == _NEG:
+                raise RuleParseError("Double negation", position)
+            return Not(self.atom())
+        return self.atom()
+
+    def atom(self):
+        kind, term, position = self.token
+        if kind == _TERM:
+            self.index += 1
+            return term
+        if kind == _LPAREN:
+            self.index += 1
+            node = self.or_expr()
+            if self.token[0] != _RPAREN:
+                raise RuleParseError("Unbalanced '('", position)
+            self.index += 1
+            return node
+        raise RuleParseError("Expected a clause", position)
+
+
+def parse(rule):
+    """
+    Parse a rule.
+
+    Returns:
+        the root :class:`Term`, :class:`Not`, :class:`And` or :class:`Or`.
+
+    Raises:
+        RuleParseError: at the first syntax error.
+    """
+    if not rule or rule.isspace():
+        raise RuleParseError("Empty rule", 0)
+    return _Parser(rule).parse()
+
+
+def count_clauses(node, negated=False):
+    """
+    Returns:
+        tuple: ``(positive, negated)`` number of clauses.
+    """
+    if isinstance(node, Term):
+        return (0, 1) if negated else (1, 0)
+    if isinstance(node, Not):
+        return count_clauses(node.child, not negated)
+    counts = [count_clauses(child, negated) for child in node.children]
+    return sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+
+def _standalone(node):
+    """ Whether node can match on its own, without narrowing clauses. """
+    if isinstance(node, Term):
+        return node.standalone
+    if isinstance(node, Not):
+        return False
+    if isinstance(node, And):
+        return any(_standalone(child) for child in node.children)
+    return all(_standalone(child) for child in node.children)
+
+
+def _operator_errors(node):
+    if isinstance(node, Not):
+        return _operator_errors(node.child)
+    if not isinstance(node, Term):
+        return [e for child in node.children for e in _operator_errors(child)]
+
+    allowed = OPERATOR_VALUES.get(node.operator)
+    if allowed is not None and node.value not in allowed:
+        return ["Unknown value '%s' for '%s:'" % (node.value, node.operator)]
+    if node.operator == "sample" and not (
+            node.value.isdigit() and 1 <= int(node.value) <= 100):
+        return ["'sample:' must be between 1 and 100"]
+    return []
+
+
+def validate(rule, max_length=MAX_RULE_LENGTH,
+             max_positive=MAX_POSITIVE_CLAUSES,
+             max_negated=MAX_NEGATED_CLAUSES):
+    """
+    Check a rule for syntax errors and PowerTrack limits.
+
+    Returns:
+        list: error messages, empty if the rule is valid.
+    """
+    if not isinstance(rule, string_types):
+        return ["Rule must be a string"]
+
+    errors = []
+    if len(rule) > max_length:
+        errors.append("Rule is %d characters long, the maximum is %d" % (
+            len(rule), max_length))
+
+    try:
+        node = parse(rule)
+    except RuleParseError as e:
+        errors.append(str(e))
+        return errors
+
+    positive, negated = count_clauses(node)
+    if positive > max_positive:
+        errors.append("Rule has %d positive clauses, the maximum is %d" % (
+            positive, max_positive))
+    if negated > max_negated:
+        errors.append("Rule has %d negated clauses, the maximum is %d" % (
+            negated, max_negated))
+    if not _standalone(node):
+        errors.append("Rule only has negated clauses or operators that "
+                      "cannot be used on their own")
+    errors.extend(_operator_errors(node))
+    return errors
+
+
+def check_rules(rules_list, **limits):
+    """
+    Validate every rule of a rules_list, built rules or
+    :class:`gnippy.rules.Rule` objects, before sending it.
+
+    Args:
+        limits: ``max_length``, ``max_positive`` and ``max_negated``
+            overrides, see :func:`validate`.
+
+    Raises:
+        RuleSyntaxException: listing every invalid rule in its ``errors``
+            attribute, a dict of rule value to a list of error messages.
+            Elements that are not rules, or whose value is not a string,
+            are listed by their ``repr()``.
+    """
+    errors = {}
+    for rule in rules_list:
+        if hasattr(rule, "value"):
+            value = rule.value
+        elif isinstance(rule, dict):
+            value = rule.get("value")
+        else:
+            errors[repr(rule)] = ["Not a built rule or Rule"]
+            continue
+
+        key = value if isinstance(value, string_types) else repr(value)
+        if key in errors:
+            continue
+        messages = validate(value, **limits)
+        if messages:
+            errors[key] = messages
+
+    if errors:
+        lines = ["%r: %s" % (value, "; ".join(messages))
+                 for value, messages in errors.items()]
+        raise RuleSyntaxException(
+            "%d invalid rules:\n%s" % (len(errors), "\n".join(lines)),
+            errors)
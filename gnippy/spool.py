@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+"""
+Durable write-ahead spool of raw stream lines on local disk.
+
+:class:`Spool` appends every line to segment files as it is read and
+replays closed segments into the callback from a separate thread, so the
+stream is read at network speed however slow or unavailable the sink is.
+Pass it to :class:`gnippy.powertrackclient.PowerTrackClient` as its
+``buffer``.
+
+Lines are handed to the operating system at least every
+``flush_interval`` seconds, so if the process dies, e.g. on ``kill -9``,
+only the lines spooled since the last flush are lost. Surviving a power
+loss or an operating system crash also takes an ``fsync``, see the
+``fsync`` policies; with the default :data:`SEGMENT` policy the open
+segment is only synced to disk when it is closed.
+
+Segments are named after a sequence number, e.g. ``00000000000000000042.seg``
+with a ``.gz`` or ``.zst`` suffix when compressed, and carry an ``.open``
+suffix while being written. A segment is deleted once all of its lines
+were delivered. Segments left behind by a previous run, including a
+segment that was open when it crashed, are replayed first. Delivery is at
+least once: lines of a segment interrupted by a crash are delivered again.
+"""
+
+from collections import deque
+import os
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from gnippy.compat import monotonic
+from gnippy.framing import DEFAULT_CHUNK_SIZE, LineSplitter
+
+# Compression
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# fsync policies
+NEVER = "never"
+SEGMENT = "segment"
+INTERVAL = "interval"
+ALWAYS = "always"
+
+FSYNC_POLICIES = (NEVER, SEGMENT, INTERVAL, ALWAYS)
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+_EXTENSIONS = {None: ".seg", GZIP: ".seg.gz", ZSTD: ".seg.zst"}
+_OPEN = ".open"
+
+
+def _compression_of(name):
+    if name.endswith(".gz"):
+        return GZIP
+    if name.endswith(".zst"):
+        return ZSTD
+    return None
+
+
+def _sequence_of(name):
+    try:
+        return int(name.split(".", 1)[0])
+    except ValueError:
+        return None
+
+
+class _Identity(object):
+    """ Compressor and decompressor interface for uncompressed segments. """
+
+    def compress(self, data):
+        return data
+
+    decompress = compress
+
+    def flush(self, *mode):
+        return b""
+
+
+def _compressor(compression):
+    if compression == GZIP:
+        # wbits 31: gzip container, readable with zcat
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == ZSTD:
+        return zstandard.ZstdCompressor().compressobj()
+    return _Identity()
+
+
+def _sync_flush(compressor, compression):
+    """ Flush compressed data written so far to a decodable boundary. """
+    if compression == GZIP:
+        return compressor.flush(zlib.Z_SYNC_FLUSH)
+    if compression == ZSTD:
+        return compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    return b""
+
+
+def _decompressor(compression):
+    if compression == GZIP:
+        return zlib.decompressobj(31)
+    if compression == ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj()
+    return _Identity()
+
+
+def read_segment(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Iterate over the lines of a segment file. A truncated or corrupt tail,
+    e.g. of a segment open during a crash, is ignored.
+
+    Yields:
+        bytes: lines without their newline.
+    """
+    compression = _compression_of(path.replace(_OPEN, ""))
+    decompressor = _decompressor(compression)
+    splitter = LineSplitter()
+    with open(path, "rb") as f:
+        while True:
+            offset = f.tell()
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            try:
+                data = decompressor.decompress(chunk)
+            except Exception:
+                data = _salvage(path, compression, offset, chunk)
+                chunk = None
+            for line in splitter.feed(data):
+                yield line
+            if chunk is None:
+                break
+    # Anything left after the last newline is a partially written line
+
+
+def _salvage(path, compression, offset, chunk):
+    """
+    Returns:
+        bytes: what ``chunk``, found at ``offset`` of a corrupt segment,
+        decompresses to up to the first error.
+    """
+    # The decompressor's state after an error is undefined, so start over
+    decompressor = _decompressor(compression)
+    with open(path, "rb") as f:
+        while f.tell() < offset:
+            decompressor.decompress(f.read(min(DEFAULT_CHUNK_SIZE,
+                                               offset - f.tell())))
+
+    data = []
+    for i in range(len(chunk)):
+        try:
+            data.append(decompressor.decompress(chunk[i:i + 1]))
+        except Exception:
+            break
+    return b"".join(data)
+
+
+class _Writer(object):
+    """ The segment being written. """
+
+    def __init__(self, path, compression):
+        self.path = path
+        self.compression = compression
+        self.size = 0
+        self.lines = 0
+        self.opened = monotonic()
+        self._file = open(path + _OPEN, "ab")
+        self._compressor = _compressor(compression)
+
+    def write(self, line):
+        self._file.write(self._compressor.compress(line + b"\n"))
+        self.size += len(line) + 1
+        self.lines += 1
+
+    def flush(self):
+        """ Hand everything written so far to the operating system. """
+        self._file.write(_sync_flush(self._compressor, self.compression))
+        self._file.flush()
+
+    def sync(self):
+        self.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, fsync):
+        self._file.write(self._compressor.flush())
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        os.rename(self.path + _OPEN, self.path)
+
+
+class Spool(object):
+    """
+    Write-ahead spool with the interface of :class:`gnippy.buffering.Buffer`.
+
+    Args:
+        directory (str): where segments are kept, created if missing.
+        segment_size (int): uncompressed bytes after which a segment is
+            closed and a new one started.
+        compression (str): ``None``, :data:`GZIP` or :data:`ZSTD` (requires
+            the ``zstandard`` package).
+        fsync (str): when data is forced to disk: :data:`NEVER` (left to the
+            operating system), :data:`SEGMENT` (when a segment is closed),
+            :data:`INTERVAL` (at most every ``fsync_interval`` seconds) or
+            :data:`ALWAYS` (after every line, slow).
+        fsync_interval (float): seconds between syncs with :data:`INTERVAL`.
+        flush_interval (float): seconds after which spooled lines are
+            flushed from the compressor and the file buffer to the
+            operating system, whatever the ``fsync`` policy. Checked when a
+            line is spooled; 0 flushes every line.
+        max_latency (float): when the consumer has caught up, the open
+            segment is closed after this many seconds so its lines are
+            delivered.
+        retry_interval (float): seconds to wait before delivering a line
+            again after the callback raised.
+
+    Attributes:
+        spooled (int): lines written.
+        replayed (int): lines delivered to the callback.
+        error: last exception raised by the callback or ``None``.
+    """
+
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE,
+                 compression=None, fsync=SEGMENT, fsync_interval=1.0,
+                 flush_interval=1.0, max_latency=1.0, retry_interval=1.0):
+        if compression not in _EXTENSIONS:
+            raise ValueError("compression must be None, '%s' or '%s'" %
+                             (GZIP, ZSTD))
+        if compression == ZSTD and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard "
+                             "package")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError("fsync must be one of %s" %
+                             ", ".join(FSYNC_POLICIES))
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compression = compression
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval
+        self.max_latency = max_latency
+        self.retry_interval = retry_interval
+
+        self.spooled = 0
+        self.replayed = 0
+        self.high_water = 0
+        self.error = None
+
+        self._writer = None
+        self._synced = self._flushed = monotonic()
+        self._closed = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._pending = deque(self._recover())
+        self._next_sequence = 1 + max(
+            [_sequence_of(os.path.basename(p)) for p in self._pending] or [0])
+
+    def _recover(self):
+        """ Close segments left open by a crash and list all segments. """
+        segments = []
+        for name in os.listdir(self.directory):
+            sequence = _sequence_of(name)
+            if sequence is None or ".seg" not in name:
+                continue
+            path = os.path.join(self.directory, name)
+            if name.endswith(_OPEN):
+                closed = path[:-len(_OPEN)]
+                os.rename(path, closed)
+                path = closed
+            segments.append((sequence, path))
+        return [path for _, path in sorted(segments)]
+
+    def segments(self):
+        """
+        Returns:
+            list: paths of closed segments waiting to be replayed, oldest
+            first.
+        """
+        with self._lock:
+            return list(self._pending)
+
+    @property
+    def depth(self):
+        """ Lines spooled by this instance and not delivered yet. """
+        return max(0, self.spooled - self.replayed)
+
+    def stats(self):
+        """
+        Returns:
+            dict: the spool counters, ``dropped`` is always 0.
+        """
+        with self._lock:
+            return {
+                "depth": self.depth,
+                "high_water": self.high_water,
+                "dropped": 0,
+                "spooled": self.spooled,
+                "replayed": self.replayed,
+                "segments": len(self._pending) + (1 if self._writer else 0),
+            }
+
+    def put(self, line):
+        """ Append a line to the open segment. """
+        with self._lock:
+            if self._writer is None:
+                path = os.path.join(
+                    self.directory, "%020d%s" % (
+                        self._next_sequence, _EXTENSIONS[self.compression]))
+                self._next_sequence += 1
+                self._writer = _Writer(path, self.compression)
+
+            self._writer.write(line)
+            self.spooled += 1
+            self.high_water = max(self.high_water, self.depth)
+
+            if self._writer.size >= self.segment_size:
+                self._rotate()
+            else:
+                now = monotonic()
+                if self.fsync == ALWAYS or self.fsync == INTERVAL and \
+                        now - self._synced >= self.fsync_interval:
+                    self._writer.sync()
+                    self._synced = self._flushed = now
+                elif now - self._flushed >= self.flush_interval:
+                    # Survives the process, not the machine
+                    self._writer.flush()
+                    self._flushed = now
+
+            if self._writer is not None and self._writer.lines == 1:
+                # Let an idle consumer start its max_latency countdown
+                self._ready.notify()
+
+    def _rotate(self):
+        """ Close the open segment, with the lock held. """
+        writer = self._writer
+        self._writer = None
+        writer.close(fsync=self.fsync != NEVER)
+        self._synced = self._flushed = monotonic()
+        self._pending.append(writer.path)
+        self._ready.notify()
+
+    def _next_segment(self):
+        """
+        Wait for a closed segment.
+
+        Returns:
+            the segment path or ``None`` once closed and drained.
+        """
+        with self._lock:
+            while not self._stop.is_set():
+                if self._pending:
+                    return self._pending[0]
+
+                writer = self._writer
+                if writer is not None:
+                    waited = monotonic() - writer.opened
+                    if self._closed or waited >= self.max_latency:
+                        self._rotate()
+                        continue
+                    self._ready.wait(self.max_latency - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._ready.wait()
+            return None
+
+    def _deliver(self, path, callback):
+        """
+        Deliver the lines of a segment, retrying the line that failed.
+
+        Returns:
+            bool: ``True`` once the whole segment was delivered.
+        """
+        delivered = 0
+        while not self._stop.is_set():
+            try:
+                for i, line in enumerate(read_segment(path)):
+                    if i < delivered:
+                        continue
+                    callback(line)
+                    delivered += 1
+                    self.replayed += 1
+                    if self._stop.is_set():
+                        return False
+                return True
+            except Exception as e:
+                self.error = e
+                with self._lock:
+                    closed = self._closed
+                if closed or self._stop.wait(self.retry_interval):
+                    # The rest stays on disk for the next run
+                    return False
+        return False
+
+    def _drain(self, callback):
+        while True:
+            path = self._next_segment()
+            if path is None or not self._deliver(path, callback):
+                break
+
+            with self._lock:
+                self._pending.popleft()
+            os.remove(path)
+
+    def start(self, callback):
+        """ Start the thread replaying segments into ``callback``. """
+        self._thread = threading.Thread(target=self._drain, args=(callback,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def replay(self, callback):
+        """
+        Synchronously deliver every closed segment to ``callback``, e.g. to
+        drain a spool left behind by another process.
+
+        Returns:
+            int: number of lines delivered.
+        """
+        before = self.replayed
+        while True:
+            with self._lock:
+                if not self._pending:
+                    break
+                path = self._pending[0]
+            for line in read_segment(path):
+                callback(line)
+                self.replayed += 1
+            with self._lock:
+                self._pending.popleft()
+            os.remove(path)
+        return self.replayed - before
+
+    def close(self, drain=True):
+        """
+        Stop accepting lines and close the open segment. The consumer exits
+        once every segment has been delivered or, if ``drain`` is
+        ``False``, after the line it is delivering; what's left stays on
+        disk.
+        """
+        with self._lock:
+            self._closed = True
+            if self._writer is not None:
+                self._rotate()
+            if not drain:
+                self._stop.set()
+            self._ready.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait for the consumer thread to exit.
+
+        Returns:
+            bool: ``True`` if it has exited.
+        """
+        if self._thread is None:
+            return True
+        self._thread.join(timeout=timeout)
+        return not self._thread.is_alive()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Management of several PowerTrack connections as one stream, e.g. the
+partitions of a high volume product or several streams of an account.
+"""
+
+import threading
+
+from gnippy import config
+from gnippy.compat import monotonic
+from gnippy.powertrackclient import PowerTrackClient, add_query_params
+
+
+def partition_urls(url, partitions):
+    """
+    Generate the urls of a partitioned stream.
+
+    Args:
+        url: the stream url without a ``partition`` parameter.
+        partitions (int): number of partitions.
+
+    Returns:
+        list: ``url`` with ``partition=1`` through ``partition=partitions``.
+    """
+    return [add_query_params(url, {"partition": n})
+            for n in range(1, partitions + 1)]
+
+
+class _Connection(object):
+    """ One managed :class:`PowerTrackClient` and its counters. """
+
+    def __init__(self, url):
+        self.url = url
+        self.client = None
+        self.lines = 0
+        self.restarts = 0
+
+    @property
+    def worker(self):
+        """ The client's worker, ``None`` until it connected. """
+        return self.client.worker if self.client else None
+
+
+def _remaining(deadline):
+    """ Seconds left until a :func:`monotonic` deadline, ``None`` if none. """
+    if deadline is None:
+        return None
+    return max(0.0, deadline - monotonic())
+
+
+class StreamManager(object):
+    """
+    StreamManager opens one :class:`gnippy.powertrackclient.PowerTrackClient`
+    per url and merges everything they receive into a single pipeline.
+    Every connection reconnects on its own according to its reconnect
+    policy and can be restarted without touching the others.
+
+    Without a ``buffer`` the callback is called from each connection's
+    thread and must be thread-safe.
+
+    Args:
+        callback: On data callback shared by all connections.
+        urls: list of stream urls.
+        partitions (int): instead of ``urls``, connect to this many
+            partitions of the configured url, see :func:`partition_urls`.
+        buffer: optional :class:`gnippy.buffering.Buffer` shared by all
+            connections.
+        decoder: optional :class:`gnippy.decoding.Decoder` applied after
+            the buffer.
+        batcher: optional :class:`gnippy.batching.Batcher` shared by all
+            connections.
+        kwargs: ``url``, ``auth`` and ``config_file_path`` are resolved like
+            for :class:`PowerTrackClient`; other arguments, e.g.
+            ``reconnect_policy``, are passed to every client.
+    """
+
+    def __init__(self, callback, urls=None, partitions=None, buffer=None,
+                 decoder=None, batcher=None, **kwargs):
+        if urls and "url" not in kwargs:
+            kwargs["url"] = urls[0]
+
+        c = config.resolve(kwargs)
+
+        if not urls:
+            urls = partition_urls(c['url'], partitions) \
+                if partitions else [c['url']]
+
+        self.callback = callback
+        self.auth = c['auth']
+        self.buffer = buffer
+        self.decoder = decoder
+        self.batcher = batcher
+        self.client_kwargs = dict(
+            (k, v) for k, v in kwargs.items()
+            if k not in ("url", "auth", "config_file_path"))
+        self.connections = [_Connection(url) for url in urls]
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _sink(self):
+        sink = self.batcher.add if self.batcher else self.callback
+        if self.decoder:
+            sink = self.decoder.wrap(sink)
+        return sink
+
+    def _open(self, conn, deliver):
+        def on_data(line):
+            conn.lines += 1
+            deliver(line)
+
+        conn.client = PowerTrackClient(on_data, url=conn.url, auth=self.auth,
+                                       **self.client_kwargs)
+        conn.client.connect()
+
+    def connect(self):
+        """
+        Open all connections.
+
+        Raises:
+            RuntimeError: if called more than once.
+        """
+        with self._lock:
+            if self._started:
+                raise RuntimeError(
+                    "Cannot connect: StreamManager is not re-entrant")
+            self._started = True
+
+            if self.batcher:
+                self.batcher.start(self.callback)
+
+            if self.buffer:
+                self.buffer.start(self._sink())
+                self._deliver = self.buffer.put
+            else:
+                self._deliver = self._sink()
+
+            for conn in self.connections:
+                self._open(conn, self._deliver)
+
+    def restart(self, index, timeout=None):
+        """
+        Close connection number ``index`` and open it again, e.g. after its
+        reconnect policy gave up.
+
+        Returns:
+            bool: ``False`` if the old connection did not stop in time; a new
+            one is opened regardless.
+
+        Raises:
+            RuntimeError: if called before :meth:`connect`.
+        """
+        with self._lock:
+            if not self._started:
+                raise RuntimeError(
+                    "Cannot restart: StreamManager is not connected")
+            conn = self.connections[index]
+            stopped = True
+            if conn.worker:
+                stopped = not conn.client.disconnect(timeout=timeout)
+            conn.restarts += 1
+            self._open(conn, self._deliver)
+            return stopped
+
+    def restart_dead(self):
+        """
+        Restart every connection whose worker has exited or that failed to
+        open. Does nothing before :meth:`connect`.
+
+        Returns:
+            list: indexes of the restarted connections.
+        """
+        if not self._started:
+            return []
+        dead = [i for i, conn in enumerate(self.connections)
+                if not (conn.worker and conn.worker.is_alive())]
+        for i in dead:
+            self.restart(i, timeout=0)
+        return dead
+
+    def wait(self, timeout=None):
+        """
+        Wait on every connection, for up to ``timeout`` seconds in total.
+
+        Returns:
+            bool: ``True`` if any connection is alive.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        alive = False
+        for conn in self.connections:
+            if conn.worker:
+                alive = conn.client.wait(timeout=_remaining(deadline)) or \
+                    alive
+        return alive
+
+    def disconnect(self, timeout=None):
+        """
+        Stop all connections, then drain the shared buffer and batcher, all
+        within ``timeout`` seconds in total.
+
+        Returns:
+            bool: ``True`` if any connection is still alive.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        for conn in self.connections:
+            if conn.worker:
+                conn.worker.stop()
+        alive = self.wait(timeout=_remaining(deadline))
+
+        if self.buffer:
+            self.buffer.close()
+            self.buffer.join(timeout=_remaining(deadline))
+        if self.batcher:
+            self.batcher.close()
+
+        return alive
+
+    def stats(self):
+        """
+        Returns:
+            list:
+            a dict per connection with its ``url``, whether it is ``alive``,
+            the number of ``lines`` received, ``reconnects``, ``restarts``,
+            ``last_heartbeat`` and last ``error``.
+        """
+        result = []
+        for conn in self.connections:
+            worker = conn.worker
+            result.append({
+                "url": conn.url,
+                "alive": bool(worker and worker.is_alive()),
+                "lines": conn.lines,
+                "reconnects": worker.reconnects if worker else 0,
+                "restarts": conn.restarts,
+                "last_heartbeat": worker.last_heartbeat if worker else None,
+                "error": worker.error if worker else None,
+            })
+        return result
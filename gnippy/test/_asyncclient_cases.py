@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+AsyncPowerTrackClient tests, loaded by test_asyncclient on Python 3.7+.
+"""
+
+import asyncio
+import unittest
+
+from gnippy import _asyncclient
+from gnippy.asyncclient import AsyncPowerTrackClient
+from gnippy.test import test_utils
+
+
+class FakeContent():
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_chunked(self, n):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse():
+    def __init__(self, chunks, error=None):
+        self.content = FakeContent(chunks)
+        self.error = error
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.error:
+            raise self.error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+
+class FakeSession():
+    def __init__(self, response):
+        self.response = response
+        self.requested = []
+        self.timeouts = []
+
+    def get(self, url, auth=None, timeout=None):
+        self.requested.append(url)
+        self.timeouts.append(timeout)
+        return self.response
+
+
+def _collect(client, limit=None):
+    async def run():
+        result = []
+        async for activity in client.stream():
+            result.append(activity)
+            if limit and len(result) == limit:
+                break
+        return result
+
+    return asyncio.run(run())
+
+
+class AsyncPowerTrackClientTestCase(unittest.TestCase):
+
+    auth = (test_utils.test_username, test_utils.test_password)
+    url = test_utils.test_powertrack_url
+
+    def _client(self, chunks, error=None):
+        self.response = FakeResponse(chunks, error)
+        self.session = FakeSession(self.response)
+        return AsyncPowerTrackClient(session=self.session, url=self.url,
+                                     auth=self.auth)
+
+    def test_constructor_all_args(self):
+        client = self._client([])
+        self.assertEqual(self.auth, client.auth)
+        self.assertEqual(self.url, client.url)
+
+    def test_stream_splits_lines_across_chunks(self):
+        client = self._client([b'{"id": 1}\r\n{"i', b'd": 2}\r', b'\n'])
+        self.assertEqual([b'{"id": 1}', b'{"id": 2}'], _collect(client))
+        self.assertEqual([self.url], self.session.requested)
+
+    def test_stream_skips_keep_alives(self):
+        client = self._client([b'\r\n', b'{"id": 1}\r\n\r\n\r\n'])
+        self.assertEqual([b'{"id": 1}'], _collect(client))
+
+    def test_stream_yields_trailing_line(self):
+        client = self._client([b'{"id": 1}\r\n{"id": 2}'])
+        self.assertEqual([b'{"id": 1}', b'{"id": 2}'], _collect(client))
+
+    def test_stream_break_closes_response(self):
+        client = self._client([b'{"id": 1}\r\n{"id": 2}\r\n'])
+        self.assertEqual([b'{"id": 1}'], _collect(client, limit=1))
+        self.assertTrue(self.response.closed)
+
+    def test_stream_bad_status(self):
+        client = self._client([], error=RuntimeError("401"))
+        self.assertRaises(RuntimeError, _collect, client)
+
+    def test_read_timeout(self):
+        client = self._client([])
+        _collect(client)
+        if _asyncclient.aiohttp is not None:
+            timeout, = self.session.timeouts
+            self.assertEqual(None, timeout.total)
+            self.assertEqual(client.stall_timeout, timeout.sock_read)
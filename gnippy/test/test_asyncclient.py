@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# The test cases use async syntax, load them only where it parses
+import sys
+
+if sys.version_info >= (3, 7):
+    from gnippy.test._asyncclient_cases import *  # noqa: F401,F403
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from gnippy.batching import Batcher
+
+
+class BatcherTestCase(unittest.TestCase):
+
+    def test_bad_max_count(self):
+        self.assertRaises(ValueError, Batcher, max_count=0)
+
+    def test_max_count(self):
+        batches = []
+        b = Batcher(max_count=2, max_latency=None)
+        b.start(batches.append)
+        for line in (b"1", b"2", b"3"):
+            b.add(line)
+        self.assertEqual([[b"1", b"2"]], batches)
+        b.close()
+        self.assertEqual([[b"1", b"2"], [b"3"]], batches)
+        self.assertEqual(2, b.batches)
+
+    def test_max_latency(self):
+        delivered = threading.Event()
+        batches = []
+
+        def on_batch(batch):
+            batches.append(batch)
+            delivered.set()
+
+        b = Batcher(max_count=100, max_latency=0.01)
+        b.start(on_batch)
+        b.add(b"1")
+        self.assertTrue(delivered.wait(2))
+        b.close()
+        self.assertEqual([[b"1"]], batches)
+
+    def test_flush_empty(self):
+        batches = []
+        b = Batcher(max_latency=None)
+        b.start(batches.append)
+        b.flush()
+        b.close()
+        self.assertEqual([], batches)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from gnippy import buffering
+from gnippy.buffering import Buffer
+
+
+def _drain(buf):
+    buf.close()
+    lines = []
+    while True:
+        line = buf.get()
+        if line is None:
+            return lines
+        lines.append(line)
+
+
+class BufferTestCase(unittest.TestCase):
+
+    def test_bad_overflow(self):
+        self.assertRaises(ValueError, Buffer, overflow="wat")
+
+    def test_fifo(self):
+        buf = Buffer(maxsize=10)
+        for i in range(5):
+            buf.put(str(i).encode())
+        self.assertEqual(5, buf.depth)
+        self.assertEqual([b"0", b"1", b"2", b"3", b"4"], _drain(buf))
+        self.assertEqual(5, buf.high_water)
+
+    def test_drop_oldest(self):
+        buf = Buffer(maxsize=2, overflow=buffering.DROP_OLDEST)
+        for line in (b"1", b"2", b"3", b"4"):
+            buf.put(line)
+        self.assertEqual([b"3", b"4"], _drain(buf))
+        self.assertEqual(2, buf.stats()['dropped'])
+        self.assertEqual(2, buf.stats()['high_water'])
+
+    def test_spill_keeps_order(self):
+        buf = Buffer(maxsize=2, overflow=buffering.SPILL)
+        for i in range(7):
+            buf.put(str(i).encode())
+        self.assertEqual(5, buf.spilled)
+        self.assertEqual(7, buf.depth)
+        self.assertEqual(buf.get(), b"0")
+        # Room in memory, but older lines are still on disk
+        buf.put(b"7")
+        self.assertEqual([str(i).encode() for i in range(1, 8)], _drain(buf))
+        self.assertEqual(0, buf.depth)
+
+    def test_block_waits_for_room(self):
+        buf = Buffer(maxsize=1)
+        buf.put(b"1")
+        t = threading.Thread(target=buf.put, args=(b"2",))
+        t.start()
+        t.join(0.05)
+        self.assertTrue(t.is_alive())
+        self.assertEqual(b"1", buf.get())
+        t.join(1)
+        self.assertFalse(t.is_alive())
+        self.assertEqual([b"2"], _drain(buf))
+
+    def test_consumers_deliver_everything(self):
+        received = []
+        lock = threading.Lock()
+
+        def callback(line):
+            with lock:
+                received.append(line)
+
+        buf = Buffer(maxsize=5, consumers=3)
+        buf.start(callback)
+        for i in range(100):
+            buf.put(str(i).encode())
+        buf.close()
+        self.assertTrue(buf.join(timeout=5))
+        self.assertEqual(100, len(received))
+
+    def test_callback_errors_do_not_stall_reader(self):
+        def callback(line):
+            raise ValueError(line)
+
+        buf = Buffer(maxsize=1)
+        buf.start(callback)
+        reader = threading.Thread(
+            target=lambda: [buf.put(str(i).encode()) for i in range(20)])
+        reader.start()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        buf.close()
+        self.assertTrue(buf.join(timeout=5))
+        self.assertEqual(20, buf.stats()['errors'])
+        self.assertTrue(isinstance(buf.error, ValueError))
+
+    def test_close_releases_blocked_put(self):
+        buf = Buffer(maxsize=1)
+        buf.put(b"1")
+        t = threading.Thread(target=buf.put, args=(b"2",))
+        t.start()
+        t.join(0.05)
+        buf.close()
+        t.join(1)
+        self.assertFalse(t.is_alive())
+        buf.put(b"3")
+        self.assertEqual([b"1"], _drain(buf))
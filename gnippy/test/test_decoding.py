@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from gnippy import decoding
+from gnippy.decoding import Decoder
+
+
+class GetLoadsTestCase(unittest.TestCase):
+
+    def test_default_is_stdlib(self):
+        self.assertTrue(decoding.get_loads() is json.loads)
+
+    def test_callable(self):
+        loads = lambda line: line
+        self.assertTrue(decoding.get_loads(loads) is loads)
+
+    def test_auto(self):
+        self.assertTrue(callable(decoding.get_loads("auto")))
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, decoding.get_loads, "wat")
+
+
+class DecoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.activities = []
+        self.system = []
+        self.errors = []
+        decoder = Decoder(on_system=lambda k, m: self.system.append((k, m)),
+                          on_error=lambda l, e: self.errors.append(l))
+        self.on_data = decoder.wrap(self.activities.append)
+
+    def test_activity(self):
+        self.on_data(b'{"id": "1", "body": "hello"}')
+        self.assertEqual([{"id": "1", "body": "hello"}], self.activities)
+
+    def test_system_messages(self):
+        self.on_data(b'{"info": {"message": "Replay Request Completed"}}')
+        self.on_data(b'{"error": {"message": "Forced Disconnect"}}')
+        self.assertEqual([], self.activities)
+        self.assertEqual([("info", {"message": "Replay Request Completed"}),
+                          ("error", {"message": "Forced Disconnect"})],
+                         self.system)
+
+    def test_activity_with_error_key_is_not_system_message(self):
+        self.on_data(b'{"error": "x", "id": "1"}')
+        self.assertEqual(1, len(self.activities))
+
+    def test_malformed(self):
+        self.on_data(b'{"id": ')
+        self.assertEqual([b'{"id": '], self.errors)
+
+    def test_malformed_raises_without_on_error(self):
+        on_data = Decoder().wrap(self.activities.append)
+        self.assertRaises(ValueError, on_data, b'{"id": ')
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import mock
+
+from gnippy import dedup
+from gnippy.dedup import (BloomFilter, Deduplicator, LRUSet,
+                          WindowedBloomFilter)
+
+
+class ActivityIdTestCase(unittest.TestCase):
+
+    def test_activity_streams(self):
+        line = (b'{"id":"tag:search.twitter.com,2005:1","actor":'
+                b'{"id":"id:twitter.com:2"}}')
+        self.assertEqual(b'"tag:search.twitter.com,2005:1"',
+                         dedup.activity_id(line))
+
+    def test_original_format(self):
+        line = b'{"created_at":"x","id": 123,"user":{"id":4}}'
+        self.assertEqual(b'123', dedup.activity_id(line))
+
+    def test_no_id(self):
+        self.assertIsNone(dedup.activity_id(b'{"info":{"message":"x"}}'))
+
+
+class LRUSetTestCase(unittest.TestCase):
+
+    def test_bounded(self):
+        s = LRUSet(maxsize=2)
+        self.assertFalse(s.add(b"a"))
+        self.assertFalse(s.add(b"b"))
+        self.assertTrue(s.add(b"a"))
+        self.assertFalse(s.add(b"c"))
+        self.assertEqual(2, len(s))
+        # b was least recently used
+        self.assertFalse(s.add(b"b"))
+
+
+class BloomFilterTestCase(unittest.TestCase):
+
+    def test_add(self):
+        f = BloomFilter(1000, 0.01)
+        self.assertFalse(f.add(b"a"))
+        self.assertTrue(f.add(b"a"))
+        self.assertTrue(b"a" in f)
+
+    def test_error_rate(self):
+        f = BloomFilter(10000, 0.01)
+        for i in range(10000):
+            f.add(str(i).encode())
+        false_positives = sum(1 for i in range(10000, 20000)
+                              if str(i).encode() in f)
+        self.assertTrue(false_positives < 200)
+
+    def test_bad_error_rate(self):
+        self.assertRaises(ValueError, BloomFilter, 10, 0)
+
+
+class WindowedBloomFilterTestCase(unittest.TestCase):
+
+    def test_forgets_after_two_windows(self):
+        now = [0.0]
+        with mock.patch('gnippy.dedup.monotonic', lambda: now[0]):
+            f = WindowedBloomFilter(capacity=100, window=10)
+            self.assertFalse(f.add(b"a"))
+            now[0] = 15
+            self.assertTrue(f.add(b"a"))
+            now[0] = 30
+            self.assertFalse(f.add(b"b"))
+            now[0] = 45
+            self.assertFalse(f.add(b"a"))
+
+    def test_rotates_at_capacity(self):
+        f = WindowedBloomFilter(capacity=10, window=1000)
+        for i in range(25):
+            f.add(str(i).encode())
+        self.assertTrue(f._current.count <= 10)
+
+
+class DeduplicatorTestCase(unittest.TestCase):
+
+    def test_drops_duplicates(self):
+        d = Deduplicator()
+        self.assertFalse(d.is_duplicate(b'{"id":"1"}'))
+        self.assertTrue(d.is_duplicate(b'{"id":"1"}'))
+        self.assertFalse(d.is_duplicate(b'{"info":{}}'))
+        self.assertFalse(d.is_duplicate(b'{"info":{}}'))
+        self.assertEqual(1, d.dropped)
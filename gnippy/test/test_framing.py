@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from gnippy.framing import LineSplitter
+
+
+class LineSplitterTestCase(unittest.TestCase):
+
+    def test_complete_lines(self):
+        s = LineSplitter()
+        self.assertEqual([b"a", b"bb"], s.feed(b"a\r\nbb\r\n"))
+        self.assertEqual(0, len(s))
+
+    def test_partial_lines(self):
+        s = LineSplitter()
+        self.assertEqual([], s.feed(b'{"id":'))
+        self.assertEqual([], s.feed(b' 1}\r'))
+        self.assertEqual([b'{"id": 1}'], s.feed(b"\n{"))
+        self.assertEqual(1, len(s))
+
+    def test_keep_alives(self):
+        s = LineSplitter()
+        self.assertEqual([b"", b"a", b""], s.feed(b"\r\na\r\n\r\n"))
+
+    def test_bare_newlines(self):
+        s = LineSplitter()
+        self.assertEqual([b"a", b"b"], s.feed(b"a\nb\n"))
+
+    def test_flush(self):
+        s = LineSplitter()
+        s.feed(b"a\r\nb")
+        self.assertEqual([b"b"], s.flush())
+        self.assertEqual([], s.flush())
+
+    def test_feed_after_many_lines(self):
+        s = LineSplitter()
+        data = b"".join(str(i).encode() + b"\r\n" for i in range(1000))
+        lines = []
+        for i in range(0, len(data), 7):
+            lines.extend(s.feed(data[i:i + 7]))
+        self.assertEqual([str(i).encode() for i in range(1000)], lines)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from gnippy import rules
+from gnippy.matching import RuleMatcher, tokenize
+
+
+def original(text, **kwargs):
+    activity = {
+        "id_str": "1",
+        "text": text,
+        "lang": "en",
+        "user": {"screen_name": "Gnip", "id_str": "42", "verified": False,
+                 "followers_count": 1500, "description": "Social data"},
+        "entities": {"hashtags": [], "user_mentions": [], "symbols": [],
+                     "urls": []},
+    }
+    activity.update(kwargs)
+    return activity
+
+
+def streams(body, **kwargs):
+    activity = {
+        "id": "tag:search.twitter.com,2005:1",
+        "verb": "post",
+        "body": body,
+        "twitter_lang": "en",
+        "actor": {"preferredUsername": "Gnip", "id": "id:twitter.com:42",
+                  "summary": "Social data"},
+        "twitter_entities": {"hashtags": [{"text": "Data"}],
+                             "user_mentions": [], "symbols": [], "urls": []},
+    }
+    activity.update(kwargs)
+    return activity
+
+
+class RuleMatcherTestCase(unittest.TestCase):
+
+    def matches(self, rule, activity):
+        return bool(RuleMatcher([rules.build(rule)]).match(activity))
+
+    def test_tokenize(self):
+        self.assertEqual([u"hello", u"wörld", u"2"],
+                         tokenize(u"Hello, Wörld! #2"))
+
+    def test_keywords_match_whole_tokens(self):
+        a = original("I like Apples and iPhone!")
+        self.assertTrue(self.matches("iphone", a))
+        self.assertFalse(self.matches("apple", a))
+        self.assertTrue(self.matches("apples iphone", a))
+        self.assertTrue(self.matches("pear OR apples", a))
+        self.assertFalse(self.matches("apples -iphone", a))
+
+    def test_phrases(self):
+        a = original("the quick brown fox")
+        self.assertTrue(self.matches('"quick brown"', a))
+        self.assertFalse(self.matches('"brown quick"', a))
+        self.assertTrue(self.matches('"the fox"~3', a))
+        self.assertFalse(self.matches('"the fox"~2', a))
+
+    def test_entities_and_operators(self):
+        a = original("hello", entities={
+            "hashtags": [{"text": "Gnip"}],
+            "user_mentions": [{"screen_name": "Twitter"}],
+            "symbols": [{"text": "TWTR"}],
+            "urls": [{"expanded_url": "https://Gnip.com/docs"}]})
+        for rule in ("#gnip", "@twitter", "$twtr", "from:gnip", "from:42",
+                     "hello lang:en", "hello has:links", "url:gnip.com",
+                     "hello followers_count:1000..2000", "bio:social",
+                     "contains:ell", "hello -is:verified"):
+            self.assertTrue(self.matches(rule, a), rule)
+        for rule in ("#twitter", "from:other", "hello lang:fi",
+                     "hello has:media", "hello followers_count:2000",
+                     "hello is:retweet"):
+            self.assertFalse(self.matches(rule, a), rule)
+
+    def test_activity_streams(self):
+        a = streams("Hello world", verb="share",
+                    object={"verb": "post",
+                            "actor": {"preferredUsername": "Someone"}})
+        for rule in ("world", "#data", "from:gnip", "hello is:retweet",
+                     "retweets_of:someone", "bio:social", "hello lang:en"):
+            self.assertTrue(self.matches(rule, a), rule)
+
+    def test_unsupported_and_invalid(self):
+        matcher = RuleMatcher([rules.build("hello point_radius:[0 0 1km]"),
+                               rules.build("(bad"), rules.build("hello")])
+        self.assertEqual(1, len(matcher.unsupported))
+        self.assertEqual(1, len(matcher.invalid))
+        self.assertEqual([rules.build("hello")],
+                         matcher.match(original("hello")))
+
+    def test_match_order_and_rule_types(self):
+        rules_list = [rules.Rule("hello", "a"), rules.Rule("bio:data", "b"),
+                      rules.Rule("world", "c"), rules.Rule("social", "d")]
+        matcher = RuleMatcher(rules_list)
+        self.assertEqual([rules_list[0], rules_list[1], rules_list[2]],
+                         matcher.match(streams("Hello World")))
+
+    def test_tag(self):
+        matcher = RuleMatcher([rules.build("hello", "greeting"),
+                               rules.build("bye")])
+        a = matcher.tag(streams("hello"))
+        self.assertEqual([{"value": "hello", "tag": "greeting"}],
+                         a["gnip"]["matching_rules"])
+        a = matcher.tag(original("bye"))
+        self.assertEqual([{"value": "bye", "tag": None}],
+                         a["matching_rules"])
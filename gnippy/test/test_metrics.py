@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import mock
+
+from gnippy import PowerTrackClient
+from gnippy.buffering import Buffer
+from gnippy.metrics import Histogram, Metrics, serve_prometheus
+from gnippy.powertrackclient import Worker
+from gnippy.reconnect import ReconnectPolicy
+from gnippy.test import test_utils
+from gnippy.test.test_powertrackclient import FakeStreamResponse
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_observe(self):
+        h = Histogram(buckets=(1, 2, 4))
+        for value in (0.5, 1, 1.5, 3, 10):
+            h.observe(value)
+        counts, total, maximum = h.snapshot()
+        self.assertEqual([2, 1, 1, 1], counts)
+        self.assertEqual(16, total)
+        self.assertEqual(10, maximum)
+
+    def test_quantile(self):
+        self.assertEqual(1, Histogram.quantile((1, 2, 4), [5, 4, 1, 0], 0.5))
+        self.assertEqual(4, Histogram.quantile((1, 2, 4), [5, 4, 1, 0], 0.99))
+        self.assertIsNone(Histogram.quantile((1, 2, 4), [0, 0, 0, 1], 0.5))
+        self.assertIsNone(Histogram.quantile((1, 2, 4), [0, 0, 0, 0], 0.5))
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def _run_client(self, lines, **kwargs):
+        client = PowerTrackClient(
+            lambda line: None, url=test_utils.test_powertrack_url,
+            auth=("u", "p"), reconnect_policy=ReconnectPolicy(max_retries=0),
+            **kwargs)
+        response = FakeStreamResponse(lines)
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            client.connect()
+            client.wait()
+        return client
+
+    def test_snapshot_before_connect(self):
+        snap = Metrics().snapshot()
+        self.assertEqual(0, snap["lines"])
+        self.assertFalse(snap["alive"])
+        self.assertIsNone(snap["seconds_since_data"])
+        self.assertIsNone(snap["callback"]["p99"])
+
+    def test_client_counters(self):
+        client = self._run_client([b"1", b"", b"2", b""], buffer=Buffer())
+        snap = client.metrics.snapshot()
+        self.assertEqual(2, snap["lines"])
+        self.assertEqual(2, snap["keep_alives"])
+        self.assertEqual(2, snap["callback"]["count"])
+        self.assertEqual(0, snap["buffer_depth"])
+        self.assertTrue(snap["bytes_received"] > 0)
+        self.assertTrue(snap["lines_per_second"] > 0)
+        self.assertIsNotNone(snap["seconds_since_data"])
+
+        # Snapshots don't reset each other's rates
+        self.assertTrue(client.metrics.snapshot()["lines_per_second"] > 0)
+        # Rates over the interval since an earlier snapshot
+        self.assertEqual(
+            0, client.metrics.snapshot(since=snap)["lines_per_second"])
+
+    def test_timed(self):
+        metrics = Metrics()
+        callback = metrics.timed(lambda x: x * 2)
+        self.assertEqual(4, callback(2))
+        self.assertEqual(1, metrics.snapshot()["callback"]["count"])
+
+    def test_prometheus(self):
+        client = self._run_client([b"1"], backfill_minutes=1)
+        text = client.metrics.to_prometheus(labels={"stream": "prod"})
+        self.assertTrue('gnippy_lines_total{stream="prod"} 1\n' in text)
+        self.assertTrue('gnippy_duplicates_dropped_total{stream="prod"} 0'
+                        in text)
+        self.assertTrue('gnippy_callback_seconds_bucket{stream="prod",'
+                        'le="+Inf"} 1\n' in text)
+        self.assertTrue('gnippy_callback_seconds_count{stream="prod"} 1\n'
+                        in text)
+
+    def test_serve_prometheus(self):
+        server = serve_prometheus(Metrics(), 0, address="127.0.0.1")
+        try:
+            url = "http://127.0.0.1:%d/metrics" % server.server_address[1]
+            body = urlopen(url).read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertTrue("gnippy_lines_total 0\n" in body)
+
+
+class WorkerCountersTestCase(unittest.TestCase):
+
+    def test_lines_and_keep_alives(self):
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        lambda line: None)
+        worker.stream(FakeStreamResponse([b"1", b"", b"", b"2"]))
+        self.assertEqual(2, worker.lines)
+        self.assertEqual(2, worker.keep_alives)
+        self.assertIsNotNone(worker.last_data)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+import unittest
+
+from gnippy import PowerTrackClient, rules
+from gnippy.errors import RulesGetFailedException
+from gnippy.mockserver import MockPowerTrackServer
+from gnippy.reconnect import Backoff, ReconnectPolicy
+
+AUTH = ("account", "password")
+
+
+class Collector(object):
+    """ Callback signalling once ``count`` lines were received. """
+
+    def __init__(self, count):
+        self.count = count
+        self.lines = []
+        self.done = threading.Event()
+
+    def __call__(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.count:
+            self.done.set()
+
+
+class MockServerStreamTestCase(unittest.TestCase):
+
+    def _consume(self, server, count, **kwargs):
+        collector = Collector(count)
+        client = PowerTrackClient(collector, url=server.url, auth=AUTH,
+                                  **kwargs)
+        client.connect()
+        self.assertTrue(collector.done.wait(10))
+        client.disconnect(timeout=5)
+        return client, collector.lines
+
+    def test_stream(self):
+        for compression in (False, True):
+            with MockPowerTrackServer(message_size=500, messages=1000,
+                                      compression=compression,
+                                      auth=AUTH) as server:
+                client, lines = self._consume(server, 1000,
+                                              compression=compression)
+            self.assertEqual(1000, len(lines))
+            self.assertEqual(500, len(lines[0]))
+            ids = [json.loads(line.decode("utf-8"))["id"] for line in lines]
+            self.assertEqual(1000, len(set(ids)))
+            if compression:
+                self.assertTrue(server.bytes_sent <
+                                client.worker.bytes_decompressed)
+
+    def test_forced_disconnects(self):
+        policy = ReconnectPolicy(network=Backoff(0.01, 0.01))
+        for compression in (False, True):
+            with MockPowerTrackServer(disconnect_after=100,
+                                      compression=compression) as server:
+                client, lines = self._consume(server, 350,
+                                              compression=compression,
+                                              reconnect_policy=policy)
+            self.assertTrue(client.worker.reconnects >= 3)
+            self.assertTrue(server.disconnects >= 3)
+
+    def test_rate_and_heartbeat(self):
+        with MockPowerTrackServer(rate=20, heartbeat_interval=0.05) as server:
+            start = time.time()
+            client, _ = self._consume(server, 5)
+            self.assertTrue(time.time() - start >= 0.15)
+
+        with MockPowerTrackServer(rate=0.1, heartbeat_interval=0.05) as server:
+            client = PowerTrackClient(lambda line: None, url=server.url,
+                                      auth=AUTH)
+            client.connect()
+            time.sleep(0.3)
+            client.disconnect(timeout=5)
+            self.assertEqual(1, client.worker.lines)
+            self.assertTrue(client.worker.keep_alives >= 2)
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, MockPowerTrackServer, rate=0)
+        self.assertRaises(ValueError, MockPowerTrackServer,
+                          disconnect_after=0)
+
+
+class MockServerRulesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockPowerTrackServer(
+            auth=AUTH, rules=[{"value": "cats", "tag": "pets"}]).start()
+        self.conf = {"url": self.server.url, "auth": AUTH}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_rules(self):
+        rules.add_rules([rules.build("dogs"), rules.build("cats")],
+                        **self.conf)
+        self.assertEqual([{"value": "cats", "tag": "pets"},
+                          {"value": "dogs", "tag": None}],
+                         rules.get_rules(**self.conf))
+
+        rules.delete_rule({"value": "cats"}, **self.conf)
+        self.assertEqual(["dogs"],
+                         [r["value"] for r in rules.iter_rules(**self.conf)])
+
+    def test_unauthorized(self):
+        self.assertRaises(RulesGetFailedException, rules.get_rules,
+                          url=self.server.url, auth=("account", "wrong"))
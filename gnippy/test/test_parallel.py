@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import unittest
+
+from gnippy.parallel import ProcessPool, SharedRing
+
+
+def _lengths(lines):
+    return [len(line) for line in lines]
+
+
+def _odd_only(lines):
+    return [int(line) for line in lines if int(line) % 2]
+
+
+def _discard(lines):
+    return None
+
+
+def _fail_on_three(lines):
+    if b"3" in lines:
+        raise ValueError("three")
+    return [int(line) for line in lines]
+
+
+def _exit_on_three(lines):
+    if b"3" in lines:
+        os._exit(3)
+    return [int(line) for line in lines]
+
+
+class SharedRingTestCase(unittest.TestCase):
+
+    def test_write_read(self):
+        ring = SharedRing(64)
+        ring.write(1, b"hello")
+        self.assertEqual((1, b"hello"), ring.read())
+
+    def test_wraps_around(self):
+        ring = SharedRing(64)
+        for i in range(20):
+            payload = ("payload-%d" % i).encode()
+            ring.write(i, payload)
+            self.assertEqual((i, payload), ring.read())
+
+    def test_record_too_large(self):
+        ring = SharedRing(16)
+        self.assertRaises(ValueError, ring.write, 0, b"x" * 16)
+
+    def test_closed_and_drained(self):
+        ring = SharedRing(64)
+        ring.write(0, b"a")
+        ring.close()
+        self.assertEqual((0, b"a"), ring.read())
+        self.assertIsNone(ring.read())
+
+    def test_blocks_until_consumed(self):
+        ring = SharedRing(32)
+        ring.write(0, b"x" * 16)
+        t = threading.Thread(target=ring.write, args=(1, b"y" * 16))
+        t.start()
+        t.join(0.05)
+        self.assertTrue(t.is_alive())
+        self.assertEqual((0, b"x" * 16), ring.read())
+        t.join(1)
+        self.assertEqual((1, b"y" * 16), ring.read())
+
+
+class ProcessPoolTestCase(unittest.TestCase):
+
+    def _run(self, func, lines, **kwargs):
+        results = []
+        self.pool = ProcessPool(func, processes=2, batch_size=10,
+                                ring_size=4096, **kwargs)
+        self.pool.start(results.append)
+        for line in lines:
+            self.pool.put(line)
+        closer = threading.Thread(target=self.pool.close)
+        closer.daemon = True
+        closer.start()
+        closer.join(10)
+        self.assertFalse(closer.is_alive())
+        return results
+
+    def test_ordered(self):
+        lines = [str(i).encode() for i in range(500)]
+        results = self._run(_odd_only, lines, ordered=True)
+        self.assertEqual(list(range(1, 500, 2)), results)
+
+    def test_unordered(self):
+        lines = [b"x" * (i % 7) for i in range(500)]
+        results = self._run(_lengths, lines)
+        self.assertEqual(sorted(i % 7 for i in range(500)), sorted(results))
+
+    def test_no_results(self):
+        self.assertEqual([], self._run(_discard, [b"1", b"2"], ordered=True))
+
+    def test_func_raises(self):
+        lines = [str(i).encode() for i in range(100)]
+        for ordered in (True, False):
+            results = self._run(_fail_on_three, lines, ordered=ordered)
+            self.assertNotIn(3, results)
+            self.assertTrue(len(results) >= 90)
+            if ordered:
+                self.assertEqual(sorted(results), results)
+            self.assertEqual(1, self.pool.errors)
+            self.assertIn("ValueError: three", self.pool.error)
+
+    def test_worker_dies(self):
+        lines = [str(i).encode() for i in range(100)]
+        for ordered in (True, False):
+            results = self._run(_exit_on_three, lines, ordered=ordered)
+            self.assertNotIn(3, results)
+            if ordered:
+                self.assertEqual(sorted(results), results)
+            self.assertTrue(self.pool.errors >= 1)
+            self.assertIn("exited with code 3", self.pool.error)
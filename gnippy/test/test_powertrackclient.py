@@ -2,8 +2,23 @@
 
 import os
 import unittest
+import zlib
+
+import mock
+import requests
+from requests.packages.urllib3.exceptions import (ProtocolError,
+                                                  ReadTimeoutError, SSLError)
 
 from gnippy import PowerTrackClient
+from gnippy.batching import Batcher
+from gnippy.buffering import Buffer
+from gnippy.decoding import Decoder
+from gnippy.dedup import Deduplicator
+from gnippy.errors import BadArgumentException
+from gnippy.parallel import ProcessPool
+from gnippy.powertrackclient import Worker
+from gnippy import reconnect
+from gnippy.reconnect import Backoff, ReconnectPolicy
 from gnippy.test import test_utils
 
 def _dummy_callback(activity):
@@ -80,4 +95,364 @@ class PowerTrackClientTestCase(unittest.TestCase):
                 client = PowerTrackClient(_dummy_callback)
                 self.assertIsNotNone(client.auth)
                 self.assertIsNotNone(client.url)
-                self.assertTrue("http" in client.url and "://" in client.url)
\ No newline at end of file
+                self.assertTrue("http" in client.url and "://" in client.url)
+
+class FakeStreamResponse():
+    """ Stands in for a streaming requests.Response. """
+    def __init__(self, lines, status_code=200, error=None):
+        self.lines = lines
+        self.status_code = status_code
+        self.error = error
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise _http_error(self.status_code)
+
+    def iter_content(self, chunk_size=1):
+        for line in self.lines:
+            yield line + b"\r\n"
+        if self.error:
+            raise self.error
+
+    def close(self):
+        pass
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+class WorkerReconnectTestCase(unittest.TestCase):
+
+    url = test_utils.test_powertrack_url
+    auth = (test_utils.test_username, test_utils.test_password)
+
+    def _run(self, responses, policy):
+        received = []
+        get = mock.Mock(side_effect=responses)
+        with mock.patch('requests.get', get):
+            worker = Worker(self.url, self.auth, received.append,
+                            reconnect_policy=policy)
+            worker.run()
+        return worker, received, get
+
+    def test_reconnects_after_drop(self):
+        responses = [
+            FakeStreamResponse([b"1"], error=requests.exceptions.ConnectionError()),
+            FakeStreamResponse([b"", b"2"]),
+            FakeStreamResponse([], status_code=401),
+        ]
+        policy = ReconnectPolicy(network=Backoff(0, 0))
+        worker, received, get = self._run(responses, policy)
+
+        self.assertEqual([b"1", b"2"], received)
+        self.assertEqual(3, get.call_count)
+        self.assertEqual(2, worker.reconnects)
+        self.assertEqual(401, worker.error.response.status_code)
+
+    def test_gives_up_after_max_retries(self):
+        responses = [FakeStreamResponse([], status_code=503)] * 3
+        policy = ReconnectPolicy(http_5xx=Backoff(0, 0, max_retries=2))
+        worker, received, get = self._run(responses, policy)
+
+        self.assertEqual(3, get.call_count)
+        self.assertEqual(2, worker.reconnects)
+
+    def test_no_reconnect_when_stopped(self):
+        received = []
+        worker = Worker(self.url, self.auth, received.append)
+
+        def stop_on_data(line):
+            received.append(line)
+            worker.stop()
+
+        worker.on_data = stop_on_data
+        get = mock.Mock(return_value=FakeStreamResponse([b"1", b"2"]))
+        with mock.patch('requests.get', get):
+            worker.run()
+
+        self.assertEqual([b"1"], received)
+        self.assertEqual(1, get.call_count)
+
+
+class WorkerStallTestCase(unittest.TestCase):
+
+    url = test_utils.test_powertrack_url
+    auth = (test_utils.test_username, test_utils.test_password)
+
+    def test_keep_alives_update_heartbeat(self):
+        worker = Worker(self.url, self.auth, _dummy_callback)
+        self.assertIsNone(worker.last_heartbeat)
+        worker.stream(FakeStreamResponse([b""]))
+        self.assertIsNotNone(worker.last_heartbeat)
+        self.assertFalse(worker.stalled())
+
+    def test_read_timeout_passed_to_requests(self):
+        worker = Worker(self.url, self.auth, _dummy_callback, stall_timeout=5)
+        get = mock.Mock(return_value=FakeStreamResponse([]))
+        with mock.patch('requests.get', get):
+            worker.connect()
+        self.assertEqual(5, get.call_args[1]['timeout'][1])
+
+    def test_silence_classified_as_stall(self):
+        policy = mock.Mock(wraps=ReconnectPolicy(max_retries=0))
+        worker = Worker(self.url, self.auth, _dummy_callback,
+                        reconnect_policy=policy, stall_timeout=0)
+        response = FakeStreamResponse(
+            [b""], error=requests.exceptions.ConnectionError())
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+        policy.delay.assert_called_once_with(reconnect.STALL, 1)
+
+    def test_client_exposes_heartbeat(self):
+        client = PowerTrackClient(_dummy_callback, url=self.url, auth=self.auth)
+        self.assertIsNone(client.last_heartbeat)
+        client.worker = Worker(self.url, self.auth, _dummy_callback)
+        client.worker.heartbeat()
+        self.assertEqual(client.worker.last_heartbeat, client.last_heartbeat)
+
+
+class WorkerBufferTestCase(unittest.TestCase):
+
+    def test_lines_delivered_through_buffer(self):
+        received = []
+        buf = Buffer(consumers=2)
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        received.append, buffer=buf,
+                        reconnect_policy=ReconnectPolicy(max_retries=0))
+        response = FakeStreamResponse([b"1", b"", b"2", b"3"])
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+
+        self.assertEqual([b"1", b"2", b"3"], sorted(received))
+        self.assertEqual(0, buf.depth)
+
+
+class WorkerBatcherTestCase(unittest.TestCase):
+
+    def test_lines_delivered_in_batches(self):
+        batches = []
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        batches.append, batcher=Batcher(max_count=2),
+                        buffer=Buffer(),
+                        reconnect_policy=ReconnectPolicy(max_retries=0))
+        response = FakeStreamResponse([b"1", b"2", b"3"])
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+
+        self.assertEqual([[b"1", b"2"], [b"3"]], batches)
+
+
+class WorkerDecoderTestCase(unittest.TestCase):
+
+    def test_decoded_activities_batched(self):
+        batches = []
+        system = []
+        decoder = Decoder(on_system=lambda kind, msg: system.append(kind))
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        batches.append, batcher=Batcher(max_count=2),
+                        decoder=decoder,
+                        reconnect_policy=ReconnectPolicy(max_retries=0))
+        response = FakeStreamResponse(
+            [b'{"id": 1}', b'{"warn": {"message": "w"}}', b'{"id": 2}'])
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+
+        self.assertEqual([[{"id": 1}, {"id": 2}]], batches)
+        self.assertEqual(["warn"], system)
+
+
+def _double(lines):
+    return [line * 2 for line in lines]
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+
+    def test_pool_results_delivered(self):
+        received = []
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        received.append, pool=ProcessPool(
+                            _double, processes=2, ordered=True),
+                        reconnect_policy=ReconnectPolicy(max_retries=0))
+        response = FakeStreamResponse([b"1", b"2", b"3"])
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+
+        self.assertEqual([b"11", b"22", b"33"], received)
+
+    def test_pool_with_decoder(self):
+        self.assertRaises(BadArgumentException, PowerTrackClient,
+                          _dummy_callback, pool=ProcessPool(_double),
+                          decoder=Decoder(), url="http://wat.com/testing.json",
+                          auth=("u", "p"))
+
+
+class WorkerDeduplicatorTestCase(unittest.TestCase):
+
+    def test_duplicates_dropped(self):
+        received = []
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        received.append, deduplicator=Deduplicator(),
+                        reconnect_policy=ReconnectPolicy(max_retries=0))
+        response = FakeStreamResponse([b'{"id":1}', b'{"id":2}', b'{"id":1}'])
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+
+        self.assertEqual([b'{"id":1}', b'{"id":2}'], received)
+
+
+class WorkerBackfillTestCase(unittest.TestCase):
+
+    url = test_utils.test_powertrack_url
+
+    def _worker(self, backfill_minutes=5):
+        return Worker(self.url, ("u", "p"), _dummy_callback,
+                      backfill_minutes=backfill_minutes)
+
+    def test_first_connection_without_backfill(self):
+        self.assertEqual(self.url, self._worker().stream_url())
+
+    def test_backfill_sized_to_gap(self):
+        worker = self._worker()
+        with mock.patch('gnippy.powertrackclient.monotonic', lambda: 1000.0):
+            worker.heartbeat()
+        worker._disconnected_at = worker._last_received
+        with mock.patch('gnippy.powertrackclient.monotonic', lambda: 1090.0):
+            self.assertEqual(self.url + "?backfillMinutes=2",
+                             worker.stream_url())
+        with mock.patch('gnippy.powertrackclient.monotonic', lambda: 9000.0):
+            self.assertEqual(self.url + "?backfillMinutes=5",
+                             worker.stream_url())
+
+    def test_backfill_disabled(self):
+        worker = self._worker(backfill_minutes=None)
+        worker._disconnected_at = 0.0
+        self.assertEqual(self.url, worker.stream_url())
+
+    def test_reconnect_requests_backfill(self):
+        get = mock.Mock(side_effect=[
+            FakeStreamResponse([b'{"id":1}'],
+                               error=requests.exceptions.ConnectionError()),
+            FakeStreamResponse([b'{"id":1}', b'{"id":2}']),
+            FakeStreamResponse([], status_code=401),
+        ])
+        received = []
+        worker = Worker(self.url, ("u", "p"), received.append,
+                        backfill_minutes=3, deduplicator=Deduplicator(),
+                        reconnect_policy=ReconnectPolicy(
+                            max_retries=1, network=Backoff(0, 0)))
+        with mock.patch('requests.get', get):
+            worker.run()
+
+        self.assertEqual(self.url, get.call_args_list[0][0][0])
+        self.assertEqual(self.url + "?backfillMinutes=1",
+                         get.call_args_list[1][0][0])
+        self.assertEqual([b'{"id":1}', b'{"id":2}'], received)
+
+    def test_client_adds_deduplicator(self):
+        client = PowerTrackClient(_dummy_callback, url=self.url,
+                                  auth=("u", "p"), backfill_minutes=5)
+        self.assertIsNotNone(client.deduplicator)
+
+    def test_client_backfill_limit(self):
+        self.assertRaises(BadArgumentException, PowerTrackClient,
+                          _dummy_callback, url=self.url, auth=("u", "p"),
+                          backfill_minutes=6)
+
+
+class FakeRaw():
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, amt, decode_content=True):
+        return iter(self.chunks)
+
+
+class WorkerCompressionTestCase(unittest.TestCase):
+
+    def _gzip_chunks(self, lines):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        chunks = []
+        for line in lines:
+            chunks.append(compressor.compress(line + b"\r\n") +
+                          compressor.flush(zlib.Z_SYNC_FLUSH))
+        chunks.append(compressor.flush())
+        return chunks
+
+    def test_gzip_stream(self):
+        lines = [b'{"id": %d, "body": "hello hello hello"}' % i
+                 for i in range(50)]
+        response = FakeStreamResponse([])
+        response.headers = {"Content-Encoding": "gzip"}
+        response.raw = FakeRaw(self._gzip_chunks(lines))
+
+        received = []
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        received.append)
+        worker.stream(response)
+
+        self.assertEqual(lines, received)
+        self.assertEqual(sum(len(l) + 2 for l in lines),
+                         worker.bytes_decompressed)
+        self.assertTrue(0 < worker.bytes_received < worker.bytes_decompressed)
+
+    def test_first_chunk_decompressed_immediately(self):
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        _dummy_callback)
+        response = FakeStreamResponse([])
+        response.headers = {"Content-Encoding": "gzip"}
+        response.raw = FakeRaw(self._gzip_chunks([b"a", b"b"]))
+        self.assertEqual(b"a\r\n", next(worker.chunks(response)))
+
+    def _gzip_worker(self, raw_chunks):
+        received = []
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        received.append)
+        response = FakeStreamResponse([])
+        response.headers = {"Content-Encoding": "gzip"}
+        response.raw = FakeRaw(raw_chunks)
+        return worker, response, received
+
+    def test_broken_stream_raises_requests_exceptions(self):
+        expected = [
+            (ProtocolError("Response ended prematurely"),
+             requests.exceptions.ChunkedEncodingError),
+            (ReadTimeoutError(None, None, "Read timed out"),
+             requests.exceptions.ConnectionError),
+            (SSLError("bad record mac"), requests.exceptions.SSLError),
+        ]
+        for error, exception in expected:
+            def broken():
+                yield self._gzip_chunks([b"a"])[0]
+                raise error
+
+            worker, response, received = self._gzip_worker(broken())
+            self.assertRaises(exception, worker.stream, response)
+            self.assertEqual([b"a"], received)
+
+    def test_corrupt_gzip_raises_requests_exception(self):
+        worker, response, received = self._gzip_worker(
+            [self._gzip_chunks([b"a"])[0], b"not gzip"])
+        self.assertRaises(requests.exceptions.ContentDecodingError,
+                          worker.stream, response)
+        self.assertEqual([b"a"], received)
+
+    def test_uncompressed_counters(self):
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        _dummy_callback)
+        worker.stream(FakeStreamResponse([b"abc"]))
+        self.assertEqual(5, worker.bytes_received)
+        self.assertEqual(5, worker.bytes_decompressed)
+
+    def test_accept_encoding(self):
+        for compression, expected in ((True, "gzip"), (False, "identity")):
+            worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                            _dummy_callback, compression=compression)
+            get = mock.Mock(return_value=FakeStreamResponse([]))
+            with mock.patch('requests.get', get):
+                worker.connect()
+            self.assertEqual(expected,
+                             get.call_args[1]['headers']['Accept-Encoding'])
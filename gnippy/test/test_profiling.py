@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import mock
+
+from gnippy import PowerTrackClient
+from gnippy.batching import Batcher
+from gnippy.powertrackclient import Worker
+from gnippy.profiling import Hooks, Profiler
+from gnippy.reconnect import ReconnectPolicy
+from gnippy.test import test_utils
+from gnippy.test.test_powertrackclient import FakeStreamResponse
+
+
+class RecordingHooks(Hooks):
+
+    def __init__(self, sample_every=1):
+        super(RecordingHooks, self).__init__(sample_every)
+        self.chunks = []
+        self.lines = []
+        self.calls = []
+
+    def on_chunk(self, size, read_time, split_time, deliver_time):
+        self.chunks.append((size, read_time, split_time, deliver_time))
+
+    def on_line(self, line):
+        self.lines.append(line)
+
+    def before_callback(self, item):
+        self.calls.append(("before", item))
+
+    def after_callback(self, item, elapsed):
+        self.calls.append(("after", item))
+
+
+def _worker(callback, **kwargs):
+    return Worker(test_utils.test_powertrack_url, ("u", "p"), callback,
+                  reconnect_policy=ReconnectPolicy(max_retries=0), **kwargs)
+
+
+def _run(worker, lines):
+    response = FakeStreamResponse(lines)
+    with mock.patch('requests.get', mock.Mock(return_value=response)):
+        worker.run()
+
+
+class HooksTestCase(unittest.TestCase):
+
+    def test_all_hooks_called(self):
+        received = []
+        hooks = RecordingHooks()
+        _run(_worker(received.append, hooks=hooks), [b"1", b"", b"2"])
+
+        self.assertEqual([b"1", b"2"], received)
+        self.assertEqual([b"1", b"2"], hooks.lines)
+        self.assertEqual([("before", b"1"), ("after", b"1"),
+                          ("before", b"2"), ("after", b"2")], hooks.calls)
+        self.assertEqual(3, len(hooks.chunks))
+        self.assertIsNone(hooks.chunks[0][1])
+        self.assertIsNotNone(hooks.chunks[1][1])
+
+    def test_sampling(self):
+        hooks = RecordingHooks(sample_every=2)
+        _run(_worker(lambda line: None, hooks=hooks),
+             [b"1", b"2", b"3", b"4"])
+        self.assertEqual([b"2", b"4"], hooks.lines)
+        self.assertEqual(2, len(hooks.chunks))
+        self.assertEqual([("before", b"2"), ("after", b"2"),
+                          ("before", b"4"), ("after", b"4")], hooks.calls)
+
+    def test_batches_instrumented(self):
+        hooks = RecordingHooks()
+        _run(_worker(lambda batch: None, hooks=hooks,
+                     batcher=Batcher(max_count=2)), [b"1", b"2"])
+        self.assertEqual([("before", [b"1", b"2"]), ("after", [b"1", b"2"])],
+                         hooks.calls)
+
+    def test_toggled_at_runtime(self):
+        hooks = RecordingHooks()
+        worker = _worker(lambda line: None)
+
+        def on_data(line):
+            worker.hooks = hooks if line == b"1" else None
+
+        worker.on_data = on_data
+        _run(worker, [b"1", b"2", b"3"])
+        self.assertEqual([b"2"], hooks.lines)
+
+    def test_client_set_hooks(self):
+        client = PowerTrackClient(lambda line: None,
+                                  url=test_utils.test_powertrack_url,
+                                  auth=("u", "p"))
+        client.worker = _worker(lambda line: None)
+        profiler = Profiler()
+        client.set_hooks(profiler)
+        self.assertTrue(client.worker.hooks is profiler)
+        client.set_hooks(None)
+        self.assertIsNone(client.worker.hooks)
+
+    def test_bad_sample_every(self):
+        self.assertRaises(ValueError, Hooks, 0)
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def test_report(self):
+        profiler = Profiler()
+        _run(_worker(lambda line: None, hooks=profiler), [b"1", b"2", b""])
+        report = profiler.report()
+        self.assertEqual(2, report["lines"])
+        self.assertEqual(2, report["callback"]["count"])
+        self.assertEqual(3, report["split"]["count"])
+        self.assertEqual(2, report["read"]["count"])
+        self.assertAlmostEqual(1.0, sum(report["shares"].values()))
+
+        profiler.reset()
+        self.assertEqual(0, profiler.report()["lines"])
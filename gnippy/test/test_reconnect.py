@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import mock
+import requests
+
+from gnippy import reconnect
+from gnippy.reconnect import Backoff, ReconnectPolicy
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+class BackoffTestCase(unittest.TestCase):
+
+    def test_exponential_growth_capped(self):
+        b = Backoff(1.0, 10.0, jitter=0)
+        self.assertEqual([1.0, 2.0, 4.0, 8.0, 10.0, 10.0],
+                         [b.delay(i) for i in range(1, 7)])
+
+    @mock.patch('random.random', lambda: 1.0)
+    def test_jitter_subtracts_fraction(self):
+        b = Backoff(4.0, 10.0, jitter=0.25)
+        self.assertEqual(3.0, b.delay(1))
+
+    def test_max_retries(self):
+        b = Backoff(1.0, 10.0, max_retries=2)
+        self.assertIsNotNone(b.delay(2))
+        self.assertIsNone(b.delay(3))
+
+    def test_bad_jitter(self):
+        self.assertRaises(ValueError, Backoff, 1.0, 10.0, jitter=2)
+
+
+class ReconnectPolicyTestCase(unittest.TestCase):
+
+    def test_classify(self):
+        classify = ReconnectPolicy.classify
+        self.assertEqual(reconnect.HTTP_4XX, classify(_http_error(401)))
+        self.assertEqual(reconnect.RATE_LIMITED, classify(_http_error(429)))
+        self.assertEqual(reconnect.HTTP_5XX, classify(_http_error(503)))
+        self.assertEqual(reconnect.STALL,
+                         classify(requests.exceptions.ReadTimeout()))
+        self.assertEqual(reconnect.NETWORK,
+                         classify(requests.exceptions.ConnectionError()))
+
+    def test_client_errors_not_retried(self):
+        policy = ReconnectPolicy()
+        self.assertIsNone(policy.delay(reconnect.HTTP_4XX, 1))
+        self.assertIsNotNone(policy.delay(reconnect.HTTP_5XX, 1))
+
+    def test_max_retries_override(self):
+        policy = ReconnectPolicy(max_retries=0)
+        self.assertIsNone(policy.delay(reconnect.NETWORK, 1))
+
+    def test_max_retries_override_keeps_client_errors_fatal(self):
+        b = Backoff(1.0, 1.0, max_retries=1)
+        policy = ReconnectPolicy(max_retries=5, http_5xx=b)
+        self.assertIsNotNone(policy.delay(reconnect.NETWORK, 5))
+        self.assertIsNone(policy.delay(reconnect.NETWORK, 6))
+        self.assertIsNone(policy.delay(reconnect.HTTP_4XX, 1))
+        self.assertIsNone(policy.delay(reconnect.HTTP_5XX, 2))
+
+    def test_backoff_override(self):
+        b = Backoff(1.0, 1.0)
+        policy = ReconnectPolicy(network=b)
+        self.assertTrue(policy.backoffs[reconnect.NETWORK] is b)
+
+    def test_unknown_kind(self):
+        self.assertRaises(ValueError, ReconnectPolicy, wat=Backoff(1, 1))
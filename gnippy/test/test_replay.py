@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from gnippy import replay
+from gnippy.batching import Batcher
+from gnippy.decoding import Decoder
+from gnippy.dedup import Deduplicator
+from gnippy.errors import BadArgumentException
+from gnippy.replay import ReplayClient, activity_time
+
+
+class ActivityTimeTestCase(unittest.TestCase):
+
+    def test_activity_streams(self):
+        line = b'{"id": "1", "postedTime": "2015-04-14T10:12:13.250Z"}'
+        self.assertEqual(1429006333.25, activity_time(line))
+
+    def test_activity_streams_actor_first(self):
+        line = (b'{"id":"1","objectType":"activity","actor":{'
+                b'"objectType":"person","postedTime":"2009-01-01T00:00:00.000Z"'
+                b'},"verb":"share","postedTime":"2015-04-14T10:12:13.250Z",'
+                b'"object":{"verb":"post",'
+                b'"postedTime":"2015-04-13T00:00:00.000Z"}}')
+        self.assertEqual(1429006333.25, activity_time(line))
+        # Decoded when the verb does not come first
+        line = (b'{"actor": {"postedTime": "2009-01-01T00:00:00.000Z"}, '
+                b'"postedTime": "2015-04-14T10:12:13.250Z", "verb": "post"}')
+        self.assertEqual(1429006333.25, activity_time(line))
+
+    def test_original(self):
+        line = b'{"created_at": "Tue Apr 14 10:12:13 +0000 2015", "id": 1}'
+        self.assertEqual(1429006333.0, activity_time(line))
+
+    def test_timestamp_ms_preferred(self):
+        line = (b'{"created_at": "Tue Apr 14 10:12:13 +0000 2015", '
+                b'"timestamp_ms": "1429006333500"}')
+        self.assertEqual(1429006333.5, activity_time(line))
+
+    def test_missing_or_invalid(self):
+        self.assertEqual(None, activity_time(b'{"id": "1"}'))
+        self.assertEqual(None, activity_time(b'{"postedTime": "yesterday"}'))
+        self.assertEqual(None, activity_time(b'{"actor": {"postedTime": '
+                                             b'"2015-04-14T10:12:13Z"}'))
+
+
+class ReplayClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _activities(self, n, start=0):
+        return [json.dumps({"id": str(i)}).encode("ascii")
+                for i in range(start, start + n)]
+
+    def _capture(self, name, lines, keep_alives=True):
+        data = b"".join(line + b"\r\n" for line in lines)
+        if keep_alives:
+            data = b"\r\n" + data
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _replay(self, paths, **kwargs):
+        received = []
+        client = ReplayClient(received.append, paths, **kwargs)
+        client.connect()
+        self.assertFalse(client.wait(timeout=10))
+        return client, received
+
+    def test_replay(self):
+        lines = self._activities(1000)
+        path = self._capture("capture.json", lines)
+        client, received = self._replay(path, chunk_size=100)
+        self.assertEqual(lines, received)
+        self.assertEqual(1, client.worker.files)
+        self.assertEqual(1, client.worker.keep_alives)
+        self.assertEqual(os.path.getsize(path), client.worker.bytes_received)
+        snapshot = client.metrics.snapshot()
+        self.assertEqual(1000, snapshot["lines"])
+        self.assertEqual(1000, snapshot["callback"]["count"])
+
+    def test_files_in_order_and_repeat(self):
+        first = self._activities(10)
+        second = self._activities(10, start=10)
+        paths = [self._capture("1.json", first),
+                 self._capture("2.json.gz", second),
+                 self._capture("3.json", [])]
+        client, received = self._replay(paths, repeat=2)
+        self.assertEqual((first + second) * 2, received)
+        self.assertEqual(6, client.worker.files)
+
+    def test_unterminated_last_line(self):
+        path = os.path.join(self.directory, "capture.json")
+        with open(path, "wb") as f:
+            f.write(b'{"id": "1"}\n{"id": "2"}')
+        _, received = self._replay(path)
+        self.assertEqual([b'{"id": "1"}', b'{"id": "2"}'], received)
+
+    def test_pipeline(self):
+        lines = self._activities(10)
+        path = self._capture("capture.json", lines + lines)
+        _, received = self._replay(path, decoder=Decoder(),
+                                   deduplicator=Deduplicator(),
+                                   batcher=Batcher(max_count=4))
+        self.assertEqual([4, 4, 2], [len(batch) for batch in received])
+        self.assertEqual([str(i) for i in range(10)],
+                         [a["id"] for batch in received for a in batch])
+
+    def test_pacing(self):
+        times = dict((line, i * 0.1)
+                     for i, line in enumerate(self._activities(4)))
+        path = self._capture("capture.json", sorted(times))
+
+        start = time.time()
+        self._replay(path, speed=replay.REAL_TIME, timestamp=times.get)
+        self.assertTrue(time.time() - start >= 0.3)
+
+        start = time.time()
+        self._replay(path, speed=100, timestamp=times.get)
+        self.assertTrue(time.time() - start < 0.3)
+
+    def test_disconnect_while_paced(self):
+        times = {b"1": 0, b"2": 3600}
+        path = self._capture("capture.json", [b"1", b"2"])
+        received = []
+        client = ReplayClient(received.append, path, speed=replay.REAL_TIME,
+                              timestamp=times.get)
+        client.connect()
+        time.sleep(0.1)
+        self.assertFalse(client.disconnect(timeout=1))
+        self.assertEqual([b"1"], received)
+
+    def test_missing_file(self):
+        missing = os.path.join(self.directory, "missing.json")
+        client, received = self._replay(
+            [self._capture("capture.json", [b"1"]), missing])
+        self.assertEqual([b"1"], received)
+        self.assertTrue(isinstance(client.worker.error, EnvironmentError))
+
+    def test_bad_arguments(self):
+        self.assertRaises(BadArgumentException, ReplayClient, None, [],
+                          speed=0)
+        self.assertRaises(BadArgumentException, ReplayClient, None, [],
+                          repeat=0)
+        self.assertRaises(BadArgumentException, ReplayClient, None, [],
+                          pool=object(), decoder=Decoder())
+
+    def test_not_reentrant(self):
+        client, _ = self._replay([])
+        self.assertRaises(RuntimeError, client.connect)
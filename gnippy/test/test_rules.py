@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import json
 import unittest
 
 import mock
+import requests
 
 from gnippy import rules
 from gnippy.errors import *
@@ -237,4 +239,352 @@ class RulesTestCase(unittest.TestCase):
             { "value": "Hello World" },
             { "value": "Hello", "tag": "mytag" }
         ]
-        rules.delete_rules(rules_list, config_file_path=test_utils.test_config_path)
\ No newline at end of file
+        rules.delete_rules(rules_list, config_file_path=test_utils.test_config_path)
+
+class RulesClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        test_utils.generate_test_config_file()
+        self.session = mock.Mock()
+        self.session.post.return_value = test_utils.GoodResponse()
+        self.session.get.return_value = test_utils.GoodResponse(
+            json={"rules": [{"value": "Hello", "tag": "mytag"}]})
+        self.client = rules.RulesClient(
+            session=self.session, config_file_path=test_utils.test_config_path)
+
+    def tearDown(self):
+        test_utils.delete_test_config()
+
+    def test_resolves_config_once(self):
+        self.assertEqual(test_utils.test_rules_url, self.client.rules_url)
+        test_utils.delete_test_config()
+        self.client.add_rule("Hello", "mytag")
+        self.client.get_rules()
+
+    def test_default_session(self):
+        client = rules.RulesClient(config_file_path=test_utils.test_config_path)
+        self.assertTrue(isinstance(client.session, requests.Session))
+        client.close()
+
+    def test_add_rules_uses_session(self):
+        self.client.add_rules([rules.build("Hello"), rules.build("World")])
+        self.client.add_rule("Hello", "mytag")
+        self.assertEqual(2, self.session.post.call_count)
+        url = self.session.post.call_args[0][0]
+        self.assertEqual(test_utils.test_rules_url, url)
+
+    def test_add_rules_not_ok(self):
+        self.session.post.return_value = test_utils.BadResponse()
+        self.assertRaises(RuleAddFailedException, self.client.add_rule, "Hello")
+
+    def test_get_rules(self):
+        self.assertEqual(1, len(self.client.get_rules()))
+
+    def test_delete_rules(self):
+        self.client.delete_rule({"value": "Hello"})
+        url = self.session.post.call_args[0][0]
+        self.assertTrue(url.endswith("?_method=delete"))
+
+    def test_delete_rules_not_ok(self):
+        self.session.post.return_value = test_utils.BadResponse()
+        self.assertRaises(RuleDeleteFailedException,
+                          self.client.delete_rules, [{"value": "Hello"}])
+
+    def test_context_manager_closes_session(self):
+        with self.client:
+            pass
+        self.session.close.assert_called_once_with()
+
+
+class ChunkedSubmitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        test_utils.generate_test_config_file()
+        self.session = mock.Mock()
+        self.session.post.return_value = test_utils.GoodResponse()
+        self.client = rules.RulesClient(
+            session=self.session, pool_maxsize=3,
+            config_file_path=test_utils.test_config_path)
+
+    def tearDown(self):
+        test_utils.delete_test_config()
+
+    def _rules(self, n):
+        return [rules.build("rule number %d" % i, tag="t") for i in range(n)]
+
+    def test_chunk_by_count(self):
+        chunks = list(rules._chunk_rules(self._rules(10), max_count=4))
+        self.assertEqual([4, 4, 2], [len(c) for c in chunks])
+
+    def test_chunk_by_bytes(self):
+        rules_list = self._rules(100)
+        chunks = list(rules._chunk_rules(rules_list, max_bytes=500))
+        self.assertTrue(len(chunks) > 1)
+        for chunk in chunks:
+            body = json.dumps(rules._generate_post_object(chunk))
+            self.assertTrue(len(body) <= 500)
+        self.assertEqual(rules_list, [r for c in chunks for r in c])
+
+    def test_rule_too_large(self):
+        self.assertRaises(BadArgumentException, list,
+                          rules._chunk_rules(self._rules(1), max_bytes=20))
+
+    def test_large_list_submitted_in_chunks(self):
+        rules_list = self._rules(12000)
+        report = self.client.add_rules(rules_list)
+        self.assertTrue(report.ok)
+        self.assertEqual(3, len(report.chunks))
+        self.assertEqual(3, self.session.post.call_count)
+        posted = []
+        for call in self.session.post.call_args_list:
+            posted.extend(json.loads(call[1]['data'])['rules'])
+        # Chunks are posted concurrently, in no particular order
+        key = lambda r: r['value']
+        self.assertEqual(sorted(rules_list, key=key), sorted(posted, key=key))
+
+    def test_partial_failure_report(self):
+        self.session.post.side_effect = [
+            test_utils.GoodResponse(), test_utils.BadResponse(),
+            test_utils.GoodResponse()]
+        self.client.max_workers = 1
+        rules_list = self._rules(12000)
+        try:
+            self.client.delete_rules(rules_list)
+        except RuleDeleteFailedException as e:
+            self.assertTrue("1 of 3 chunks failed" in str(e))
+            self.assertEqual([1], [c.index for c in e.report.failed])
+            self.assertEqual(rules_list[5000:10000], e.report.failed_rules)
+            return
+        self.fail("delete_rules was supposed to throw a RuleDeleteFailedException")
+
+    def test_network_error_in_one_chunk(self):
+        self.session.post.side_effect = [
+            test_utils.GoodResponse(),
+            requests.exceptions.ConnectionError("reset"),
+            test_utils.GoodResponse()]
+        self.client.max_workers = 1
+        rules_list = self._rules(12000)
+        try:
+            self.client.add_rules(rules_list)
+        except RuleAddFailedException as e:
+            self.assertTrue("1 of 3 chunks failed" in str(e))
+            failed, = e.report.failed
+            self.assertEqual(1, failed.index)
+            self.assertTrue(isinstance(failed.error,
+                                       requests.exceptions.ConnectionError))
+            self.assertEqual(2, len([c for c in e.report.chunks if c.ok]))
+            return
+        self.fail("add_rules was supposed to throw a RuleAddFailedException")
+
+    def test_module_add_rules_pools_connections(self):
+        with mock.patch.object(rules, '_pooled_session',
+                               return_value=self.session) as pooled:
+            report = rules.add_rules(
+                self._rules(12000), config_file_path=test_utils.test_config_path)
+        self.assertTrue(report.ok)
+        pooled.assert_called_once_with(3)
+        self.assertEqual(3, self.session.post.call_count)
+        self.session.close.assert_called_once_with()
+
+
+class SyncRulesTestCase(unittest.TestCase):
+
+    current = [
+        {"value": "keep", "tag": "t"},
+        {"value": "retag", "tag": "old"},
+        {"value": "remove"},
+    ]
+    desired = [
+        {"value": "keep", "tag": "t"},
+        {"value": "retag", "tag": "new"},
+        {"value": "new"},
+        {"value": "new"},
+    ]
+
+    def setUp(self):
+        test_utils.generate_test_config_file()
+        self.session = mock.Mock()
+        self.session.post.return_value = test_utils.GoodResponse()
+        self.session.get.return_value = test_utils.GoodResponse(
+            json={"rules": self.current})
+        self.client = rules.RulesClient(
+            session=self.session, config_file_path=test_utils.test_config_path)
+
+    def tearDown(self):
+        test_utils.delete_test_config()
+
+    def test_plan(self):
+        plan = rules._plan_sync(self.current, self.desired)
+        self.assertEqual([{"value": "retag", "tag": "new"}, {"value": "new"}],
+                         plan.to_add)
+        self.assertEqual([{"value": "retag", "tag": "old"}, {"value": "remove"}],
+                         plan.to_delete)
+        self.assertEqual(1, plan.unchanged)
+
+    def test_plan_empty_tag_equals_no_tag(self):
+        plan = rules._plan_sync([{"value": "a", "tag": ""}], [{"value": "a"}])
+        self.assertEqual(([], []), (plan.to_add, plan.to_delete))
+
+    def test_dry_run(self):
+        plan = self.client.sync_rules(self.desired, dry_run=True)
+        self.assertEqual(2, len(plan.to_add))
+        self.assertFalse(self.session.post.called)
+
+    def test_sync_deletes_then_adds(self):
+        self.client.sync_rules(self.desired)
+        delete_call, add_call = self.session.post.call_args_list
+        self.assertTrue(delete_call[0][0].endswith("?_method=delete"))
+        self.assertEqual(2, len(json.loads(delete_call[1]['data'])['rules']))
+        self.assertFalse(add_call[0][0].endswith("?_method=delete"))
+        self.assertEqual(2, len(json.loads(add_call[1]['data'])['rules']))
+
+    def test_sync_nothing_to_do(self):
+        self.client.sync_rules(self.current)
+        self.assertFalse(self.session.post.called)
+
+    @mock.patch('requests.post', good_post)
+    @mock.patch('requests.get', good_get_one_rule)
+    def test_module_sync_rules(self):
+        plan = rules.sync_rules([{"value": "Hello", "tag": "mytag"}],
+                                config_file_path=test_utils.test_config_path)
+        self.assertEqual(([], []), (plan.to_add, plan.to_delete))
+
+
+class StreamResponse(test_utils.GoodResponse):
+    """ A streamed response delivering its body in small chunks. """
+
+    def __init__(self, body, chunk=7, response_code=200):
+        test_utils.GoodResponse.__init__(self, response_code)
+        self.body = body.encode("utf-8")
+        self.chunk = chunk
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), self.chunk):
+            yield self.body[i:i + self.chunk]
+
+    def close(self):
+        self.closed = True
+
+
+class IterRulesTestCase(unittest.TestCase):
+
+    current = [
+        {"value": u"café OR \"a, b]\"", "tag": "t"},
+        {"value": "Hello"},
+        {"value": "{World}", "tag": None},
+    ]
+
+    def setUp(self):
+        test_utils.generate_test_config_file()
+        self.session = mock.Mock()
+        self.client = rules.RulesClient(
+            session=self.session, config_file_path=test_utils.test_config_path)
+
+    def tearDown(self):
+        test_utils.delete_test_config()
+
+    def _respond(self, body, **kwargs):
+        response = StreamResponse(body, **kwargs)
+        self.session.get.return_value = response
+        return response
+
+    def test_parse_split_chunks(self):
+        body = json.dumps({"rules": self.current}, ensure_ascii=False)
+        for chunk in (1, 3, 7, len(body)):
+            response = self._respond(body, chunk=chunk)
+            self.assertEqual(self.current, list(self.client.iter_rules()))
+            self.assertTrue(response.closed)
+        self.assertTrue(self.session.get.call_args[1]['stream'])
+
+    def test_no_rules(self):
+        self._respond('{"rules": []}')
+        self.assertEqual([], list(self.client.iter_rules()))
+
+    def test_as_records(self):
+        self._respond(json.dumps({"rules": self.current}))
+        records = list(self.client.iter_rules(as_records=True))
+        self.assertEqual(rules.Rule("Hello"), records[1])
+        self.assertEqual({"value": "Hello"}, records[1].to_dict())
+        self.assertFalse(hasattr(records[0], "__dict__"))
+
+    def test_no_rules_field(self):
+        self._respond('{"hello": "world"}')
+        self.assertRaises(RulesGetFailedException, list,
+                          self.client.iter_rules())
+
+    def test_truncated(self):
+        self._respond('{"rules": [{"value": "Hello"}, {"val')
+        it = self.client.iter_rules()
+        self.assertEqual({"value": "Hello"}, next(it))
+        self.assertRaises(RulesGetFailedException, next, it)
+
+    def test_bad_status_code(self):
+        self._respond("", response_code=500)
+        self.assertRaises(RulesGetFailedException, list,
+                          self.client.iter_rules())
+
+    def test_get_exception(self):
+        self.session.get.side_effect = Exception("This is a test exception")
+        self.assertRaises(RulesGetFailedException, list,
+                          self.client.iter_rules())
+
+
+class RuleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        test_utils.generate_test_config_file()
+        self.session = mock.Mock()
+        self.session.post.return_value = test_utils.GoodResponse()
+        self.client = rules.RulesClient(
+            session=self.session, config_file_path=test_utils.test_config_path)
+
+    def tearDown(self):
+        test_utils.delete_test_config()
+
+    def test_validated_on_construction(self):
+        self.assertRaises(BadArgumentException, rules.Rule, None)
+        self.assertRaises(BadArgumentException, rules.Rule, "Hello", 1)
+
+    def test_empty_tag_is_no_tag(self):
+        self.assertEqual(rules.Rule("Hello"), rules.Rule("Hello", ""))
+        self.assertEqual({"value": "Hello"}, rules.Rule("Hello", "").to_dict())
+
+    def test_immutable(self):
+        rule = rules.Rule("Hello", "mytag")
+        self.assertRaises(AttributeError, setattr, rule, "value", "World")
+        self.assertRaises(AttributeError, setattr, rule, "other", 1)
+        self.assertRaises(AttributeError, delattr, rule, "tag")
+
+    def test_hashable(self):
+        s = set([rules.Rule("Hello", "a"), rules.Rule("Hello", "a"),
+                 rules.Rule("Hello", "b")])
+        self.assertEqual(2, len(s))
+
+    def test_pickle(self):
+        import pickle
+        rule = rules.Rule("Hello", "mytag")
+        self.assertEqual(rule, pickle.loads(pickle.dumps(rule)))
+
+    def test_check_rules_list_accepts_rules(self):
+        rules._check_rules_list([rules.Rule("Hello"), rules.build("World")])
+
+    def test_add_rules(self):
+        self.client.add_rules([rules.Rule("Hello", "mytag"),
+                               rules.Rule("World")])
+        data = json.loads(self.session.post.call_args[1]['data'])
+        self.assertEqual([{"value": "Hello", "tag": "mytag"},
+                          {"value": "World"}], data['rules'])
+
+    def test_mixed_with_built_rules(self):
+        self.client.delete_rules([rules.Rule("Hello"), rules.build("World")])
+        data = json.loads(self.session.post.call_args[1]['data'])
+        self.assertEqual([{"value": "Hello"}, {"value": "World"}],
+                         data['rules'])
+
+    def test_sync_with_rules(self):
+        self.session.get.return_value = test_utils.GoodResponse(
+            json={"rules": [{"value": "Hello", "tag": "mytag"}]})
+        plan = self.client.sync_rules([rules.Rule("Hello", "mytag")],
+                                      dry_run=True)
+        self.assertEqual(1, plan.unchanged)
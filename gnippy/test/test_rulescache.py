@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from gnippy import rules
+from gnippy.rulescache import RulesCache
+from gnippy.test import test_utils
+
+url = test_utils.test_rules_url
+
+
+class RulesCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "rules.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lookup_empty(self):
+        self.assertIsNone(RulesCache().lookup(url))
+
+    def test_store_and_lookup(self):
+        cache = RulesCache(ttl=60)
+        cache.store(url, [{"value": "a"}], etag='"1"')
+        self.assertEqual(([{"value": "a"}], '"1"', True), cache.lookup(url))
+
+    def test_stale(self):
+        cache = RulesCache(ttl=60)
+        with mock.patch('time.time', lambda: 1000.0):
+            cache.store(url, [], etag=None)
+        with mock.patch('time.time', lambda: 1061.0):
+            self.assertFalse(cache.lookup(url)[2])
+            cache.touch(url)
+            self.assertTrue(cache.lookup(url)[2])
+
+    def test_invalidate(self):
+        cache = RulesCache()
+        cache.store(url, [])
+        cache.invalidate(url)
+        self.assertIsNone(cache.lookup(url))
+
+    def test_shared_file(self):
+        RulesCache(path=self.path).store(url, [{"value": "a"}], etag='"1"')
+        other = RulesCache(path=self.path)
+        self.assertEqual([{"value": "a"}], other.lookup(url)[0])
+        other.invalidate(url)
+        self.assertIsNone(RulesCache(path=self.path).lookup(url))
+
+
+class CachedRulesClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        test_utils.generate_test_config_file()
+        response = test_utils.GoodResponse(json={"rules": [{"value": "a"}]})
+        response.headers = {"ETag": '"v1"'}
+        self.session = mock.Mock()
+        self.session.get.return_value = response
+        self.session.post.return_value = test_utils.GoodResponse()
+        self.cache = RulesCache(ttl=60)
+        self.client = rules.RulesClient(
+            session=self.session, cache=self.cache,
+            config_file_path=test_utils.test_config_path)
+
+    def tearDown(self):
+        test_utils.delete_test_config()
+
+    def test_fresh_cache_skips_request(self):
+        self.client.get_rules()
+        self.assertEqual([{"value": "a"}], self.client.get_rules())
+        self.assertEqual(1, self.session.get.call_count)
+
+    def test_stale_cache_revalidated(self):
+        self.client.get_rules()
+        self.cache.ttl = 0
+        self.session.get.return_value = test_utils.GoodResponse(
+            response_code=304)
+        self.assertEqual([{"value": "a"}], self.client.get_rules())
+        self.assertEqual({"If-None-Match": '"v1"'},
+                         self.session.get.call_args[1]['headers'])
+
+    def test_add_invalidates(self):
+        self.client.get_rules()
+        self.client.add_rule("b")
+        self.client.get_rules()
+        self.assertEqual(2, self.session.get.call_count)
+        self.assertFalse('headers' in self.session.get.call_args[1])
+
+    def test_returned_list_is_a_copy(self):
+        self.client.get_rules().append({"value": "wat"})
+        self.assertEqual(1, len(self.client.get_rules()))
+
+    def test_sync_revalidates_fresh_cache(self):
+        self.client.get_rules()
+        response = test_utils.GoodResponse(
+            json={"rules": [{"value": "a"}, {"value": "b"}]})
+        response.headers = {"ETag": '"v2"'}
+        self.session.get.return_value = response
+        plan = self.client.sync_rules([{"value": "a"}], dry_run=True)
+        self.assertEqual(2, self.session.get.call_count)
+        self.assertEqual({"If-None-Match": '"v1"'},
+                         self.session.get.call_args[1]['headers'])
+        self.assertEqual([{"value": "b"}], plan.to_delete)
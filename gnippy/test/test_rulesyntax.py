@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import mock
+
+from gnippy import rules, rulesyntax
+from gnippy.errors import RuleSyntaxException
+from gnippy.test import test_utils
+from gnippy.rulesyntax import And, Not, Or, Term, parse, validate
+
+
+def kw(value):
+    return Term(rulesyntax.KEYWORD, value)
+
+
+class ParseTestCase(unittest.TestCase):
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertEqual(Or([kw("apple"), And([kw("iphone"), kw("ipad")])]),
+                         parse("apple OR iphone ipad"))
+
+    def test_grouping_and_negation(self):
+        self.assertEqual(
+            And([Or([kw("a"), kw("b")]), Not(Or([kw("c"), kw("d")]))]),
+            parse("(a OR b) -(c OR d)"))
+
+    def test_lowercase_or_is_a_keyword(self):
+        self.assertEqual(And([kw("a"), kw("or"), kw("b")]), parse("a or b"))
+
+    def test_terms(self):
+        node = parse(u'#gnip @twitter $AAPL "hello \\"world\\""~3 '
+                     u'bio_location:"New York" lang:en café')
+        self.assertEqual([
+            Term(rulesyntax.HASHTAG, "gnip"),
+            Term(rulesyntax.MENTION, "twitter"),
+            Term(rulesyntax.CASHTAG, "AAPL"),
+            Term(rulesyntax.PHRASE, 'hello "world"', proximity=3),
+            Term(rulesyntax.OPERATOR, "New York", operator="bio_location"),
+            Term(rulesyntax.OPERATOR, "en", operator="lang"),
+            kw(u"café"),
+        ], list(node.children))
+
+    def test_syntax_errors(self):
+        for rule in ("", "(a OR b", "a OR b)", "()", "OR a", "a OR",
+                     '"unterminated', "a - b", "--a", "foo:bar", "from:",
+                     "a OR -b", "-a OR b"):
+            self.assertRaises(rulesyntax.RuleParseError, parse, rule)
+
+    def test_error_position(self):
+        try:
+            parse("(a OR b")
+        except rulesyntax.RuleParseError as e:
+            self.assertEqual(0, e.position)
+
+
+class ValidateTestCase(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual([], validate("(apple OR iphone) -ipad lang:en"))
+        self.assertEqual([], validate("from:gnip has:links sample:10"))
+
+    def test_max_length(self):
+        errors = validate("a" * 11, max_length=10)
+        self.assertEqual(1, len(errors))
+
+    def test_clause_limits(self):
+        rule = " OR ".join("w%d" % i for i in range(31))
+        self.assertEqual(1, len(validate(rule)))
+        self.assertEqual([], validate(rule, max_positive=31))
+        rule = "a " + " ".join("-w%d" % i for i in range(3))
+        self.assertEqual(1, len(validate(rule, max_negated=2)))
+
+    def test_not_standalone(self):
+        self.assertEqual(1, len(validate("-apple")))
+        self.assertEqual(1, len(validate("lang:en has:links")))
+        self.assertEqual(1, len(validate("apple OR lang:en")))
+        self.assertEqual([], validate("apple lang:en"))
+
+    def test_operator_values(self):
+        self.assertEqual(1, len(validate("apple has:nothing")))
+        self.assertEqual(1, len(validate("apple sample:101")))
+
+    def test_not_a_string(self):
+        self.assertEqual(1, len(validate(None)))
+
+
+class CheckRulesTestCase(unittest.TestCase):
+
+    def test_reports_all_invalid_rules(self):
+        rules_list = [rules.build("ok"), rules.build("(bad"),
+                      rules.Rule("-bad"), rules.build("ok too")]
+        try:
+            rulesyntax.check_rules(rules_list)
+            self.fail("RuleSyntaxException not raised")
+        except RuleSyntaxException as e:
+            self.assertEqual(set(["(bad", "-bad"]), set(e.errors))
+
+    def test_rejects_non_rules(self):
+        try:
+            rulesyntax.check_rules([rules.build("ok"), "plain", {"value": 1}])
+            self.fail("RuleSyntaxException not raised")
+        except RuleSyntaxException as e:
+            self.assertEqual({repr("plain"): ["Not a built rule or Rule"],
+                              "1": ["Rule must be a string"]}, e.errors)
+
+    def test_build_validate(self):
+        self.assertRaises(RuleSyntaxException, rules.build, "a OR", None,
+                          True)
+        self.assertEqual({"value": "a OR"}, rules.build("a OR"))
+
+    def test_add_rules_validate_sends_nothing(self):
+        test_utils.generate_test_config_file()
+        self.addCleanup(test_utils.delete_test_config)
+        session = mock.Mock()
+        client = rules.RulesClient(
+            session=session, config_file_path=test_utils.test_config_path)
+        self.assertRaises(RuleSyntaxException, client.add_rules,
+                          [rules.build("ok"), rules.build("(bad")],
+                          validate=True)
+        self.assertFalse(session.post.called)
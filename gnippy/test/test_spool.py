@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from gnippy import spool
+from gnippy.powertrackclient import Worker
+from gnippy.reconnect import ReconnectPolicy
+from gnippy.spool import Spool, read_segment
+from gnippy.test import test_utils
+from gnippy.test.test_powertrackclient import FakeStreamResponse
+
+
+def _spool_and_hang(directory, lines, spooled):
+    s = Spool(directory, compression=spool.GZIP, flush_interval=0)
+    for line in lines:
+        s.put(line)
+    spooled.set()
+    time.sleep(60)
+
+
+class SpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _lines(self, n):
+        return [("line %d" % i).encode("ascii") for i in range(n)]
+
+    def test_rotation_and_replay(self):
+        s = Spool(self.directory, segment_size=14)
+        for line in self._lines(5):
+            s.put(line)
+        s.close()
+        self.assertEqual(3, len(s.segments()))
+
+        received = []
+        self.assertEqual(5, s.replay(received.append))
+        self.assertEqual(self._lines(5), received)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_compression(self):
+        for compression in (spool.GZIP, spool.ZSTD):
+            if compression == spool.ZSTD and spool.zstandard is None:
+                continue
+            s = Spool(self.directory, compression=compression)
+            for line in self._lines(100):
+                s.put(line)
+            s.close()
+            path, = s.segments()
+            self.assertTrue(os.path.getsize(path) < 700)
+            self.assertEqual(self._lines(100), list(read_segment(path)))
+            s.replay(lambda line: None)
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, Spool, self.directory,
+                          compression="lz4")
+        self.assertRaises(ValueError, Spool, self.directory, fsync="often")
+
+    def test_recovers_crashed_segments(self):
+        s = Spool(self.directory, compression=spool.GZIP, fsync=spool.ALWAYS)
+        for line in self._lines(3):
+            s.put(line)
+        # Simulate a crash: the segment stays open, its tail cut mid-line
+        path = s._writer.path + spool._OPEN
+        with open(path, "ab") as f:
+            f.write(b"\x00\x01garbage")
+
+        recovered = Spool(self.directory)
+        recovered.put(b"new")
+        recovered.close()
+        self.assertTrue(recovered.segments()[1].endswith("2.seg"))
+
+        received = []
+        recovered.replay(received.append)
+        self.assertEqual(self._lines(3) + [b"new"], received)
+
+    def test_process_killed_mid_segment(self):
+        lines = self._lines(100)
+        spooled = multiprocessing.Event()
+        child = multiprocessing.Process(
+            target=_spool_and_hang, args=(self.directory, lines, spooled))
+        child.start()
+        try:
+            self.assertTrue(spooled.wait(10))
+        finally:
+            os.kill(child.pid, signal.SIGKILL)
+            child.join()
+
+        received = []
+        Spool(self.directory).replay(received.append)
+        self.assertEqual(lines, received)
+
+    def test_partial_line_ignored(self):
+        path = os.path.join(self.directory, "%020d.seg" % 1)
+        with open(path, "wb") as f:
+            f.write(b"one\ntwo\nthr")
+        self.assertEqual([b"one", b"two"], list(read_segment(path)))
+
+    def test_consumer_delivers_open_segment_after_max_latency(self):
+        received = threading.Event()
+        s = Spool(self.directory, max_latency=0.01)
+        s.start(lambda line: received.set())
+        s.put(b"1")
+        self.assertTrue(received.wait(5))
+        s.close()
+        self.assertTrue(s.join(5))
+        self.assertEqual([], s.segments())
+
+    def test_retries_failed_line(self):
+        received = []
+        failures = [ValueError("downstream down")]
+
+        def callback(line):
+            if line == b"line 1" and failures:
+                raise failures.pop()
+            received.append(line)
+
+        s = Spool(self.directory, max_latency=0.01, retry_interval=0.01)
+        s.start(callback)
+        for line in self._lines(3):
+            s.put(line)
+        deadline = time.time() + 5
+        while len(received) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        s.close()
+        self.assertTrue(s.join(5))
+        self.assertEqual(self._lines(3), received)
+        self.assertTrue(isinstance(s.error, ValueError))
+
+    def test_close_without_drain_keeps_segments(self):
+        s = Spool(self.directory)
+        for line in self._lines(3):
+            s.put(line)
+        s.close(drain=False)
+        s.start(lambda line: None)
+        self.assertTrue(s.join(5))
+        self.assertEqual(1, len(Spool(self.directory).segments()))
+
+    def test_worker_spools(self):
+        received = []
+        s = Spool(self.directory, max_latency=0.01)
+        worker = Worker(test_utils.test_powertrack_url, ("u", "p"),
+                        received.append, buffer=s,
+                        reconnect_policy=ReconnectPolicy(max_retries=0))
+        response = FakeStreamResponse([b"1", b"", b"2"])
+        with mock.patch('requests.get', mock.Mock(return_value=response)):
+            worker.run()
+        self.assertEqual([b"1", b"2"], received)
+        self.assertEqual(0, s.stats()["depth"])
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+import mock
+
+from gnippy import streammanager
+from gnippy.buffering import Buffer
+from gnippy.reconnect import ReconnectPolicy
+from gnippy.streammanager import StreamManager
+from gnippy.test import test_utils
+
+
+class FakeStreamResponse():
+    def __init__(self, lines):
+        self.lines = lines
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for line in self.lines:
+            yield line + b"\r\n"
+
+    def close(self):
+        pass
+
+
+def _fake_get(url, **kwargs):
+    partition = url.rsplit("=", 1)[-1].encode()
+    return FakeStreamResponse([partition + b"-1", partition + b"-2"])
+
+
+class PartitionUrlsTestCase(unittest.TestCase):
+
+    def test_partition_urls(self):
+        urls = streammanager.partition_urls("https://host/stream.json", 2)
+        self.assertEqual(["https://host/stream.json?partition=1",
+                          "https://host/stream.json?partition=2"], urls)
+
+    def test_partition_urls_existing_query(self):
+        urls = streammanager.partition_urls("https://host/s.json?a=b", 1)
+        self.assertEqual(["https://host/s.json?a=b&partition=1"], urls)
+
+
+class StreamManagerTestCase(unittest.TestCase):
+
+    auth = (test_utils.test_username, test_utils.test_password)
+    url = test_utils.test_powertrack_url
+
+    def _manager(self, callback, **kwargs):
+        return StreamManager(callback, url=self.url, auth=self.auth,
+                             reconnect_policy=ReconnectPolicy(max_retries=0),
+                             **kwargs)
+
+    def test_urls(self):
+        manager = self._manager(None, urls=["http://a/1.json", "http://a/2.json"])
+        self.assertEqual(["http://a/1.json", "http://a/2.json"],
+                         [c.url for c in manager.connections])
+
+    def test_partitions(self):
+        manager = self._manager(None, partitions=3)
+        self.assertEqual(3, len(manager.connections))
+        self.assertTrue(manager.connections[2].url.endswith("partition=3"))
+
+    @mock.patch('requests.get', _fake_get)
+    def test_merges_connections_into_buffer(self):
+        received = []
+        lock = threading.Lock()
+
+        def callback(line):
+            with lock:
+                received.append(line)
+
+        manager = self._manager(callback, partitions=2, buffer=Buffer())
+        manager.connect()
+        self.assertFalse(manager.disconnect(timeout=5))
+
+        self.assertEqual([b"1-1", b"1-2", b"2-1", b"2-2"], sorted(received))
+        self.assertEqual([2, 2], [s['lines'] for s in manager.stats()])
+
+    @mock.patch('requests.get', _fake_get)
+    def test_restart_dead(self):
+        manager = self._manager(lambda line: None, partitions=2)
+        manager.connect()
+        manager.wait(timeout=5)
+        self.assertEqual([0, 1], manager.restart_dead())
+        manager.wait(timeout=5)
+
+        stats = manager.stats()
+        self.assertEqual([1, 1], [s['restarts'] for s in stats])
+        self.assertEqual([4, 4], [s['lines'] for s in stats])
+
+    @mock.patch('requests.get', _fake_get)
+    def test_not_reentrant(self):
+        manager = self._manager(lambda line: None)
+        manager.connect()
+        self.assertRaises(RuntimeError, manager.connect)
+
+    def test_before_connect(self):
+        manager = self._manager(lambda line: None, partitions=2)
+        self.assertEqual([], manager.restart_dead())
+        self.assertFalse(manager.wait(timeout=0))
+        self.assertFalse(manager.disconnect(timeout=0))
+        self.assertRaises(RuntimeError, manager.restart, 0)
+        self.assertEqual([False, False], [s['alive'] for s in manager.stats()])
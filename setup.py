@@ -37,5 +37,9 @@ setup(
     license=license,
     install_requires=[
         "requests==2.7.0"
-    ]
+    ],
+    extras_require={
+        "async": ["aiohttp"],
+        "zstd": ["zstandard"]
+    }
 )